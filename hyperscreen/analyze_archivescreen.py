@@ -5,8 +5,10 @@ from __future__ import division
 from __future__ import print_function
 
 
+from hyperscreen import catalog
 from hyperscreen import evtscreen
 from hyperscreen import hypercore
+from hyperscreen import results
 import gc
 import os
 import sys
@@ -44,27 +46,31 @@ def getArgs(argv=None):
     parser.add_argument('-l', '--limit', default=None,
                         help='limit number of obs to run', type=int)
 
+    parser.add_argument('-c', '--catalog', default=None,
+                        help='Absolute PATH to the SQLite catalog of archivescreen results. Any new results files in the results directory are ingested into it first. Defaults to {} in the results directory.'.format(catalog.CATALOG_FILENAME))
+
     return parser.parse_args(argv)
 
 
 def inventoryJSONs(results_dir, verbose=False):
+    '''Find the HyperScreen result files (see hyperscreen.results), and any legacy JSON result files, in results_dir'''
         # Check to make sure the HRC database path is right
     if (sys.version_info > (3, 0)):
         # Python 3 code
-        json_files = glob.glob(results_dir + '*.json', recursive=True)
+        json_files = glob.glob(results_dir + '*.json', recursive=True) + glob.glob(results_dir + '*' + results.RESULTS_SUFFIX)
     else:
         # Python 2 code
         # Python <3.5 glob can't walk directories recursively
         import fnmatch
         json_files = [os.path.join(dirpath, f) for dirpath, dirnames, files in os.walk(
-            results_dir) for f in fnmatch.filter(files, '*.json')]
+            results_dir) for pattern in ['*.json', '*' + results.RESULTS_SUFFIX] for f in fnmatch.filter(files, pattern)]
 
     if len(json_files) == 0:
         sys.exit(
-            'ERROR: No JSON HyperScreen Result files round in supplied archive path ({})'.format(results_dir))
+            'ERROR: No HyperScreen Result files round in supplied archive path ({})'.format(results_dir))
 
     if verbose is True:
-        print('{} JSON HyperScreen Result Files found'.format(len(json_files)))
+        print('{} HyperScreen Result Files found'.format(len(json_files)))
     return json_files
 
 
@@ -79,13 +85,17 @@ def parseJSONs(json_files, verbose=False):
     for json_file in json_files:
         if verbose is True:
             print("Parsing {}".format(json_file.split('/')[-1]))
-        with open(json_file) as json_data:
-            data = json.load(json_data)
-            exptimes.append(round(data['Exposure Time']/1000, 2))
-            numevents.append(data['Number of Events'])
-            improvements.append(data['Percent improvement'])
-            legacy_percent.append(data['Percent rejected by Hyperbola'])
-            hyperscreen_percent.append(data['Percent rejected by Tapscreen'])
+        if json_file.endswith(results.RESULTS_SUFFIX):
+            # Only the summary scalars are read, not the masks
+            data = results.load_summary(json_file)
+        else:
+            with open(json_file) as json_data:
+                data = json.load(json_data)
+        exptimes.append(round(data['Exposure Time']/1000, 2))
+        numevents.append(data['Number of Events'])
+        improvements.append(data['Percent improvement'])
+        legacy_percent.append(data['Percent rejected by Hyperbola'])
+        hyperscreen_percent.append(data['Percent rejected by Tapscreen'])
 
     trends_dict = {'Exposure Times': exptimes,
                    'Improvement': improvements,
@@ -112,11 +122,13 @@ def main():  # pragma: no cover
         raise Exception(
             'Supplied results directory ({}) does not exist.'.format(results_dir))
 
-    json_files = inventoryJSONs(results_dir, verbose=args.verbose)
-    if args.limit is None:
-        trends_dict = parseJSONs(json_files, verbose=args.verbose)
-    else:
-        trends_dict = parseJSONs(json_files[:args.limit], verbose=args.verbose)
+    catalog_file = args.catalog if args.catalog is not None else os.path.join(results_dir, catalog.CATALOG_FILENAME)
+    with catalog.Catalog(catalog_file) as results_catalog:
+        # Only results files that are new (or changed) since the last run are read
+        ingested = results_catalog.ingest(results_dir, verbose=args.verbose)
+        if args.verbose is True:
+            print('Ingested {} new HyperScreen Result Files. The catalog holds {} observations.'.format(ingested, len(results_catalog)))
+        trends_dict = results_catalog.trends(limit=args.limit)
 
     fig, ax = plt.subplots(figsize=(12, 8))
     frame = ax.scatter(trends_dict['Exposure Times'],
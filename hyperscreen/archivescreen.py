@@ -6,8 +6,15 @@
 from __future__ import division
 from __future__ import print_function
 
+from hyperscreen import catalog
 from hyperscreen import evtscreen
+from hyperscreen import headerindex
 from hyperscreen import hypercore
+from hyperscreen import manifest
+from hyperscreen import reportcard
+from hyperscreen import results
+from hyperscreen import scheduler
+from hyperscreen import streamscreen
 import gc
 
 import os
@@ -26,74 +33,22 @@ from functools import partial
 
 from astropy.io import fits
 
-from matplotlib.backends.backend_pdf import PdfPages
-import matplotlib.pyplot as plt
-
 import warnings
 warnings.filterwarnings("ignore")
 
 
 def reportCard(evt1_object, hyperscreen_results_dict=None, reportCard_savepath=None, show=True, save=True, rasterized=True, dpi=150, verbose=False):  # pragma: no cover
+    """Make the report card of a screened observation right away, rather than in a rendering pool (see hyperscreen.reportcard)."""
 
     obs = evt1_object
 
     if verbose is True:
         print("Doing {}, {}".format(obs.obsid, obs.detector))
 
-    with PdfPages(reportCard_savepath) as pdf:
-
-        # MAKE PAGE 1
-
-        fig, axes = plt.subplots(2, 2, figsize=(10, 10), sharey='row')
-
-        obs.boomerang(mask=obs.data['Hyperbola test passed'], ax=axes[0, 0], create_subplot=True,
-                      show=False, title='Legacy Hyperbola Test', cmap='magma', rasterized=rasterized)
-
-        obs.boomerang(mask=hyperscreen_results_dict['All Survivals (boolean mask)'], ax=axes[0, 1], create_subplot=True,
-                      show=False, title='HyperScreen', cmap='inferno', rasterized=rasterized)
-
-        obs.image(ax=axes[1, 0], detcoords=True, show=False,
-                  create_subplot=True, title="Legacy Hyperbola Test", rasterized=rasterized)
-        obs.image(masked_x=obs.data['detx'][hyperscreen_results_dict['All Survivals (boolean mask)']],
-                  masked_y=obs.data['dety'][hyperscreen_results_dict['All Survivals (boolean mask)']],
-                  ax=axes[1, 1], detcoords=True, show=False,
-                  create_subplot=True, title="HyperScreen", rasterized=rasterized)
-
-        fig.suptitle('ObsID {} | {} | {} | {} ksec | {:,} counts \n Percent Improvement: {}%'.format(
-            obs.obsid, obs.target, obs.detector, round(obs.exptime/1000, 2), obs.numevents, hyperscreen_results_dict['Percent improvement']))
-
-        if save is True:
-            pdf.savefig(fig)
+    if save is True:
+        reportcard.render_report_card(reportcard.plot_inputs(obs, hyperscreen_results_dict),
+                                      reportCard_savepath=reportCard_savepath, rasterized=rasterized, verbose=verbose)
 
-
-    # # MAKE PAGE 2
-
-    # fig, axes = plt.subplots(2, 2, figsize=(10, 10), sharey='row')
-
-    # obs.boomerang(mask=obs.data['Hyperbola test passed'], ax=axes[0, 0], create_subplot=True,
-    #               show=False, title='Legacy Hyperbola Test', cmap='magma', rasterized=rasterized)
-    # obs.boomerang(ax=axes[0, 1], create_subplot=True,
-    #               show=False, title='Test2', cmap='inferno', rasterized=rasterized)
-
-    # obs.image(masked_x=obs.data['detx'][obs.data['Hyperbola test failed']], masked_y=obs.data['dety'][obs.data['Hyperbola test failed']], ax=axes[1, 0], detcoords=True, show=False,
-    #           create_subplot=True, title="Test1", rasterized=rasterized)
-    # obs.image(ax=axes[1, 1], detcoords=True, show=False,
-    #           create_subplot=True, title="Test2", rasterized=rasterized)
-
-    # fig.suptitle('ObsID {} | {} | {}'.format(
-    #     obs.obsid, obs.target, obs.detector))
-
-    # if save is True:
-    #     pdf.savefig(fig)
-
-    if verbose is True:
-        print("Created {}".format(reportCard_savepath))
-
-    # if show is True:
-    #     plt.show()
-
-    fig.clf()
-    plt.close()
     del obs, hyperscreen_results_dict
     gc.collect()
 
@@ -108,10 +63,31 @@ def getArgs(argv=None):
     parser.add_argument('-c', '--cluster', action='store_true',
                         help='Point to the HRC Database stored on the Smithsonian Hydra Cluster')
 
+    parser.add_argument('--manifest', help='Absolute PATH to the run manifest, which records every screened EVT1 file so that an interrupted run can resume where it stopped. Defaults to {} in the savepath. Ignored (i.e. nothing is skipped) with --overwrite.'.format(manifest.MANIFEST_FILENAME),
+                        default=None)
+
+    parser.add_argument('--hash_manifest', action='store_true',
+                        help='Also record the content hash of every EVT1 file in the run manifest, so that copied (but unchanged) files are still recognized as done.')
+
+    parser.add_argument('--softening', type=float, default=1.0,
+                        help='Lower the Otsu threshold of every tap by this fraction of itself. Defaults to 1.0.')
+
+    parser.add_argument('--catalog', help='Absolute PATH to the SQLite catalog in which to record a summary of every screened observation. Defaults to {} in the savepath.'.format(catalog.CATALOG_FILENAME),
+                        default=None)
+
+    parser.add_argument('--cache', help='Absolute PATH to a sidecar cache directory of decoded EVT1 events, so that reruns needn\'t decompress and decode every EVT1 file again. Defaults to None (no cache).',
+                        default=None)
+
     parser.add_argument('-f', '--fitsfiles', action='store_true',
                         help='Create FITS files of hyperscreen results? Default=False')
 
-    parser.add_argument('-j', '--save_json', help='Save JSON files for every Hyperscreen result dictionary?',
+    parser.add_argument('--annotate', action='store_true',
+                        help='With --fitsfiles, write one EVT1 file per observation in which every event is flagged with the HyperScreen decision, instead of separate files of the surviving and rejected events.')
+
+    parser.add_argument('--stream_events', type=int, default=None,
+                        help='Screen EVT1 files of at least this many events in bounded memory, a chunk of events at a time, rather than loading them (see hyperscreen.streamscreen). Each is read three times (a gzipped file is first decompressed once, into the savepath), and only the summary of its results is kept, in the catalog: it gets no results file or Report Card. Defaults to None (every file is loaded).')
+
+    parser.add_argument('-j', '--save_json', help='Save a results file (see hyperscreen.results) for every Hyperscreen result dictionary?',
                         action='store_true')
 
     parser.add_argument('-o', '--overwrite', help='Overwrite an existing Hyperscreen Result File (e.g. a ReportCard or Results JSON?)',
@@ -134,6 +110,21 @@ def getArgs(argv=None):
 
     parser.add_argument('--showplots', action='store_true',  help='Show the plots on screen while running? This is a bad idea if you are screening more than few observations')
 
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of worker processes. Defaults to one per CPU core.')
+
+    parser.add_argument('--render_processes', type=int, default=None,
+                        help='Number of worker processes rendering Report Cards, once screening is done. Defaults to --processes.')
+
+    parser.add_argument('--maxtasksperchild', type=int, default=scheduler.DEFAULT_MAXTASKSPERCHILD,
+                        help='Replace each worker process after it has screened this many EVT1 files. Defaults to {}.'.format(scheduler.DEFAULT_MAXTASKSPERCHILD))
+
+    parser.add_argument('--max-memory', default=None,
+                        help='Memory budget for all worker processes together, e.g. 200G. Observations are only started while their estimated peak memory (from their number of events) fits in the budget. Defaults to None (no budget).')
+
+    parser.add_argument('--header_index', default=None,
+                        help='Absolute PATH to the header index of the archive (see hyperscreen.headerindex), which is used to start the largest observations first. Defaults to {} in the savepath.'.format(headerindex.HEADER_INDEX_FILENAME))
+
     parser.add_argument('--singlecore', action='store_true',  help='Disable multiprocessing and run archivescreen on a single core? Defaults to False.')
 
     return parser.parse_args(argv)
@@ -168,8 +159,15 @@ def setPaths(args, verbose=False):  # pragma: no cover
     return savepath, archivepath
 
 
-def inventoryArchive(archivepath, limit=None, verbose=False, sort=False):
-    ''' Parse the archive'''
+def inventoryArchive(archivepath, limit=None, verbose=False, sort=False, header_index=None, workers=16, dedupe=False):
+    ''' Parse the archive
+
+    With sort=True, the EVT1 files are also split by detector, using their headers
+    from a header index (see hyperscreen.headerindex) kept in the header_index file
+    (or only in memory, if header_index is None). With dedupe=True, only the last
+    (by file name, i.e. the latest processing version) of several EVT1 files of
+    the same ObsID is kept.
+    '''
 
     # Check to make sure the HRC database path is right
     if (sys.version_info > (3, 0)):
@@ -200,9 +198,25 @@ def inventoryArchive(archivepath, limit=None, verbose=False, sort=False):
         hrcI_files = []
         hrcS_files = []
 
-        for evt1_file in master_list:
-            # Grab header for the second extension:
-            hdr = fits.getheader(evt1_file, 1)
+        # Headers come from the header index, which only reads (in parallel) those of new or changed files
+        index = headerindex.HeaderIndex(header_index, workers=workers)
+        index.update(master_list, verbose=verbose)
+
+        duplicates = index.duplicates(master_list)
+        if len(duplicates) > 0:
+            print("WARNING: {} ObsIDs have more than one EVT1 file{}".format(
+                len(duplicates), ". Only the last (by file name) of each is kept." if dedupe is True else ""))
+            if verbose is True:
+                for obsid, files in duplicates.items():
+                    print("ObsID {}: {}".format(obsid, ', '.join(os.path.basename(evt1_file) for evt1_file in files)))
+        superseded = set(evt1_file for files in duplicates.values() for evt1_file in files[:-1]) if dedupe is True else set()
+
+        for evt1_file, hdr in zip(master_list, index.lookup(master_list)):
+            if 'error' in hdr:
+                print("ERROR reading the header of {}: {}".format(evt1_file, hdr['error']))
+                continue
+            if evt1_file in superseded:
+                continue
             if hdr['DETNAM'] == 'HRC-I':
                 hrcI_files.append(evt1_file)
             elif hdr['DETNAM'] == 'HRC-S':
@@ -218,110 +232,209 @@ def inventoryArchive(archivepath, limit=None, verbose=False, sort=False):
         return master_list
 
 
-def screener(evt1file, verbose=False, savepath=None, make_reportCard=True, make_fitsfiles=False, save_json=True, show=False, overwrite=False):  # pragma: no cover
+def streamScreener(evt1file, verbose=False, savepath=None, make_fitsfiles=False, catalog_file=None, softening=1.0, run_manifest=None, signature=None, annotate=False):  # pragma: no cover
+    '''
+    Screen an EVT1 file that is too large to load in bounded memory (see hyperscreen.streamscreen), for screener().
+    Only the summary of its results is kept (in the catalog), so it gets no results file or Report Card.
+    '''
 
-    obs = hypercore.HRCevt1(evt1file)
+    try:
+        screen_start = time.time()
+        if make_fitsfiles is True:
+            if annotate is True:
+                print("{} is streamed, and can't be annotated. Writing its surviving and rejected events instead.".format(evt1file.split('/')[-1]))
+            results_dict = evtscreen.screenHRCevt1(evt1file, savepath=savepath, comparison_products=True, verbose=verbose, softening=softening, stream=True)
+        else:
+            results_dict = streamscreen.stream_hyperscreen(evt1file, None, softening=softening, verbose=verbose, scratch_dir=savepath)
+        screen_time = time.time() - screen_start
 
-    if verbose is True:
-        print("Gathering HyperScreen performance statistics for {} | {}, {} ksec, {:,} counts".format(
-            obs.obsid, obs.detector, round(obs.exptime/1000., 2), obs.numevents))
+        if verbose is True:
+            print("Streamed {} | {}, {} ksec, {:,} counts".format(
+                results_dict['ObsID'], results_dict['Detector'], round(results_dict['Exposure Time']/1000., 2), results_dict['Number of Events']))
+
+        if catalog_file is not None:
+            with catalog.Catalog(catalog_file) as results_catalog:
+                results_catalog.record(results.summarize(results_dict, softening=softening, screen_time=round(screen_time, 3)),
+                                       evt1file=os.path.abspath(evt1file))
+
+        if run_manifest is not None:
+            run_manifest.mark(evt1file, manifest.DONE, softening, signature=signature, obsid=str(results_dict['ObsID']), detector=results_dict['Detector'])
+
+    except Exception as exception_message:
+        print("ERROR streaming {}, pressing on".format(evt1file))
+        print("Exception message is: {}".format(exception_message))
+        if run_manifest is not None:
+            run_manifest.mark(evt1file, manifest.FAILED, softening, signature=signature, error=str(exception_message))
+
+
+def screener(evt1file, verbose=False, savepath=None, make_reportCard=True, make_fitsfiles=False, save_json=True, show=False, overwrite=False, cache=None, catalog_file=None, softening=1.0, manifest_file=None, manifest_hash=False, annotate=False,
+             stream_events=None):  # pragma: no cover
 
-    # if make_reportCard is True:
-    #     reportCard(obs, show=show, savepath=savepath)
-    #     if verbose is True:
-    #         print("Report Card generated for {} | {}, {} ksec, {} counts".format(
-    #             obs.obsid, obs.detector, round(obs.exptime/1000.,2), obs.numevents))
+    reportCard_inputs = None
 
+    run_manifest = None
+    signature = None
+    if manifest_file is not None:
+        run_manifest = manifest.RunManifest(manifest_file, use_hash=manifest_hash)
+        if make_fitsfiles is True:
+            # Writing the FITS files moves the EVT1 file aside, so it's recorded as it is now
+            signature = run_manifest.signature(evt1file, with_hash=manifest_hash is True)
+        run_manifest.mark(evt1file, manifest.STARTED, softening)
+
+    obs = None
     try:
-        results_dict = obs.hyperscreen()
+        if stream_events is not None and fits.getheader(evt1file, 1)['NAXIS2'] >= stream_events:
+            # Too large to load, so it's screened a chunk at a time
+            streamScreener(evt1file, verbose=verbose, savepath=savepath, make_fitsfiles=make_fitsfiles, catalog_file=catalog_file,
+                           softening=softening, run_manifest=run_manifest, signature=signature, annotate=annotate)
+            return reportCard_inputs
+
+        load_start = time.time()
+        obs = hypercore.HRCevt1(evt1file, cache=cache)
+        load_time = time.time() - load_start
+
+        if verbose is True:
+            print("Gathering HyperScreen performance statistics for {} | {}, {} ksec, {:,} counts".format(
+                obs.obsid, obs.detector, round(obs.exptime/1000., 2), obs.numevents))
+
+        # if make_reportCard is True:
+        #     reportCard(obs, show=show, savepath=savepath)
+        #     if verbose is True:
+        #         print("Report Card generated for {} | {}, {} ksec, {} counts".format(
+        #             obs.obsid, obs.detector, round(obs.exptime/1000.,2), obs.numevents))
+
+        screen_start = time.time()
+        results_dict = obs.hyperscreen(softening=softening)
+        screen_time = time.time() - screen_start
+
+        summary_extras = {'softening': softening, 'load_time': round(load_time, 3), 'screen_time': round(screen_time, 3)}
+        results_savepath = None
 
         if save_json is True:
-            json_savepath = os.path.join(savepath, '{}_{}_{}_hyperResults.json'.format(obs.obsid, obs.target.replace(' ', '_'), obs.detector))
+            results_savepath = os.path.join(savepath, '{}_{}_{}{}'.format(obs.obsid, obs.target.replace(' ', '_'), obs.detector, results.RESULTS_SUFFIX))
 
-            if os.path.exists(json_savepath) and overwrite is False:
-                print("{} exists and overwrite=False. Skipping.".format(json_savepath.split('/')[-1]))
+            if os.path.exists(results_savepath) and overwrite is False:
+                print("{} exists and overwrite=False. Skipping.".format(results_savepath.split('/')[-1]))
 
             else:
-                if os.path.exists(json_savepath) and verbose is True:
-                    print("Overwriting existing {}".format(json_savepath.split('/')[-1]))
-                # We don't want JSONify the full results dictionary (which includes embedded dictionaries!)
-                json_reduced_results_dict = {"ObsID": results_dict['ObsID'],
-                                             "Target": results_dict['Target'],
-                                             "Exposure Time": results_dict['Exposure Time'],
-                                             "Detector": results_dict['Detector'],
-                                             "Number of Events": results_dict['Number of Events'],
-                                             "Number of Good Time Events": results_dict['Number of Good Time Events'],
-                                             # YOU CAN'T JSONIFY AN NDARRAY. MUST MAKE IT A LIST!
-                                             "All Survivals (event indices)": results_dict['All Survivals (event indices)'].tolist(),
-                                             "All Survivals (boolean mask)": results_dict['All Survivals (boolean mask)'].tolist(),
-                                             "All Failures (boolean mask)": results_dict['All Failures (boolean mask)'].tolist(),
-                                             "Percent rejected by Tapscreen": results_dict['Percent rejected by Tapscreen'],
-                                             "Percent rejected by Hyperbola": results_dict['Percent rejected by Hyperbola'],
-                                             "Percent improvement": results_dict['Percent improvement']
-                                             }
-
-                with open(json_savepath, 'w') as json_file:
-                    json.dump(json_reduced_results_dict, json_file, sort_keys=True, indent=4)
+                if os.path.exists(results_savepath) and verbose is True:
+                    print("Overwriting existing {}".format(results_savepath.split('/')[-1]))
+                # The summary scalars and the (bit-packed) survival mask; see hyperscreen.results
+                results.save_results(results_dict, results_savepath, **summary_extras)
                 if verbose is True:
-                    print("Created {}".format(json_savepath.split('/')[-1]))
+                    print("Created {}".format(results_savepath.split('/')[-1]))
+
+        if catalog_file is not None:
+            with catalog.Catalog(catalog_file) as results_catalog:
+                results_catalog.record(results.summarize(results_dict, **summary_extras),
+                                       evt1file=os.path.abspath(evt1file), results_file=results_savepath)
 
         if make_reportCard is True:
-            reportCard_savepath = os.path.join(savepath, '{}_{}_{}_hyperReport.pdf'.format(obs.obsid, obs.target.replace(' ', '_'), obs.detector))
+            reportCard_savepath = os.path.join(savepath, '{}_{}_{}{}'.format(obs.obsid, obs.target.replace(' ', '_'), obs.detector, reportcard.REPORT_CARD_SUFFIX))
 
             if os.path.exists(reportCard_savepath) and overwrite is False:
                 print("{} exists and overwrite=False. Skipping.".format(reportCard_savepath.split('/')[-1]))
             else:
                 if os.path.exists(reportCard_savepath) and verbose is True:
                     print("Overwriting existing {}".format(reportCard_savepath.split('/')[-1]))
-                reportCard(obs, hyperscreen_results_dict=results_dict, show=show, reportCard_savepath=reportCard_savepath)
+                # Only the plot inputs are made here. The report card itself is rendered from them in a pool of its own, after screening.
+                reportCard_inputs = reportCard_savepath[:-len(reportcard.REPORT_CARD_SUFFIX)] + reportcard.PLOT_INPUTS_SUFFIX
+                reportcard.save_plot_inputs(reportcard.plot_inputs(obs, results_dict), reportCard_inputs)
 
                 if verbose is True:
-                    print("Report Card generated for {} | {}, {} ksec, {:,} counts".format(
+                    print("Report Card inputs saved for {} | {}, {} ksec, {:,} counts".format(
                         obs.obsid, obs.detector, round(obs.exptime/1000., 2), obs.numevents))
 
         if make_fitsfiles is True:
-            evtscreen.screenHRCevt1(evt1file, hyperscreen_results_dict=results_dict, savepath=savepath, comparison_products=True, verbose=True)
+            evtscreen.screenHRCevt1(evt1file, hyperscreen_results_dict=results_dict, savepath=savepath, comparison_products=True, verbose=True, obs=obs, annotate=annotate, softening=softening)
+
+        if manifest_file is not None:
+            run_manifest.mark(evt1file, manifest.DONE, softening, signature=signature, obsid=str(obs.obsid), detector=obs.detector)
 
     except Exception as exception_message:
-        print("ERROR on {} ({} | {} ksec | {:,} events | {:,} good time events), pressing on".format(
-            obs.obsid, obs.detector, round(obs.exptime/1000, 2), obs.numevents, obs.goodtimeevents))
+        if obs is None:
+            print("ERROR loading {}, pressing on".format(evt1file))
+        else:
+            print("ERROR on {} ({} | {} ksec | {:,} events | {:,} good time events), pressing on".format(
+                obs.obsid, obs.detector, round(obs.exptime/1000, 2), obs.numevents, obs.goodtimeevents))
         print("Exception message is: {}".format(exception_message))
+        if run_manifest is not None:
+            # So that the next run knows it failed, rather than finding it forever started
+            run_manifest.mark(evt1file, manifest.FAILED, softening, signature=signature, error=str(exception_message),
+                              **({} if obs is None else {'obsid': str(obs.obsid), 'detector': obs.detector}))
 
+    # The file of report card plot inputs, if one was saved
+    return reportCard_inputs
 
 
-def screenArchive(evt1_file_list, savepath=None, verbose=False, make_reportCard=True, make_fitsfiles=False, save_json=True, show=False, singlecore=False, overwrite=False):  # pragma: no cover
+def screenArchive(evt1_file_list, savepath=None, verbose=False, make_reportCard=True, make_fitsfiles=False, save_json=True, show=False, singlecore=False, overwrite=False, cache=None, catalog_file=None, softening=1.0, manifest_file=None, manifest_hash=False,
+                  header_index=None, processes=None, maxtasksperchild=scheduler.DEFAULT_MAXTASKSPERCHILD, max_memory=None, bytes_per_event=scheduler.BYTES_PER_EVENT, annotate=False,
+                  render_processes=None, stream_events=None):  # pragma: no cover
     """[summary]
 
     Raises:
         Exception: [description]
     """
 
-    if singlecore is False:
-        p = multiprocessing.Pool()
+    if manifest_file is not None and overwrite is False:
+        # Resume an earlier run: files it finished (unchanged since, with the same softening and version) are skipped before they're read
+        num_files = len(evt1_file_list)
+        evt1_file_list = manifest.RunManifest(manifest_file, use_hash=manifest_hash).pending(evt1_file_list, softening)
+        print("{} of {} EVT1 files are already done according to {}. Skipping them.".format(
+            num_files - len(evt1_file_list), num_files, manifest_file))
 
+    if singlecore is False:
         # This is how you pass a keyword argument to a pool.Map
         kwargs = {'verbose': verbose,  # be chatty
                   # save the products, like report cards and hyperscreen results list-'o-dicts
                   'savepath': savepath,
                   'make_reportCard': make_reportCard,  # make report cards?
                   'make_fitsfiles': make_fitsfiles,  # make FITS files?
+                  'annotate': annotate,  # ... as one annotated file rather than survivors and rejects?
+                  'save_json': save_json,
                   'show': show,
+                  'cache': cache,
+                  'catalog_file': catalog_file,
+                  'softening': softening,
+                  'manifest_file': manifest_file,
+                  'manifest_hash': manifest_hash,
+                  'stream_events': stream_events,  # stream the files with at least this many events
                   'overwrite': overwrite}  # show these? *** DEFINITELY a bad idea if you're screening more than 10 evt1 files! ***
 
-        # Passing kwargs to poolScreen requires wrapping with partial()
-        p.map(partial(screener, **kwargs), evt1_file_list)
+        # The largest observations (by number of events, from the header index) are started first,
+        # and every worker takes the next one as soon as it's free
+        sizes = dict(zip(evt1_file_list, scheduler.task_sizes(evt1_file_list, header_index=header_index)))
+        evt1_file_list = scheduler.largest_first(evt1_file_list, [sizes[evt1_file] for evt1_file in evt1_file_list])
 
-        # Now close the Pool
-        p.close()
-        p.join()
+        # Passing kwargs to poolScreen requires wrapping with partial()
+        if max_memory is None:
+            reportCard_inputs = scheduler.run_pool(partial(screener, **kwargs), evt1_file_list, processes=processes, maxtasksperchild=maxtasksperchild)
+        else:
+            # ... but only while their estimated peak memory fits in the budget. A streamed file never holds more than a chunk of its events.
+            footprints = [scheduler.estimate_footprint(sizes[evt1_file] if stream_events is None or sizes[evt1_file] < stream_events else scheduler.STREAM_CHUNK_EVENTS,
+                                                       bytes_per_event=bytes_per_event) for evt1_file in evt1_file_list]
+            reportCard_inputs = scheduler.run_budgeted(partial(screener, **kwargs), evt1_file_list, footprints, scheduler.parse_memory(max_memory),
+                                                       processes=processes, maxtasksperchild=maxtasksperchild, verbose=verbose)
 
     elif singlecore is True:
 
         if verbose is True:
             print("Multiprocessing is DISABLED (--singlecore=True). Proceeding in serial with one CPU Core.")
 
+        reportCard_inputs = []
         for obs in evt1_file_list:
-            screener(obs, savepath=savepath, verbose=verbose, make_reportCard=make_reportCard, show=show, overwrite=overwrite)
+            reportCard_inputs.append(screener(obs, savepath=savepath, verbose=verbose, make_reportCard=make_reportCard, make_fitsfiles=make_fitsfiles,
+                                              save_json=save_json, show=show, overwrite=overwrite, cache=cache, catalog_file=catalog_file,
+                                              softening=softening, manifest_file=manifest_file, manifest_hash=manifest_hash, annotate=annotate,
+                                              stream_events=stream_events))
+
+    # The report cards are rendered from their plot inputs only once screening is done, so that plotting never holds it up
+    reportCard_inputs = [inputs_file for inputs_file in reportCard_inputs if inputs_file is not None]
+    if len(reportCard_inputs) > 0:
+        if verbose is True:
+            print("Rendering {} Report Cards".format(len(reportCard_inputs)))
+        reportcard.render_report_cards(reportCard_inputs, processes=1 if singlecore is True else (render_processes or processes),
+                                       maxtasksperchild=maxtasksperchild, verbose=verbose)
 
     # pickle_set = create_pickle is True and picklename is not None
     # pickle_unspecified = create_pickle is True and picklename is None
@@ -348,7 +461,13 @@ def main():  # pragma: no cover
         archivepath, limit=None, verbose=args.verbose, sort=False)
 
     screenArchive(evt1_files, savepath=savepath, verbose=args.verbose, make_reportCard=args.reportcard, make_fitsfiles=args.fitsfiles,
-                  save_json=args.save_json, show=args.showplots, singlecore=args.singlecore, overwrite=args.overwrite)
+                  save_json=args.save_json, show=args.showplots, singlecore=args.singlecore, overwrite=args.overwrite, cache=args.cache,
+                  catalog_file=args.catalog if args.catalog is not None else os.path.join(savepath, catalog.CATALOG_FILENAME),
+                  softening=args.softening, manifest_hash=args.hash_manifest,
+                  manifest_file=args.manifest if args.manifest is not None else os.path.join(savepath, manifest.MANIFEST_FILENAME),
+                  header_index=args.header_index if args.header_index is not None else os.path.join(savepath, headerindex.HEADER_INDEX_FILENAME),
+                  processes=args.processes, maxtasksperchild=args.maxtasksperchild, max_memory=args.max_memory, annotate=args.annotate,
+                  render_processes=args.render_processes, stream_events=args.stream_events)
 
     # improvement=[]
     # exptime=[]
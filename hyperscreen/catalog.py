@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""An SQLite catalog of per-observation HyperScreen summaries.
+
+archivescreen records one row per screened observation as it goes, and
+analyze_archivescreen queries the catalog rather than opening every results
+file. Results files written before the catalog existed (or elsewhere) can be
+ingested into it incrementally: each file is read once, and again only if it
+changes.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import sqlite3
+import time
+
+from hyperscreen import results
+
+CATALOG_FILENAME = 'hyperscreen_catalog.sqlite'
+
+# archivescreen used to save its results as JSON files
+LEGACY_RESULTS_SUFFIX = '_hyperResults.json'
+
+# Catalog column names, and the summary keys (see hyperscreen.results) they hold
+SUMMARY_COLUMNS = [('obsid', "ObsID"),
+                   ('target', "Target"),
+                   ('detector', "Detector"),
+                   ('exposure_time', "Exposure Time"),
+                   ('num_events', "Number of Events"),
+                   ('num_good_time_events', "Number of Good Time Events"),
+                   ('percent_rejected_tapscreen', "Percent rejected by Tapscreen"),
+                   ('percent_rejected_hyperbola', "Percent rejected by Hyperbola"),
+                   ('percent_improvement', "Percent improvement"),
+                   ('softening', "softening"),
+                   ('load_time', "load_time"),
+                   ('screen_time', "screen_time")]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    obsid TEXT NOT NULL,
+    target TEXT,
+    detector TEXT NOT NULL,
+    exposure_time REAL,
+    num_events INTEGER,
+    num_good_time_events INTEGER,
+    percent_rejected_tapscreen REAL,
+    percent_rejected_hyperbola REAL,
+    percent_improvement REAL,
+    softening REAL,
+    load_time REAL,
+    screen_time REAL,
+    evt1file TEXT,
+    results_file TEXT,
+    recorded REAL,
+    UNIQUE (obsid, detector, softening)
+);
+CREATE TABLE IF NOT EXISTS ingested_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL
+);
+"""
+
+
+class Catalog:
+    """An SQLite catalog of HyperScreen summaries, one row per observation (and softening).
+
+    Several processes may record into the same catalog at once.
+
+    :param filename: The catalog database file. It is created if it doesn't exist.
+    :type filename: str
+    :param timeout: Seconds to wait for another process to finish writing, defaults to 60
+    :type timeout: float, optional
+    """
+
+    def __init__(self, filename, timeout=60.):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, timeout=timeout)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+
+    def record(self, summary, evt1file=None, results_file=None):
+        """Record (or replace) the summary of one screened observation.
+
+        :param summary: Summary scalars, as from results.summarize() or results.load_summary(). Keys missing from it (e.g. the timings) are recorded as NULL.
+        :type summary: dict
+        :param evt1file: The screened EVT1 file, defaults to None
+        :type evt1file: str, optional
+        :param results_file: The results file holding its masks, defaults to None
+        :type results_file: str, optional
+        """
+        with self.connection:
+            self._insert(summary, evt1file, results_file)
+
+    def _insert(self, summary, evt1file, results_file):
+        names = [column for column, _ in SUMMARY_COLUMNS] + ['evt1file', 'results_file', 'recorded']
+        values = [summary.get(key) for _, key in SUMMARY_COLUMNS] + [evt1file, results_file, time.time()]
+        # ObsIDs are kept as text, whether the header had them as strings or integers
+        values[0] = str(values[0])
+        if evt1file is None:
+            # Keep the EVT1 file of a row that is replaced from its results file
+            row = self.connection.execute("SELECT evt1file FROM observations WHERE obsid = ? AND detector = ? AND softening IS ?",
+                                          (values[0], summary.get("Detector"), summary.get("softening"))).fetchone()
+            values[-3] = row[0] if row is not None else None
+        # UNIQUE doesn't hold for a NULL (unknown) softening, so a replaced row is deleted explicitly
+        self.connection.execute("DELETE FROM observations WHERE obsid = ? AND detector = ? AND softening IS ?",
+                                (values[0], summary.get("Detector"), summary.get("softening")))
+        self.connection.execute("INSERT INTO observations ({}) VALUES ({})".format(
+            ', '.join(names), ', '.join('?' * len(names))), values)
+
+    def ingest(self, results_dir, verbose=False):
+        """Record every results file (and legacy JSON result file) in results_dir that is new, or changed since it was last ingested.
+
+        :param results_dir: A directory of archivescreen results
+        :type results_dir: str
+        :return: The number of files ingested
+        :rtype: int
+        """
+        ingested = dict((path, (size, mtime)) for path, size, mtime in
+                        self.connection.execute("SELECT path, size, mtime FROM ingested_files"))
+
+        count = 0
+        with self.connection:
+            for name in sorted(os.listdir(results_dir)):
+                if not (name.endswith(results.RESULTS_SUFFIX) or name.endswith(LEGACY_RESULTS_SUFFIX)):
+                    continue
+                path = os.path.abspath(os.path.join(results_dir, name))
+                stat = os.stat(path)
+                if ingested.get(path) == (stat.st_size, stat.st_mtime):
+                    continue
+
+                if verbose is True:
+                    print("Ingesting {}".format(name))
+                if name.endswith(results.RESULTS_SUFFIX):
+                    summary = results.load_summary(path)
+                else:
+                    with open(path) as json_file:
+                        summary = json.load(json_file)
+
+                self._insert(summary, None, path)
+                self.connection.execute("INSERT OR REPLACE INTO ingested_files (path, size, mtime) VALUES (?, ?, ?)",
+                                        (path, stat.st_size, stat.st_mtime))
+                count += 1
+
+        return count
+
+    def query(self, where=None, parameters=(), limit=None):
+        """Summary rows of the catalog, as dictionaries keyed like a results summary (e.g. "Percent improvement").
+
+        :param where: An SQL condition on the catalog columns (see SUMMARY_COLUMNS), e.g. "detector = ?", defaults to None (all rows)
+        :type where: str, optional
+        :param parameters: Values of the ? placeholders in where, defaults to ()
+        :type parameters: tuple, optional
+        :param limit: Return at most this many rows, defaults to None (no limit)
+        :type limit: int, optional
+        :rtype: list of dict
+        """
+        sql = "SELECT {} FROM observations".format(', '.join(column for column, _ in SUMMARY_COLUMNS))
+        if where is not None:
+            sql += " WHERE " + where
+        sql += " ORDER BY obsid, detector"
+        if limit is not None:
+            sql += " LIMIT {:d}".format(limit)
+
+        keys = [key for _, key in SUMMARY_COLUMNS]
+        return [dict(zip(keys, row)) for row in self.connection.execute(sql, parameters)]
+
+    def trends(self, limit=None):
+        """The trends of HyperScreen performance across the catalog, as plotted by analyze_archivescreen.
+
+        :param limit: Use at most this many observations, defaults to None (no limit)
+        :type limit: int, optional
+        :return: Lists of exposure times (ksec), improvements, numbers of events, and legacy and HyperScreen rejection percentages
+        :rtype: dict
+        """
+        rows = self.query(limit=limit)
+
+        return {'Exposure Times': [round(row['Exposure Time'] / 1000, 2) for row in rows],
+                'Improvement': [row['Percent improvement'] for row in rows],
+                'Number of Events': [row['Number of Events'] for row in rows],
+                'Legacy Hyperbola Test Percent': [row['Percent rejected by Hyperbola'] for row in rows],
+                'Hyperscreen Percent': [row['Percent rejected by Tapscreen'] for row in rows]}
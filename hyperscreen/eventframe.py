@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A pandas DataFrame of HRC events whose columns can be loaded on first access."""
+
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+
+class EventFrame(pd.DataFrame):
+    """A pandas DataFrame of HRC events with deferred columns.
+
+    A deferred column is not held in memory until it is first accessed with
+    ``frame[name]`` (or ``frame.name``), at which point it is loaded and kept
+    like any other column. A view is computed from other data every time it is
+    accessed and is never stored. Frames derived from an EventFrame (slices,
+    copies, ...) are ordinary DataFrames holding only the columns loaded so
+    far, and none of the views.
+
+    Unlike a DataFrame holding all of its columns, ``frame.columns`` lists only
+    the columns loaded so far. The others are listed by deferred_columns and
+    view_names, and ``name in frame`` covers all three.
+    """
+
+    _metadata = ['_deferred', '_views']
+    _deferred = None
+    _views = None
+
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    def defer(self, loaders):
+        """Register deferred columns.
+
+        Several columns may share one loader that returns all of their values at
+        once, as a dictionary keyed by column name. They are then all loaded
+        together, the first time any one of them is accessed.
+
+        :param loaders: A dictionary mapping each deferred column name to a callable that returns its values
+        :type loaders: dict
+        """
+        if self._deferred is None:
+            self._deferred = {}
+        self._deferred.update(loaders)
+
+    def add_views(self, views):
+        """Register views.
+
+        :param views: A dictionary mapping each view name to a callable that returns its values
+        :type views: dict
+        """
+        if self._views is None:
+            self._views = {}
+        self._views.update(views)
+
+    def is_view(self, key):
+        """Whether key names a view (and not a column) of this frame."""
+        return isinstance(key, str) and key in (self._views or {}) and key not in self.columns
+
+    @property
+    def view_names(self):
+        """The names of the views of this frame."""
+        return list(self._views or [])
+
+    @property
+    def deferred_columns(self):
+        """The names of the deferred columns that have not been loaded yet."""
+        return list(self._deferred or [])
+
+    def load(self, key):
+        """Load a deferred column, if it has not been loaded already."""
+        if self._deferred and key in self._deferred and key not in self.columns:
+            values = self._deferred.pop(key)()
+            if not isinstance(values, dict):
+                values = {key: values}
+            for name, column in values.items():
+                self._deferred.pop(name, None)
+                self[name] = column
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if self.is_view(key):
+                return pd.Series(self._views[key](), index=self.index, name=key)
+            self.load(key)
+        elif isinstance(key, list):
+            if any(self.is_view(name) for name in key):
+                return pd.DataFrame({name: self[name] for name in key}, index=self.index, columns=key)
+            for name in key:
+                if isinstance(name, str):
+                    self.load(name)
+        return super(EventFrame, self).__getitem__(key)
+
+    def __getattr__(self, name):
+        # Deferred columns and views are attributes too, like the columns of a DataFrame (e.g. frame.fb_u)
+        if not name.startswith('_') and (name in (self._deferred or {}) or name in (self._views or {})):
+            return self[name]
+        return super(EventFrame, self).__getattr__(name)
+
+    def __contains__(self, key):
+        return (super(EventFrame, self).__contains__(key) or key in (self._deferred or {})
+                or key in (self._views or {}))
+
+
+def native(column):
+    """A copy of a (FITS, big-endian) column in native byte order, as pandas expects."""
+    column = np.asarray(column)
+    return column.astype(column.dtype.newbyteorder('='))
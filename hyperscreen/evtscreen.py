@@ -7,6 +7,7 @@ from __future__ import division
 from __future__ import print_function
 
 from hyperscreen import hypercore
+from hyperscreen import streamscreen
 import os
 import sys
 from shutil import copyfile
@@ -26,6 +27,12 @@ def getArgs(argv=None):
     parser.add_argument('-c', '--comparison_products', action='store_true',
                         help='Make additional HyperScreen result images (rejected events & difference map)')
 
+    parser.add_argument('-a', '--annotate', action='store_true',
+                        help='Write one EVT1 file in which every event is flagged with the HyperScreen decision, instead of separate files of the surviving and rejected events.')
+
+    parser.add_argument('--stream', action='store_true',
+                        help='Screen the EVT1 file in bounded memory, a chunk of events at a time, for files too large to load. The file is read three times (a gzipped file is first decompressed once, into the products directory). Not with --annotate.')
+
     parser.add_argument('-v', '--verbose', action='store_true',
                         help='Make HyperScreen chatty on stdout.')
 
@@ -35,9 +42,44 @@ def getArgs(argv=None):
     return parser.parse_args(argv)
 
 
-def screenHRCevt1(input_fits_file, hyperscreen_results_dict=None, comparison_products=True, savepath=None, verbose=True, backup=True):
+def screenHRCevt1(input_fits_file, hyperscreen_results_dict=None, comparison_products=True, savepath=None, verbose=True, backup=True, obs=None, annotate=False, softening=1.0, stream=False):
+    """Write the HyperScreen-filtered EVT1 file (and the rejected events) of an observation, and back up the original.
+
+    Both products are written in a single pass over the events. If the
+    observation is already loaded (obs), its events are copied from memory and
+    the EVT1 file is not read (or decompressed) again. Otherwise it is streamed
+    once, after screening it if hyperscreen_results_dict isn't given. With
+    stream, the EVT1 file is never loaded, and is screened as its products are
+    written (see streamscreen.stream_hyperscreen()).
+
+    :param input_fits_file: A .fits (or .fits.gz) file containing the level 1 event list
+    :type input_fits_file: str
+    :param hyperscreen_results_dict: The results of HRCevt1.hyperscreen() for this file, defaults to None (screen it here)
+    :type hyperscreen_results_dict: dict, optional
+    :param comparison_products: Also write the rejected events, defaults to True
+    :type comparison_products: bool, optional
+    :param savepath: Directory in which to make the products directory, defaults to None (the directory of input_fits_file)
+    :type savepath: str, optional
+    :param obs: The already loaded observation of input_fits_file, defaults to None
+    :type obs: hypercore.HRCevt1, optional
+    :param annotate: Instead, write a single copy of the EVT1 file in which every event is flagged with the HyperScreen decision (see streamscreen.write_annotated()), defaults to False
+    :type annotate: bool, optional
+    :param softening: The softening HyperScreen is (or was) run with, defaults to 1.0
+    :type softening: float, optional
+    :param stream: Screen the events in bounded memory, a chunk at a time, for EVT1 files too large to load (not with annotate), defaults to False
+    :type stream: bool, optional
+    :return: The HyperScreen results (only their summary entries, if streamed)
+    :rtype: dict
+    """
 
-    obsid = fits.getheader(input_fits_file)['OBS_ID']
+    # Check if the passed input file is a string ending with .fits or .fits.gz
+    if isinstance(input_fits_file, str):
+        filetype_match = input_fits_file.split(
+            '.')[-1] == 'fits' or input_fits_file.split('.')[-1] == 'gz'
+
+        if filetype_match is False:
+            raise Exception(
+                'ERROR: Input given ({}) is not recognized as a .fits[.gz] or HRCevt1 object.'.format(input_fits_file))
 
     # Get the root string to use as our naming convention
     file_name = input_fits_file.split('/')[-1]  # Split off the path
@@ -45,6 +87,28 @@ def screenHRCevt1(input_fits_file, hyperscreen_results_dict=None, comparison_pro
     file_root = file_name.split('.fits')[0].split('_')[0]
     file_path = os.path.realpath(os.path.dirname(input_fits_file))
     print(file_path)
+
+    if stream is True:
+        if annotate is True:
+            raise Exception('ERROR: {} can only be annotated once it is loaded, not while it is streamed.'.format(file_name))
+        # It's screened below, while its products are written
+        hyperscreen_results = None
+    elif hyperscreen_results_dict is None:
+        # Then you need to make it!
+        if verbose is True:
+            print("Applying HyperScreen algorithm to {}".format(file_name))
+        if obs is None:
+            obs = hypercore.HRCevt1(input_fits_file)
+        hyperscreen_results = obs.hyperscreen(softening=softening)
+    else:
+        hyperscreen_results = hyperscreen_results_dict
+
+    # The products are named after the OBS_ID of the primary header, read from the loaded observation if it still holds the file
+    if obs is not None and obs.hdulist is not None:
+        obsid = obs.hdulist[0].header['OBS_ID']
+    else:
+        obsid = fits.getheader(input_fits_file)['OBS_ID']
+
     if savepath is None:
         savepath = file_path
     backup_dir = os.path.join(
@@ -55,24 +119,6 @@ def screenHRCevt1(input_fits_file, hyperscreen_results_dict=None, comparison_pro
         if verbose is True:
             print("Made HyperScreen Products Directory {}".format(backup_dir))
 
-    # Check if the passed input file is a string ending with .fits or .fits.gz
-    if isinstance(input_fits_file, str):
-        filetype_match = input_fits_file.split(
-            '.')[-1] == 'fits' or input_fits_file.split('.')[-1] == 'gz'
-
-        if filetype_match is False:
-            raise Exception(
-                'ERROR: Input given ({}) is not recognized as a .fits[.gz] or HRCevt1 object.'.format(input_fits_file))
-
-    if hyperscreen_results_dict is None:
-        # Then you need to make it!
-        if verbose is True:
-            print("Applying HyperScreen algorithm to {}".format(file_name))
-        obs = hypercore.HRCevt1(input_fits_file)
-        hyperscreen_results = obs.hyperscreen()
-    else:
-        hyperscreen_results = hyperscreen_results_dict
-
     # if backup is True:
     #     if not os.path.exists(backup_dir):
     #         os.makedirs(backup_dir)
@@ -92,24 +138,36 @@ def screenHRCevt1(input_fits_file, hyperscreen_results_dict=None, comparison_pro
         backup_dir, '{}_hyperscreen_rejected_events.fits'.format(obsid))
     # difference_map_file = file_path + '/hyperscreen_DIFFERENCE_MAP_' + file_name
 
-    survival_mask = hyperscreen_results['All Survivals (boolean mask)']
-    failure_mask = hyperscreen_results['All Failures (boolean mask)']
+    # Copy the events straight from the loaded observation if it still holds them (it doesn't if it came from a sidecar cache)
+    if obs is not None and obs.hdulist is not None:
+        source = obs.hdulist
+    else:
+        source = input_fits_file
 
-    with fits.open(input_fits_file) as hdul:
-        original_data = hdul[1].data
-        hdul[1].data = hdul[1].data[survival_mask]
+    if stream is True:
+        if verbose is True:
+            print("Streaming HyperScreen through {}".format(file_name))
+        # A gzipped EVT1 file is decompressed once, next to the products (where there's room for them)
+        hyperscreen_results = streamscreen.stream_hyperscreen(input_fits_file, hyperscreen_fits_file, softening=softening, verbose=verbose, scratch_dir=backup_dir,
+                                                              rejected_file=rejected_events_file if comparison_products is True else None)
+        if verbose is True:
+            print("Wrote new HyperScreen-filtered evt1 file to {}".format(hyperscreen_fits_file))
+    elif annotate is True:
+        survival_mask = hyperscreen_results['All Survivals (boolean mask)']
+        streamscreen.write_annotated(source, survival_mask, hyperscreen_fits_file, softening=softening)
+        if verbose is True:
+            print("Wrote new HyperScreen-annotated evt1 file to {}".format(hyperscreen_fits_file))
+    else:
         if verbose is True:
             print("Masking data with HyperScreen Results")
-        hdul.writeto(hyperscreen_fits_file, overwrite=True)
+        survival_mask = hyperscreen_results['All Survivals (boolean mask)']
+        streamscreen.write_products(source, survival_mask, hyperscreen_fits_file,
+                                    rejected_file=rejected_events_file if comparison_products is True else None)
 
         if verbose is True:
             print(
                 "Wrote new HyperScreen-filtered evt1 file to {}".format(hyperscreen_fits_file))
-
-        if comparison_products is True:
-            hdul[1].data = original_data[failure_mask]
-            hdul.writeto(rejected_events_file, overwrite=True)
-            if verbose is True:
+            if comparison_products is True:
                 print("Wrote Rejected Events Map {}".format(rejected_events_file))
 
     original_evt1_file_path = os.path.join(
@@ -117,13 +175,15 @@ def screenHRCevt1(input_fits_file, hyperscreen_results_dict=None, comparison_pro
     os.rename(input_fits_file, original_evt1_file_path)
     print("Backed up original evt1 file to {}".format(original_evt1_file_path))
 
+    return hyperscreen_results
+
 
 def main():
 
     args = getArgs()
 
     screenHRCevt1(args.input_fits_file, verbose=True,
-                  comparison_products=args.comparison_products)
+                  comparison_products=args.comparison_products, annotate=args.annotate, stream=args.stream)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A cached index of the EVENTS headers of an archive of EVT1 files.
+
+Sorting an archive by detector (or by size, for scheduling) needs a few
+keywords from the EVENTS header of every EVT1 file, and on a network
+filesystem opening tens of thousands of (gzipped) files one after the other
+is slow. The header index keeps those keywords, keyed by path and checked
+against each file's size and mtime, in a JSON file. Only new or changed files
+are read, in parallel.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from astropy.io import fits
+
+HEADER_INDEX_FILENAME = 'hyperscreen_header_index.json'
+
+# The EVENTS header keywords kept in the index
+INDEX_KEYWORDS = ['DETNAM', 'OBS_ID', 'EXPOSURE', 'NAXIS2']
+
+
+def read_header_entry(evt1file):
+    """Read the index entry of one EVT1 file: its path, size, mtime and INDEX_KEYWORDS.
+
+    If the header can't be read, the entry holds the error message instead of the keywords.
+
+    :param evt1file: The EVT1 file
+    :type evt1file: str
+    :rtype: dict
+    """
+    path = os.path.abspath(evt1file)
+    stat = os.stat(path)
+    entry = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    try:
+        header = fits.getheader(path, 1)
+        entry.update({keyword: header[keyword] for keyword in INDEX_KEYWORDS})
+    except Exception as exception_message:
+        entry['error'] = str(exception_message)
+
+    return entry
+
+
+class HeaderIndex:
+    """A header index of EVT1 files.
+
+    :param filename: The JSON file holding the index. It is created when the index is first saved. Defaults to None, for an index that is only kept in memory.
+    :type filename: str, optional
+    :param workers: Number of headers read at once, defaults to 16
+    :type workers: int, optional
+    """
+
+    def __init__(self, filename=None, workers=16):
+        self.filename = filename
+        self.workers = workers
+        self.entries = {}
+
+        if filename is not None and os.path.exists(filename):
+            try:
+                with open(filename) as index_file:
+                    self.entries = json.load(index_file)
+            except ValueError:
+                pass  # a corrupt index is simply rebuilt
+
+    def is_current(self, evt1file):
+        """Whether the index holds an entry for evt1file that is up to date with its size and mtime."""
+        path = os.path.abspath(evt1file)
+        entry = self.entries.get(path)
+        if entry is None:
+            return False
+        stat = os.stat(path)
+        return entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime
+
+    def update(self, evt1_files, verbose=False):
+        """Read the headers of the EVT1 files that are new to the index (or changed), in parallel, and save the index.
+
+        :param evt1_files: The EVT1 files
+        :type evt1_files: list
+        :return: The number of headers read
+        :rtype: int
+        """
+        stale = [evt1file for evt1file in evt1_files if not self.is_current(evt1file)]
+
+        if verbose is True:
+            print("Header index is current for {} of {} EVT1 files. Reading {} headers.".format(
+                len(evt1_files) - len(stale), len(evt1_files), len(stale)))
+
+        if len(stale) > 0:
+            pool = ThreadPool(max(1, min(self.workers, len(stale))))
+            try:
+                for entry in pool.imap_unordered(read_header_entry, stale, chunksize=8):
+                    self.entries[entry['path']] = entry
+            finally:
+                pool.close()
+                pool.join()
+            self.save()
+
+        return len(stale)
+
+    def save(self):
+        """Write the index to its file (if it has one), atomically."""
+        if self.filename is None:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        partial_file = '{}.{}.tmp'.format(self.filename, os.getpid())
+        with open(partial_file, 'w') as index_file:
+            json.dump(self.entries, index_file)
+        os.replace(partial_file, self.filename)
+
+    def lookup(self, evt1_files):
+        """The index entries of the EVT1 files, updating the index first if need be.
+
+        :param evt1_files: The EVT1 files
+        :type evt1_files: list
+        :return: Their entries, in the same order
+        :rtype: list of dict
+        """
+        self.update(evt1_files)
+        return [self.entries[os.path.abspath(evt1file)] for evt1file in evt1_files]
+
+    def duplicates(self, evt1_files):
+        """Find ObsIDs with more than one EVT1 file (e.g. from different processing versions).
+
+        :param evt1_files: The EVT1 files
+        :type evt1_files: list
+        :return: The EVT1 files (sorted by name) of every duplicated ObsID
+        :rtype: collections.OrderedDict
+        """
+        by_obsid = OrderedDict()
+        for evt1file, entry in zip(evt1_files, self.lookup(evt1_files)):
+            if 'error' not in entry:
+                by_obsid.setdefault(str(entry['OBS_ID']), []).append(evt1file)
+
+        return OrderedDict((obsid, sorted(files, key=os.path.basename))
+                           for obsid, files in by_obsid.items() if len(files) > 1)
@@ -8,31 +8,43 @@ from __future__ import division
 from __future__ import print_function
 
 import colorama
-from tqdm import tqdm as progressbar
 import sys
 import os
 
-import warnings
-
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-from matplotlib.colors import LogNorm
+from collections import OrderedDict
+from functools import lru_cache, partial
 
 from astropy.io import fits
 from astropy.table import Table
 
+from hyperscreen import sidecar
+from hyperscreen import statusbits
+from hyperscreen import tapscreen
 
-import skimage.data as data
-import skimage.segmentation as seg
-import skimage.filters as filters
-import skimage.draw as draw
-import skimage.color as color
-
-import pandas as pd
 import numpy as np
 np.seterr(divide='ignore')
 
-colorama.init()
+# matplotlib and skimage are slow to import, and screening needs neither. Like pandas (through
+# hyperscreen.eventframe, for a DataFrame of events), they're only imported by the code that uses them.
+
+# The only EVT1 columns read when screening. With HRCevt1(lazy=True), all others are loaded on first access.
+SCREENING_COLUMNS = ['time', 'crsu', 'crsv', 'au1', 'au2', 'au3', 'av1', 'av2', 'av3', 'status']
+
+# The (fb, fp) extent of boomerang plots
+BOOMERANG_EXTENT = (-0.1, 1.1, -1.1, 1.1)
+# Boomerang plots of observations with at least this many events are rendered as density images, on a grid of this many (fb, fp) cells
+BOOMERANG_DENSITY_EVENTS = 500000
+BOOMERANG_DENSITY_BINS = (600, 550)
+
+# The (a, b, h) coefficients of the legacy (Murray+) hyperbola test, by detector and axis
+LEGACY_HYPERBOLA_COEFFICIENTS = {'HRC-I': {'u': (0.3110, 0.3030, 1.0580),
+                                           'v': (0.3050, 0.2730, 1.1)},
+                                 'HRC-S': {'u': (0.2706, 0.2620, 1.0180),
+                                           'v': (0.2706, 0.2480, 1.0710)}}
+# Number of fb samples of each curve of the legacy zone overlay on boomerang plots
+LEGACY_ZONE_SAMPLES = 1000
+# Number of events at a time in the legacy hyperbola test
+LEGACY_TEST_CHUNK = 65536
 
 
 class HRCevt1:
@@ -42,7 +54,7 @@ class HRCevt1:
     :rtype: pandas.DataFrame or astropy.table.table.Table
     """
 
-    def __init__(self, evt1file, verbose=False, as_astropy_table=False):
+    def __init__(self, evt1file, verbose=False, as_astropy_table=False, lazy=False, cache=None):
         """The constructor method for the HRCevt1 class
 
         :param evt1file: A .fits (or fits.gz) file containing the level 1 event list. If downloaded from the Chandra database, this file always has a *evt1.fits extension. This event list includes all events telemetered.
@@ -51,32 +63,67 @@ class HRCevt1:
         :type verbose: bool, optional
         :param as_astropy_table: Set as_astropy_table to True in order to have the HRCevt1 constructor method return an Astropy Table object, rather than a Pandas DataFrame. Defaults to False.
         :type as_astropy_table: bool, optional
+        :param lazy: Set lazy=True to memory-map the EVT1 file (if it is uncompressed) and read only the columns needed for screening (see SCREENING_COLUMNS). Every other column is loaded the first time it is accessed. Ignored if as_astropy_table=True. Defaults to False.
+        :type lazy: bool, optional
+        :param cache: A sidecar cache directory (or sidecar.SidecarCache). If the EVT1 file is already cached there, its events and fp, fb values are memory-mapped from the cache and the file itself is not read. Otherwise, they are cached for next time. Ignored if as_astropy_table=True. Defaults to None (no cache).
+        :type cache: str or sidecar.SidecarCache, optional
         """
 
         # Define how chatty to be
         self.verbose = verbose
 
+        if self.verbose is True:
+            _init_colorama()
+
+        if as_astropy_table is False:
+            # The events are held in a pandas DataFrame
+            from hyperscreen import eventframe
+
         if self.verbose is True:
             print(colorama.Fore.BLUE + '\nParsing HRC EVT1 file...', end=" ")
-        # Do a standard read in of the EVT1 fits table
         self.filename = evt1file
-        self.hdulist = fits.open(evt1file)
-        self.data = Table(self.hdulist[1].data)
-        self.header = self.hdulist[1].header
-        self.gti = self.hdulist[2].data
-        self.hdulist.close()  # Don't forget to close your fits file!
+
+        if cache is not None and as_astropy_table is False and not isinstance(cache, sidecar.SidecarCache):
+            cache = sidecar.SidecarCache(cache)
+        cached = cache.load(evt1file) if cache is not None and as_astropy_table is False else None
+
+        if cached is not None:
+            # Everything is memory-mapped from the sidecar cache. The EVT1 file isn't read at all.
+            self.hdulist = None
+            self.status = statusbits.StatusBits(cached.column('status'))
+            columns = [name for name in SCREENING_COLUMNS if name != 'status']
+            self.data = Table([cached.column(name) for name in columns], names=columns, copy=False)
+            deferred_columns = {name: partial(cached.column, name) for name in cached.event_columns if name not in SCREENING_COLUMNS}
+            self.header = cached.header
+            self.gti = cached.gti
+        else:
+            # Do a standard read in of the EVT1 fits table
+            # Unless lazy, the events are read into memory rather than memory-mapped, so that they outlive the (closed) file
+            self.hdulist = fits.open(evt1file, memmap=lazy is True)
+            events = self.hdulist[1].data
+            # The status bits are kept packed, one uint32 per event, straight from the raw status bytes
+            self.status = statusbits.StatusBits.from_table(events)
+            if as_astropy_table is True:
+                self.data = Table(events)
+                deferred_columns = {}
+            else:
+                # With lazy=True, only the screening columns are read now. The (memory-mapped) events stay referenced by the loaders of the others.
+                # The 32X status column doesn't grok with Pandas; it's replaced by the packed status bits.
+                columns = [name for name in (SCREENING_COLUMNS if lazy is True else events.names) if name != 'status']
+                self.data = Table([events[name] for name in columns], names=columns, copy=False)
+                deferred_columns = {name: partial(eventframe.native, events[name]) for name in events.names
+                                    if name not in SCREENING_COLUMNS} if lazy is True else {}
+            self.header = self.hdulist[1].header
+            self.gti = self.hdulist[2].data
+            # Every HDU stays available once the file is closed, e.g. to write filtered products (see streamscreen.write_products)
+            self.hdulist.readall()
+            self.hdulist.close()  # Don't forget to close your fits file!
 
         # Make sure the user isn't running this on an ACIS observation!
         if self.header["DETNAM"][:4] == 'ACIS':
             raise Exception(
                 "ERROR: HRCevt1 objects can only be initialized for Chandra/HRC observations. This is a Chandra/ACIS observation.")
 
-        # Populate the fp, fb values for ever event
-        if self.verbose is True:
-            print(colorama.Fore.BLUE + 'Calculating fp, fb values...', end=" ")
-        fp_u, fb_u, fp_v, fb_v = self.calculate_fp_fb()
-
-        # Populate the fp, fb values for ever event
         if self.verbose is True:
             print(colorama.Fore.BLUE + 'Applying GTI mask... ', end=" ")
         self.gti.starts = self.gti['START']
@@ -85,51 +132,19 @@ class HRCevt1:
         self.gtimask = (self.data["time"] > self.gti.starts[0]) & (
             self.data["time"] < self.gti.stops[-1])
 
-        # Populate the fp, fb values for every event
-        if self.verbose is True:
-            print(colorama.Fore.BLUE + 'Populating metadata columns...', end=" ")
-        self.data["fp_u"] = fp_u
-        self.data["fb_u"] = fb_u
-        self.data["fp_v"] = fp_v
-        self.data["fb_v"] = fb_v
-
-        # Make individual status bit columns with legible names
-        self.data["AV3 corrected for ringing"] = self.data["status"][:, 0]
-        self.data["AU3 corrected for ringing"] = self.data["status"][:, 1]
-        self.data["Event impacted by prior event (piled up)"] = self.data["status"][:, 2]
-        # Bit 4 (Python 3) is spare
-        self.data["Shifted event time"] = self.data["status"][:, 4]
-        self.data["Event telemetered in NIL mode"] = self.data["status"][:, 5]
-        self.data["V axis not triggered"] = self.data["status"][:, 6]
-        self.data["U axis not triggered"] = self.data["status"][:, 7]
-        self.data["V axis center blank event"] = self.data["status"][:, 8]
-        self.data["U axis center blank event"] = self.data["status"][:, 9]
-        self.data["V axis width exceeded"] = self.data["status"][:, 10]
-        self.data["U axis width exceeded"] = self.data["status"][:, 11]
-        self.data["Shield PMT active"] = self.data["status"][:, 12]
-        # Bit 14 (Python 13) is hardware spare
-        self.data["Upper level discriminator not exceeded"] = self.data["status"][:, 14]
-        self.data["Lower level discriminator not exceeded"] = self.data["status"][:, 15]
-        self.data["Event in bad region"] = self.data["status"][:, 16]
-        self.data["Amp total on V or U = 0"] = self.data["status"][:, 17]
-        self.data["Incorrect V center"] = self.data["status"][:, 18]
-        self.data["Incorrect U center"] = self.data["status"][:, 19]
-        self.data["PHA ratio test failed"] = self.data["status"][:, 20]
-        self.data["Sum of 6 taps = 0"] = self.data["status"][:, 21]
-        self.data["Grid ratio test failed"] = self.data["status"][:, 22]
-        self.data["ADC sum on V or U = 0"] = self.data["status"][:, 23]
-        self.data["PI exceeding 255"] = self.data["status"][:, 24]
-        self.data["Event time tag is out of sequence"] = self.data["status"][:, 25]
-        self.data["V amp flatness test failed"] = self.data["status"][:, 26]
-        self.data["U amp flatness test failed"] = self.data["status"][:, 27]
-        self.data["V amp saturation test failed"] = self.data["status"][:, 28]
-        self.data["U amp saturation test failed"] = self.data["status"][:, 29]
-        self.data["V hyperbolic test failed"] = self.data["status"][:, 30]
-        self.data["U hyperbolic test failed"] = self.data["status"][:, 31]
-        self.data["Hyperbola test passed"] = np.logical_not(np.logical_or(
-            self.data['U hyperbolic test failed'], self.data['V hyperbolic test failed']))
-        self.data["Hyperbola test failed"] = np.logical_or(
-            self.data['U hyperbolic test failed'], self.data['V hyperbolic test failed'])
+        # Individual status bit columns with legible names are views of the packed status bits
+        # (see statusbits.STATUS_FLAGS). Only an Astropy Table holds them as actual columns.
+        # The fp, fb values and hyperbola test columns of a DataFrame are only computed (once) when first accessed.
+        if as_astropy_table is True:
+            if self.verbose is True:
+                print(colorama.Fore.BLUE + 'Populating metadata columns...', end=" ")
+            for axis in ['u', 'v']:
+                for name, values in self.fine_positions(axis).items():
+                    self.data[name] = values
+            for name, view in self.status.views().items():
+                self.data[name] = view()
+            for name, values in self.status.hyperbola_test().items():
+                self.data[name] = values
 
         self.obsid = self.header["OBS_ID"]
         self.obs_date = self.header["DATE"]
@@ -142,15 +157,6 @@ class HRCevt1:
         self.goodtimeevents = len(self.data["time"][self.gtimask])
         self.badtimeevents = self.numevents - self.goodtimeevents
 
-        self.hyperbola_passes = np.sum(np.logical_or(
-            self.data['U hyperbolic test failed'], self.data['V hyperbolic test failed']))
-        self.hyperbola_failures = np.sum(np.logical_not(np.logical_or(
-            self.data['U hyperbolic test failed'], self.data['V hyperbolic test failed'])))
-
-        if self.hyperbola_passes + self.hyperbola_failures != self.numevents:
-            warnings.warn("Number of Hyperbola Test Failures and Passes ({}) does not equal total number of events ({}).".format(
-                self.hyperbola_passes + self.hyperbola_failures, self.numevents))
-
         if self.verbose is True:
             print(colorama.Fore.GREEN + 'Done')
 
@@ -165,9 +171,26 @@ class HRCevt1:
             print(colorama.Fore.RED + '\nConverting EVT1 file to {}...'.format(read_type), end=" ")
 
         if as_astropy_table is False:
-            # Multidimensional columns don't grok with Pandas
-            self.data.remove_column('status')
-            self.data = self.data.to_pandas()
+            self.data = eventframe.EventFrame(self.data.to_pandas())
+            self.data['status'] = self.status.bits
+            self.data.add_views(self.status.views())
+            self.data.defer(deferred_columns)
+            if cached is not None:
+                self.data.defer({name: partial(cached.columns, ['fp_' + axis, 'fb_' + axis]) for axis in ['u', 'v']
+                                 for name in ['fp_' + axis, 'fb_' + axis]})
+            else:
+                self.data.defer({name: partial(self.fine_positions, axis) for axis in ['u', 'v']
+                                 for name in ['fp_' + axis, 'fb_' + axis]})
+            self.data.defer({name: self.status.hyperbola_test for name in ['Hyperbola test passed', 'Hyperbola test failed']})
+
+            if cache is not None and cached is None:
+                if self.verbose is True:
+                    print(colorama.Fore.BLUE + 'Caching events in {}...'.format(cache.directory), end=" ")
+                # Columns are copied into the cache straight from the EVT1 file, one at a time, without loading any deferred ones into memory
+                event_columns = OrderedDict((name, partial(eventframe.native, events[name])) for name in events.names if name != 'status')
+                event_columns['status'] = self.status.bits
+                cache.store(evt1file, self.header, self.gti, event_columns,
+                            OrderedDict((name, self.data[name].values) for name in ['fp_u', 'fb_u', 'fp_v', 'fb_v']))
 
         if self.verbose is True:
             print(colorama.Fore.GREEN + 'Done')
@@ -180,6 +203,38 @@ class HRCevt1:
         """
         return "HRC EVT1 object with {} events. Data is packaged as a Pandas Dataframe (or an Astropy Table if as_astropy_table=True on initialization.)".format(self.numevents)
 
+    @property
+    def hyperbola_passes(self):
+        """Number of events flagged as failing the legacy hyperbola test on either axis (sic; kept for backwards compatibility)"""
+        return self.status.count(statusbits.HYPERBOLA_FLAGS)
+
+    @property
+    def hyperbola_failures(self):
+        """Number of events flagged as passing the legacy hyperbola test on both axes (sic; kept for backwards compatibility)"""
+        return np.count_nonzero(self.status.none_of(statusbits.HYPERBOLA_FLAGS))
+
+    def fine_positions(self, axis):
+        """Calculate the Fine Position (fp) and normalized central tap amplitude (fb) for one HRC axis.
+
+        :param axis: The HRC axis, 'u' or 'v'
+        :type axis: str
+        :return: A dictionary with the fp and fb values of every event, keyed by column name (e.g. 'fp_u' and 'fb_u')
+        :rtype: dict
+        """
+
+        a = np.asarray(self.data["a{}1".format(axis)])  # otherwise known as "a1"
+        b = np.asarray(self.data["a{}2".format(axis)])  # "a2"
+        c = np.asarray(self.data["a{}3".format(axis)])  # "a3"
+
+        # Both share the sum of the three tap amplitudes (in the amplitudes' own integer type)
+        total = a + b + c
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fp = (c - a) / total
+            fb = b / total
+
+        return {"fp_" + axis: fp, "fb_" + axis: fb}
+
     def calculate_fp_fb(self):
         """Method to calculate the Fine Position (f_p) and normalized central tap amplitude (fb) for the HRC U- and V- axes.
 
@@ -187,24 +242,10 @@ class HRCevt1:
         :rtype: float
         """
 
-        a_u = self.data["au1"]  # otherwise known as "a1"
-        b_u = self.data["au2"]  # "a2"
-        c_u = self.data["au3"]  # "a3"
-
-        a_v = self.data["av1"]
-        b_v = self.data["av2"]
-        c_v = self.data["av3"]
-
-        with np.errstate(invalid='ignore'):
-            # Do the U axis
-            fp_u = ((c_u - a_u) / (a_u + b_u + c_u))
-            fb_u = b_u / (a_u + b_u + c_u)
-
-            # Do the V axis
-            fp_v = ((c_v - a_v) / (a_v + b_v + c_v))
-            fb_v = b_v / (a_v + b_v + c_v)
+        u = self.fine_positions('u')
+        v = self.fine_positions('v')
 
-        return fp_u, fb_u, fp_v, fb_v
+        return u["fp_u"], u["fb_u"], v["fp_v"], v["fb_v"]
 
     def threshold(self, img, bins, softening=None):
         """HyperScreen (a) separates events by both axis and tap, (b) creates an
@@ -221,6 +262,7 @@ class HRCevt1:
         """
 
         # You don't want to be verbose in this function; it's called many times
+        from skimage import filters
 
         thresh_img = img.copy()
         thresh_img[img == 0] = np.nan
@@ -239,101 +281,55 @@ class HRCevt1:
 
         return thresh_img
 
-    def hyperscreen(self, softening=1.0):
-        """[summary]
+    def hyperscreen(self, softening=1.0, workers=1):
+        """Apply the HyperScreen algorithm to every event that passes the legacy hyperbola test.
 
-        Returns:
-            [type] -- [description]
+        Events are separated by axis and tap, and each tap-specific boomerang is
+        thresholded with Otsu's Method (see threshold()). Events must survive the
+        screen on both the U and V axes.
+
+        :param softening: The Otsu threshold of every tap is lowered by this fraction of itself (None applies no softening), defaults to 1.0
+        :type softening: float, optional
+        :param workers: Number of threads across which the U- and V-axis taps are screened. Results are identical for any number of workers. Defaults to 1.
+        :type workers: int, optional
+        :return: A dictionary of HyperScreen results, including the boolean survival and failure masks over all events
+        :rtype: dict
         """
 
-        data = self.data[self.data['Hyperbola test passed']]
+        # Only events that pass the legacy hyperbola test are candidates
+        events = np.flatnonzero(self.status.none_of(statusbits.HYPERBOLA_FLAGS))
 
-        # taprange = range(data['crsu'].min(), data['crsu'].max() + 1)
-        taprange_u = range(data['crsu'].min() - 1, data['crsu'].max() + 1)
-        taprange_v = range(data['crsv'].min() - 1, data['crsv'].max() + 1)
+        crsu = np.asarray(self.data['crsu'])[events]
+        crsv = np.asarray(self.data['crsv'])[events]
+
+        taprange_u = range(crsu.min() - 1, crsu.max() + 1)
+        taprange_v = range(crsv.min() - 1, crsv.max() + 1)
 
         if self.numevents < 100000:
             bins = [50, 50]  # number of bins
         else:
             bins = [200, 200]
 
-        # Instantiate these empty dictionaries to hold our results
-        u_axis_survivals = {}
-        v_axis_survivals = {}
+        if self.verbose is True:
+            print(colorama.Fore.YELLOW + "\nApplying Otsu's Method to every Tap-specific boomerang across U-axis taps {} through {} and V-axis taps {} through {}".format(
+                taprange_u[0] + 1, taprange_u[-1] + 1, taprange_v[0] + 1, taprange_v[-1] + 1))
 
-        if self.verbose is False:
-            progressbar_disable = True
-        elif self.verbose is True:
-            progressbar_disable = False
+        axes = [{'fb': np.asarray(self.data['fb_u'])[events], 'fp': np.asarray(self.data['fp_u'])[events], 'crs': crsu, 'events': events, 'taprange': taprange_u},
+                {'fb': np.asarray(self.data['fb_v'])[events], 'fp': np.asarray(self.data['fp_v'])[events], 'crs': crsv, 'events': events, 'taprange': taprange_v}]
 
-        if self.verbose is True:
-            print(colorama.Fore.YELLOW + "\nApplying Otsu's Method to every Tap-specific boomerang across U-axis taps {} through {}".format(taprange_u[0] + 1, taprange_u[-1] + 1))
-
-        skiptaps_u = []
-        skiptaps_v = []
-
-        for tap in progressbar(taprange_u, disable=progressbar_disable, ascii=False):
-            # Do the U axis
-            tapmask_u = data[data['crsu'] == tap].index.values
-            if len(tapmask_u) < 20:
-                skiptaps_u.append((tap + 1, len(tapmask_u)))
-                continue
-            keep_u = np.isfinite(data['fb_u'][tapmask_u])
-
-            hist_u, xbounds_u, ybounds_u = np.histogram2d(
-                data['fb_u'][tapmask_u][keep_u], data['fp_u'][tapmask_u][keep_u], bins=bins)
-            thresh_hist_u = self.threshold(
-                hist_u, bins=bins, softening=softening)
-
-            posx_u = np.digitize(data['fb_u'][tapmask_u], xbounds_u)
-            posy_u = np.digitize(data['fp_u'][tapmask_u], ybounds_u)
-            hist_mask_u = (posx_u > 0) & (posx_u <= bins[0]) & (
-                posy_u > -1) & (posy_u <= bins[1])
-
-            # Values of the histogram where the points are
-            hhsub_u = thresh_hist_u[posx_u[hist_mask_u] -
-                                    1, posy_u[hist_mask_u] - 1]
-            pass_fb_u = data['fb_u'][tapmask_u][hist_mask_u][np.isfinite(
-                hhsub_u)]
-
-            u_axis_survivals["U Axis Tap {:02d}".format(
-                tap)] = pass_fb_u.index.values
+        (survivors_u, skiptaps_u), (survivors_v, skiptaps_v) = tapscreen.screen_axes(
+            axes, bins=bins, softening=softening, workers=workers)
+
+        # The survivors of each tap are only sliced out when asked for
+        u_axis_survivals = survivors_u.relabel("U Axis Tap {:02d}")
+        v_axis_survivals = survivors_v.relabel("V Axis Tap {:02d}")
 
         if self.verbose is True:
             print("\nThe following {} U-axis taps were skipped due to a (very) low number of counts: ".format(len(skiptaps_u)))
             for skipped_tap in skiptaps_u:
                 tapnum, counts = skipped_tap
                 print("Skipped U-axis Tap {}, which had {} count(s)".format(tapnum, counts))
-            print(colorama.Fore.MAGENTA + "\n... doing the same for the V axis taps {} through {}".format(taprange_v[0] + 1, taprange_v[-1] + 1))
-
-        for tap in progressbar(taprange_v, disable=progressbar_disable, ascii=False):
-            # Now do the V axis:
-            tapmask_v = data[data['crsv'] == tap].index.values
-            if len(tapmask_v) < 20:
-                skiptaps_v.append((tap + 1, len(tapmask_v)))
-                continue
-            keep_v = np.isfinite(data['fb_v'][tapmask_v])
-
-            hist_v, xbounds_v, ybounds_v = np.histogram2d(
-                data['fb_v'][tapmask_v][keep_v], data['fp_v'][tapmask_v][keep_v], bins=bins)
-            thresh_hist_v = self.threshold(
-                hist_v, bins=bins, softening=softening)
-
-            posx_v = np.digitize(data['fb_v'][tapmask_v], xbounds_v)
-            posy_v = np.digitize(data['fp_v'][tapmask_v], ybounds_v)
-            hist_mask_v = (posx_v > 0) & (posx_v <= bins[0]) & (
-                posy_v > -1) & (posy_v <= bins[1])
-
-            # Values of the histogram where the points are
-            hhsub_v = thresh_hist_v[posx_v[hist_mask_v] -
-                                    1, posy_v[hist_mask_v] - 1]
-            pass_fb_v = data['fb_v'][tapmask_v][hist_mask_v][np.isfinite(
-                hhsub_v)]
-
-            v_axis_survivals["V Axis Tap {:02d}".format(
-                tap)] = pass_fb_v.index.values
 
-        if self.verbose is True:
             print("\nThe following {} V-axis taps were skipped due to a (very) low number of counts: ".format(len(skiptaps_v)))
             for skipped_tap in skiptaps_v:
                 tapnum, counts = skipped_tap
@@ -344,18 +340,22 @@ class HRCevt1:
         if self.verbose is True:
             print(colorama.Fore.BLUE + "\nCollecting events that pass both U- and V-axis HyperScreen tests...", end=" ")
 
-        u_all_survivals = np.concatenate(
-            [x for x in u_axis_survivals.values()])
-        v_all_survivals = np.concatenate(
-            [x for x in v_axis_survivals.values()])
+        u_all_survivals = survivors_u.all_survivors()
+        v_all_survivals = survivors_v.all_survivors()
 
         # If the event passes both U- and V-axis tests, it survives
-        all_survivals = np.intersect1d(u_all_survivals, v_all_survivals)
-        survival_mask = np.isin(self.data.index.values, all_survivals)
+        survival_mask = np.zeros(self.numevents, dtype=bool)
+        survival_mask[u_all_survivals] = True
+        v_survival_mask = np.zeros(self.numevents, dtype=bool)
+        v_survival_mask[v_all_survivals] = True
+        survival_mask &= v_survival_mask
+        del v_survival_mask
+
+        all_survivals = np.flatnonzero(survival_mask)
         failure_mask = np.logical_not(survival_mask)
 
-        num_survivals = sum(survival_mask)
-        num_failures = sum(failure_mask)
+        num_survivals = len(all_survivals)
+        num_failures = np.count_nonzero(failure_mask)
 
         percent_hyperscreen_rejected = round(
             ((num_failures / self.numevents) * 100), 2)
@@ -365,8 +365,7 @@ class HRCevt1:
             print("WARNING: Total Number of survivals and failures does \
             not equal total events in the EVT1 file. Something is wrong!")
 
-        legacy_hyperbola_test_failures = sum(
-            self.data['Hyperbola test failed'])
+        legacy_hyperbola_test_failures = self.status.count(statusbits.HYPERBOLA_FLAGS)
         percent_legacy_hyperbola_test_rejected = round(
             ((legacy_hyperbola_test_failures / self.numevents) * 100), 2)
 
@@ -375,7 +374,7 @@ class HRCevt1:
 
         if self.verbose is True:
             print("Done")
-            print(colorama.Fore.GREEN + "HyperScreen rejected" + colorama.Fore.YELLOW + " {}% of all events ({:,} bad events / {:,} total events)".format(percent_hyperscreen_rejected, sum(failure_mask), self.numevents) + colorama.Fore.GREEN +
+            print(colorama.Fore.GREEN + "HyperScreen rejected" + colorama.Fore.YELLOW + " {}% of all events ({:,} bad events / {:,} total events)".format(percent_hyperscreen_rejected, num_failures, self.numevents) + colorama.Fore.GREEN +
                   "\nThe Murray+ algorithm rejects" + colorama.Fore.MAGENTA + " {}% of all events ({:,} bad events / {:,} total events)".format(percent_legacy_hyperbola_test_rejected, legacy_hyperbola_test_failures, self.numevents))
 
             print(colorama.Fore.GREEN + "As long as the results pass sanity checks, this is a POTENTIAL improvement of \n" +
@@ -417,110 +416,68 @@ class HRCevt1:
             [type] -- [description]
         """
 
-        hyperbola = b * np.sqrt(((fb - h)**2 / a**2) - 1)
+        return hyperbola(fb, a, b, h)
 
-        return hyperbola
+    def legacy_hyperbola_test(self, tolerance=0.035, return_zones=True, dtype=None):
+        """Apply the legacy (Murray+) hyperbola test: an event passes on an axis if
+        its fine position lies between the upper and lower bound hyperbolae of the zone.
 
-    def legacy_hyperbola_test(self, tolerance=0.035):
-        """[summary]
-
-        Keyword Arguments:
-            tolerance {float} -- [description] (default: {0.035})
-
-        Returns:
-            [type] -- [description]
+        :param tolerance: The width of the zone, as a fraction of h, defaults to 0.035
+        :type tolerance: float, optional
+        :param return_zones: Also compute the fit and bound hyperbolae at every event, defaults to True. Without them, the test allocates little more than the masks.
+        :type return_zones: bool, optional
+        :param dtype: The float precision of the test, e.g. numpy.float32 to halve its memory (events within rounding of a bound may then be classified differently), defaults to None (that of the data)
+        :type dtype: numpy.dtype, optional
+        :return: The hyperzones (None unless return_zones is True), and the hypermasks of the events that pass on the U and V axes
+        :rtype: tuple
         """
 
         # Remind the user what tolerance they're using
         # print("{0: <25}| Using tolerance = {1}".format(" ", tolerance))
 
         # Set hyperbolic coefficients, depending on whether this is HRC-I or -S
-        if self.detector == "HRC-I":
-            a_u = 0.3110
-            b_u = 0.3030
-            h_u = 1.0580
-
-            a_v = 0.3050
-            b_v = 0.2730
-            h_v = 1.1
-            # print("{0: <25}| Using HRC-I hyperbolic coefficients: ".format(" "))
-            # print("{0: <25}|    Au={1}, Bu={2}, Hu={3}".format(" ", a_u, b_u, h_u))
-            # print("{0: <25}|    Av={1}, Bv={2}, Hv={3}".format(" ", a_v, b_v, h_v))
-
-        if self.detector == "HRC-S":
-            a_u = 0.2706
-            b_u = 0.2620
-            h_u = 1.0180
-
-            a_v = 0.2706
-            b_v = 0.2480
-            h_v = 1.0710
-            # print("{0: <25}| Using HRC-S hyperbolic coefficients: ".format(" "))
-            # print("{0: <25}|    Au={1}, Bu={2}, Hu={3}".format(" ", a_u, b_u, h_u))
-            # print("{0: <25}|    Av={1}, Bv={2}, Hv={3}".format(" ", a_v, b_v, h_v))
-
-        # Set the tolerance boundary ("width" of the hyperbolic region)
-
-        h_u_lowerbound = h_u * (1 + tolerance)
-        h_u_upperbound = h_u * (1 - tolerance)
-
-        h_v_lowerbound = h_v * (1 + tolerance)
-        h_v_upperbound = h_v * (1 - tolerance)
-
-        # Compute the Hyperbolae
-        with np.errstate(invalid='ignore'):
-            zone_u_fit = self.hyperbola(self.data["fb_u"], a_u, b_u, h_u)
-            zone_u_lowerbound = self.hyperbola(
-                self.data["fb_u"], a_u, b_u, h_u_lowerbound)
-            zone_u_upperbound = self.hyperbola(
-                self.data["fb_u"], a_u, b_u, h_u_upperbound)
+        a_u, b_u, h_u = LEGACY_HYPERBOLA_COEFFICIENTS[self.detector]['u']
+        a_v, b_v, h_v = LEGACY_HYPERBOLA_COEFFICIENTS[self.detector]['v']
 
-            zone_v_fit = self.hyperbola(self.data["fb_v"], a_v, b_v, h_v)
-            zone_v_lowerbound = self.hyperbola(
-                self.data["fb_v"], a_v, b_v, h_v_lowerbound)
-            zone_v_upperbound = self.hyperbola(
-                self.data["fb_v"], a_v, b_v, h_v_upperbound)
+        fb_u = np.asarray(self.data["fb_u"])
+        fp_u = np.asarray(self.data["fp_u"])
+        fb_v = np.asarray(self.data["fb_v"])
+        fp_v = np.asarray(self.data["fp_v"])
 
-        zone_u = [zone_u_lowerbound, zone_u_upperbound]
-        zone_v = [zone_v_lowerbound, zone_v_upperbound]
+        hypermasks = {"mask_u": hyperbola_zone_mask(fb_u, fp_u, a_u, b_u, h_u, tolerance, dtype=dtype),
+                      "mask_v": hyperbola_zone_mask(fb_v, fp_v, a_v, b_v, h_v, tolerance, dtype=dtype)}
 
-        # Apply the masks
-        # print("{0: <25}| Hyperbolic masks for U and V axes computed".format(""))
+        if return_zones is not True:
+            return None, hypermasks
 
+        # The hyperbolae themselves, with the tolerance boundaries ("width" of the hyperbolic region)
+        fb_u = fb_u.astype(dtype, copy=False) if dtype is not None else fb_u
+        fb_v = fb_v.astype(dtype, copy=False) if dtype is not None else fb_v
         with np.errstate(invalid='ignore'):
-            # print("{0: <25}| Creating U-axis mask".format(""), end=" |")
-            between_u = np.logical_not(np.logical_and(
-                self.data["fp_u"] < zone_u[1], self.data["fp_u"] > -1 * zone_u[1]))
-            not_beyond_u = np.logical_and(
-                self.data["fp_u"] < zone_u[0], self.data["fp_u"] > -1 * zone_u[0])
-            condition_u_final = np.logical_and(between_u, not_beyond_u)
-
-            # print(" Creating V-axis mask")
-            between_v = np.logical_not(np.logical_and(
-                self.data["fp_v"] < zone_v[1], self.data["fp_v"] > -1 * zone_v[1]))
-            not_beyond_v = np.logical_and(
-                self.data["fp_v"] < zone_v[0], self.data["fp_v"] > -1 * zone_v[0])
-            condition_v_final = np.logical_and(between_v, not_beyond_v)
-
-        mask_u = condition_u_final
-        mask_v = condition_v_final
-
-        hyperzones = {"zone_u_fit": zone_u_fit,
-                      "zone_u_lowerbound": zone_u_lowerbound,
-                      "zone_u_upperbound": zone_u_upperbound,
-                      "zone_v_fit": zone_v_fit,
-                      "zone_v_lowerbound": zone_v_lowerbound,
-                      "zone_v_upperbound": zone_v_upperbound}
-
-        hypermasks = {"mask_u": mask_u, "mask_v": mask_v}
-
-        # print("{0: <25}| Hyperbolic masks created".format(""))
-        # print("{0: <25}| ".format(""))
+            hyperzones = {"zone_u_fit": hyperbola(fb_u, a_u, b_u, h_u),
+                          "zone_u_lowerbound": hyperbola(fb_u, a_u, b_u, h_u * (1 + tolerance)),
+                          "zone_u_upperbound": hyperbola(fb_u, a_u, b_u, h_u * (1 - tolerance)),
+                          "zone_v_fit": hyperbola(fb_v, a_v, b_v, h_v),
+                          "zone_v_lowerbound": hyperbola(fb_v, a_v, b_v, h_v * (1 + tolerance)),
+                          "zone_v_upperbound": hyperbola(fb_v, a_v, b_v, h_v * (1 - tolerance))}
+
         return hyperzones, hypermasks
 
-    def boomerang(self, mask=None, show=True, plot_legacy_zone=True, title=None, cmap=None, savepath=None, create_subplot=False, ax=None, rasterized=True):
-        """[summary]
+    def boomerang(self, mask=None, show=True, plot_legacy_zone=True, title=None, cmap=None, savepath=None, create_subplot=False, ax=None, rasterized=True,
+                  density=None, density_bins=BOOMERANG_DENSITY_BINS, statistic='mean'):
+        """Plot the fine position fp_u against the normalized central tap amplitude fb_u of every event (the "boomerang"), colored by SUMAMPS.
+
+        :param mask: Boolean mask (or indices) of the events to highlight, e.g. the HyperScreen survivors, defaults to None
+        :type mask: numpy.ndarray, optional
+        :param density: Render the events as an image of their SUMAMPS on a fine (fb, fp) grid, rather than as a scatter plot of every event. The cost of an image scales with its number of cells, not with the number of events. Defaults to None, i.e. only for observations of BOOMERANG_DENSITY_EVENTS events or more.
+        :type density: bool, optional
+        :param density_bins: The number of (fb, fp) cells of a density image, defaults to BOOMERANG_DENSITY_BINS
+        :type density_bins: tuple, optional
+        :param statistic: The SUMAMPS of every cell of a density image, 'mean' or 'sum', defaults to 'mean'
+        :type statistic: str, optional
         """
+        import matplotlib.pyplot as plt
+
         # You can plot the image on axes of a subplot by passing
         # that axis to this function. Here are some switches to enable that.
 
@@ -535,7 +492,22 @@ class HRCevt1:
         if cmap is None:
             cmap = 'plasma'
 
-        if mask is not None:
+        if density is None:
+            density = self.numevents >= BOOMERANG_DENSITY_EVENTS
+
+        if density is True:
+            # The same layers as the scatter plots below, as images of a fine (fb, fp) grid
+            fb = np.asarray(self.data['fb_u'])
+            fp = np.asarray(self.data['fp_u'])
+            sumamps = np.asarray(self.data['sumamps'])
+            if mask is not None:
+                mask = np.asarray(mask)
+                self._density_layer(fb, fp, sumamps, density_bins, statistic, cmap='bone', alpha=0.8)
+                frame = self._density_layer(fb[mask], fp[mask], sumamps[mask], density_bins, statistic, cmap=cmap)
+            else:
+                frame = self._density_layer(fb, fp, sumamps, density_bins, statistic, cmap=cmap)
+
+        elif mask is not None:
             self.ax.scatter(self.data['fb_u'], self.data['fp_u'],
                             c=self.data['sumamps'], cmap='bone', s=0.3, alpha=0.8, rasterized=rasterized, label='All Events')
 
@@ -547,17 +519,11 @@ class HRCevt1:
                                     c=self.data['sumamps'], cmap=cmap, s=0.5, rasterized=rasterized)
 
         if plot_legacy_zone is True:
-            hyperzones, hypermasks = self.legacy_hyperbola_test(
-                tolerance=0.035)
-            self.ax.plot(self.data["fb_u"], hyperzones["zone_u_lowerbound"],
-                         'o', markersize=0.3, color='black', alpha=0.8, rasterized=rasterized, label='Murray Exclusion Hyperbola')
-            self.ax.plot(self.data["fb_u"], -1 * hyperzones["zone_u_lowerbound"],
-                         'o', markersize=0.3, color='black', alpha=0.8, rasterized=rasterized)
-
-            self.ax.plot(self.data["fb_u"], hyperzones["zone_u_upperbound"],
-                         'o', markersize=0.3, color='black', alpha=0.8, rasterized=rasterized)
-            self.ax.plot(self.data["fb_u"], -1 * hyperzones["zone_u_upperbound"],
-                         'o', markersize=0.3, color='black', alpha=0.8, rasterized=rasterized)
+            # The zone is drawn from its analytic bounds, whatever the number of events
+            zone_lowerbound, zone_upperbound = legacy_zone_curves(self.detector, tolerance=0.035)
+            self.ax.plot(*zone_lowerbound, '-', linewidth=0.8, color='black', alpha=0.8,
+                         rasterized=rasterized, label='Murray Exclusion Hyperbola')
+            self.ax.plot(*zone_upperbound, '-', linewidth=0.8, color='black', alpha=0.8, rasterized=rasterized)
 
         self.ax.grid(False)
 
@@ -586,6 +552,16 @@ class HRCevt1:
 
         plt.close()
 
+    def _density_layer(self, fb, fp, sumamps, bins, statistic, **kwargs):
+        """Draw the SUMAMPS of events on a fine (fb, fp) grid with imshow, as one layer of a density boomerang plot."""
+        img = density_image(fb, fp, sumamps, bins, BOOMERANG_EXTENT, statistic=statistic)
+        if statistic == 'mean' and len(sumamps) > 0:
+            # Colors span the same range as in a scatter plot of the events
+            kwargs.update(vmin=np.nanmin(sumamps), vmax=np.nanmax(sumamps))
+
+        # Cells without events are NaN, and transparent
+        return self.ax.imshow(img, extent=BOOMERANG_EXTENT, origin='lower', aspect='auto', interpolation='nearest', **kwargs)
+
     def image(self, masked_x=None, masked_y=None, xlim=None, ylim=None, detcoords=False, title=None, cmap=None, show=True, rasterized=True, savepath=None, create_subplot=False, ax=None, nbins=(400, 400)):
         """Create a quicklook image, in detector or sky coordinates, of the
         observation. The image will be binned to 400x400 by default.
@@ -604,6 +580,8 @@ class HRCevt1:
             create_subplot {bool} -- [description] (default: {False})
             ax {[type]} -- [description] (default: {None})
         """
+        import matplotlib.pyplot as plt
+        from matplotlib.colors import LogNorm
 
         if masked_x is not None and masked_y is not None:
             x = masked_x
@@ -668,9 +646,167 @@ class HRCevt1:
         plt.close()
 
 
+@lru_cache(maxsize=None)
+def _init_colorama():
+    """Set up colorama for the colored messages of verbose HRCevt1 objects, once, on first use."""
+    colorama.init()
+
+
+def hyperbola(fb, a, b, h):
+    """The fp = b * sqrt((fb - h)**2 / a**2 - 1) hyperbola of the legacy test, at every fb (NaN where it's undefined).
+
+    :param fb: The normalized central tap amplitudes
+    :type fb: numpy.ndarray
+    :rtype: numpy.ndarray
+    """
+    return b * np.sqrt(((fb - h)**2 / a**2) - 1)
+
+
+def hyperbola_zone_mask(fb, fp, a, b, h, tolerance, dtype=None, chunk_size=LEGACY_TEST_CHUNK):
+    """Whether every event lies within the zone of the legacy hyperbola test, on one axis.
+
+    That is, whether |fp| is below the lower bound hyperbola (h * (1 + tolerance)),
+    but not below the upper bound one (h * (1 - tolerance)). Events where a bound
+    is undefined (NaN) are below no bound, as in the original comparisons. The
+    events are tested a chunk at a time, with the bounds computed in place in a
+    single buffer, so that little more than the mask itself is allocated.
+
+    :param fb: The normalized central tap amplitude of every event
+    :type fb: numpy.ndarray
+    :param fp: The fine position of every event
+    :type fp: numpy.ndarray
+    :param a: The a coefficient of the hyperbolae
+    :type a: float
+    :param b: The b coefficient of the hyperbolae
+    :type b: float
+    :param h: The h coefficient of the fit hyperbola
+    :type h: float
+    :param tolerance: The width of the zone, as a fraction of h
+    :type tolerance: float
+    :param dtype: The float precision of the test, defaults to None (that of fb)
+    :type dtype: numpy.dtype, optional
+    :param chunk_size: The number of events tested at a time, defaults to LEGACY_TEST_CHUNK
+    :type chunk_size: int, optional
+    :rtype: numpy.ndarray
+    """
+    fb = np.asarray(fb)
+    fp = np.asarray(fp)
+    if dtype is None:
+        dtype = np.result_type(fb, np.float32)
+
+    mask = np.empty(len(fb), dtype=bool)
+    abs_fp = np.empty(min(chunk_size, len(fb)), dtype=dtype)
+    bound = np.empty_like(abs_fp)
+    below = np.empty(abs_fp.shape, dtype=bool)
+
+    with np.errstate(invalid='ignore'):
+        for start in range(0, len(fb), chunk_size):
+            stop = min(start + chunk_size, len(fb))
+            n = stop - start
+            np.abs(fp[start:stop], out=abs_fp[:n], casting='unsafe')
+
+            for i, h_bound in enumerate((h * (1 + tolerance), h * (1 - tolerance))):
+                # hyperbola(fb, a, b, h_bound), one operation at a time
+                np.subtract(fb[start:stop], h_bound, out=bound[:n], dtype=dtype, casting='unsafe')
+                np.multiply(bound[:n], bound[:n], out=bound[:n])
+                bound[:n] /= a**2
+                bound[:n] -= 1
+                np.sqrt(bound[:n], out=bound[:n])
+                bound[:n] *= b
+
+                if i == 0:
+                    np.less(abs_fp[:n], bound[:n], out=mask[start:stop])
+                else:
+                    np.less(abs_fp[:n], bound[:n], out=below[:n])
+                    mask[start:stop] &= np.logical_not(below[:n], out=below[:n])
+
+    return mask
+
+
+@lru_cache(maxsize=None)
+def legacy_zone_curves(detector, tolerance=0.035, samples=LEGACY_ZONE_SAMPLES):
+    """The bounds of the (U axis) legacy hyperbola test zone, sampled on a fixed fb grid, for plotting.
+
+    Each bound is traced from fb = 0 along its hyperbola to the vertex, and back
+    along the mirror image (-fp) to fb = 0, so that it can be drawn as one line.
+    The curves depend only on the detector and tolerance, and are computed once for each.
+
+    :param detector: 'HRC-I' or 'HRC-S'
+    :type detector: str
+    :param tolerance: The tolerance of the legacy test, defaults to 0.035
+    :type tolerance: float, optional
+    :param samples: The number of fb samples of each half of a bound, defaults to LEGACY_ZONE_SAMPLES
+    :type samples: int, optional
+    :return: The (fb, fp) of the lower bound and of the upper bound of the zone. The arrays are read-only.
+    :rtype: tuple
+    """
+    a, b, h = LEGACY_HYPERBOLA_COEFFICIENTS[detector]['u']
+
+    curves = []
+    for h_bound in (h * (1 + tolerance), h * (1 - tolerance)):
+        fb = np.linspace(0, h_bound - a, samples)
+        with np.errstate(invalid='ignore'):
+            fp = hyperbola(fb, a, b, h_bound)
+        # Rounding can leave the vertex itself just outside the hyperbola
+        fp[-1] = 0
+
+        fb = np.concatenate([fb, fb[::-1]])
+        fp = np.concatenate([fp, -fp[::-1]])
+        fb.flags.writeable = False
+        fp.flags.writeable = False
+        curves.append((fb, fp))
+
+    return tuple(curves)
+
+
+def density_image(x, y, values, bins, extent, statistic='mean'):
+    """Aggregate values onto a uniform 2D grid, with a single bincount.
+
+    :param x: x coordinate of every value (e.g. fb)
+    :type x: numpy.ndarray
+    :param y: y coordinate of every value (e.g. fp)
+    :type y: numpy.ndarray
+    :param values: The values to aggregate (e.g. SUMAMPS)
+    :type values: numpy.ndarray
+    :param bins: The number of (x, y) cells
+    :type bins: tuple
+    :param extent: The (xmin, xmax, ymin, ymax) spanned by the grid. Values outside it (or at non-finite coordinates) are left out.
+    :type extent: tuple
+    :param statistic: The 'mean' or the 'sum' of the values in every cell, defaults to 'mean'
+    :type statistic: str, optional
+    :return: The (y, x) image, NaN wherever a cell holds no values (as imshow(origin='lower') expects)
+    :rtype: numpy.ndarray
+    """
+
+    if statistic not in ('mean', 'sum'):
+        raise ValueError("statistic must be 'mean' or 'sum', not {}".format(statistic))
+
+    nx, ny = bins
+    xmin, xmax, ymin, ymax = extent
+
+    with np.errstate(invalid='ignore'):
+        inside = (x >= xmin) & (x < xmax) & (y >= ymin) & (y < ymax)
+    column = ((x[inside] - xmin) * (nx / (xmax - xmin))).astype(np.intp)
+    row = ((y[inside] - ymin) * (ny / (ymax - ymin))).astype(np.intp)
+    # Rounding can push a value just below the upper edge into the next cell
+    np.minimum(column, nx - 1, out=column)
+    np.minimum(row, ny - 1, out=row)
+    cells = row * nx + column
+
+    counts = np.bincount(cells, minlength=nx * ny)
+    sums = np.bincount(cells, weights=np.asarray(values, dtype=float)[inside], minlength=nx * ny)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        img = sums / counts if statistic == 'mean' else np.where(counts > 0, sums, np.nan)
+
+    return img.reshape(ny, nx)
+
+
 def styleplots():  # pragma: no cover
     """Make the plots pretty.
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
 
     mpl.rcParams['agg.path.chunksize'] = 10000
 
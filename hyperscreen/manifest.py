@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A run manifest, to resume interrupted archivescreen runs where they stopped.
+
+The manifest is an append-only log with one JSON record per line. Each record
+is written when an EVT1 file starts screening, and again when it is done (or
+has failed). A record holds the file's path, size and mtime (and, optionally,
+its content hash), the softening, the hyperscreen version and the status.
+
+An EVT1 file needs screening again unless its latest record says it is done
+with the same softening and version, and the file is unchanged. That check
+only stats the file (or hashes it), so it is made before any FITS file is
+read. Every worker appends to the log with a single write, so the workers of
+a multiprocessing pool can all share one manifest.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import time
+
+from hyperscreen import __version__
+from hyperscreen import sidecar
+
+MANIFEST_FILENAME = 'hyperscreen_manifest.jsonl'
+
+STARTED = 'started'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class RunManifest:
+    """The manifest of an archivescreen run.
+
+    :param filename: The manifest file. It is created when the first record is written.
+    :type filename: str
+    :param use_hash: Set use_hash=True to also record the content hash of every EVT1 file, so that a file whose mtime changed (e.g. when it was copied) but whose content didn't is still recognized as done. Defaults to False.
+    :type use_hash: bool, optional
+    """
+
+    def __init__(self, filename, use_hash=False):
+        self.filename = filename
+        self.use_hash = use_hash
+
+    def signature(self, evt1file, with_hash=False):
+        """The path, size and mtime of an EVT1 file (and its content hash, if with_hash=True)."""
+        path = os.path.abspath(evt1file)
+        stat = os.stat(path)
+        signature = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+        if with_hash is True:
+            signature['sha256'] = sidecar.content_hash(path)
+        return signature
+
+    def records(self):
+        """The latest record of every EVT1 file in the manifest, by path."""
+        records = {}
+        if not os.path.exists(self.filename):
+            return records
+
+        with open(self.filename) as manifest_file:
+            for line in manifest_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short when a run was killed
+                records[record['path']] = record
+
+        return records
+
+    def is_done(self, evt1file, softening, records=None):
+        """Whether an EVT1 file is done, with this softening and version, and unchanged since.
+
+        :param evt1file: The EVT1 file
+        :type evt1file: str
+        :param softening: The softening of this run
+        :type softening: float
+        :param records: The manifest records, if already read with records(), defaults to None (read them)
+        :type records: dict, optional
+        :rtype: bool
+        """
+        if records is None:
+            records = self.records()
+
+        path = os.path.abspath(evt1file)
+        record = records.get(path)
+        if record is None or record['status'] != DONE:
+            return False
+        if record['softening'] != softening or record['version'] != __version__:
+            return False
+
+        stat = os.stat(path)
+        if record['size'] == stat.st_size and record['mtime'] == stat.st_mtime:
+            return True
+        # The file may have been touched or copied without being changed
+        return self.use_hash is True and 'sha256' in record and record['sha256'] == sidecar.content_hash(path)
+
+    def pending(self, evt1_files, softening):
+        """The EVT1 files that still need screening (i.e. aren't done), in their original order.
+
+        :param evt1_files: The EVT1 files of the run
+        :type evt1_files: list
+        :param softening: The softening of this run
+        :type softening: float
+        :rtype: list
+        """
+        records = self.records()
+        return [evt1file for evt1file in evt1_files if not self.is_done(evt1file, softening, records=records)]
+
+    def mark(self, evt1file, status, softening, signature=None, **extra):
+        """Append a record of an EVT1 file to the manifest.
+
+        :param evt1file: The EVT1 file
+        :type evt1file: str
+        :param status: STARTED, DONE or FAILED
+        :type status: str
+        :param softening: The softening of this run
+        :type softening: float
+        :param signature: Its signature, if taken before it was moved or changed (see signature()), defaults to None (take it now)
+        :type signature: dict, optional
+        :param extra: Anything else to record (e.g. obsid='1234')
+        """
+        if signature is not None:
+            record = dict(signature)
+        else:
+            # Only the records of finished files are ever compared by hash
+            record = self.signature(evt1file, with_hash=self.use_hash is True and status == DONE)
+        record.update({'softening': softening,
+                       'version': __version__,
+                       'status': status,
+                       'time': time.time()})
+        record.update(extra)
+
+        # One write per record, in append mode, so that records from concurrent workers never interleave
+        with open(self.filename, 'a') as manifest_file:
+            manifest_file.write(json.dumps(record, sort_keys=True) + '\n')
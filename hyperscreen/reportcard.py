@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Report cards of screened observations, rendered apart from the screening.
+
+Screening an observation saves the compact inputs of its report card, in a
+(compressed) NumPy .npz archive holding
+
+* ``summary``: the summary scalars of the HyperScreen results (see
+  hyperscreen.results), as a JSON string,
+* ``boomerang_*``: density images of the mean SUMAMPS on the (fb, fp) grid of
+  boomerang plots (see HRCevt1.boomerang()), of all events, of those that pass
+  the legacy hyperbola test, and of the HyperScreen survivors, with the SUMAMPS
+  range of each, and
+* ``detector_*``: binned detector images of the good time events and of the
+  HyperScreen survivors, with their extents.
+
+Its size depends only on the number of pixels, not on the number of events.
+The PDF report cards are then rendered from those files alone, in a pool of
+worker processes of their own, so that the time matplotlib takes no longer
+counts against screening.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+from functools import partial
+
+import numpy as np
+
+from hyperscreen import hypercore
+from hyperscreen import results
+from hyperscreen import scheduler
+
+PLOT_INPUTS_FORMAT = 1
+PLOT_INPUTS_SUFFIX = '_hyperReport_inputs.npz'
+REPORT_CARD_SUFFIX = '_hyperReport.pdf'
+
+# The boomerang layers of a report card, and the events in each
+BOOMERANG_LAYERS = ['all', 'legacy', 'hyperscreen']
+
+# Report card detector images are binned to this many (x, y) pixels
+DETECTOR_IMAGE_BINS = (400, 400)
+
+
+def plot_inputs(obs, hyperscreen_results_dict, density_bins=hypercore.BOOMERANG_DENSITY_BINS, image_bins=DETECTOR_IMAGE_BINS):
+    """Compute the inputs of the report card of a screened observation.
+
+    :param obs: The observation
+    :type obs: hypercore.HRCevt1
+    :param hyperscreen_results_dict: Its HyperScreen results, as returned by HRCevt1.hyperscreen()
+    :type hyperscreen_results_dict: dict
+    :param density_bins: The number of (fb, fp) cells of the boomerang images, defaults to hypercore.BOOMERANG_DENSITY_BINS
+    :type density_bins: tuple, optional
+    :param image_bins: The number of (x, y) pixels of the detector images, defaults to DETECTOR_IMAGE_BINS
+    :type image_bins: tuple, optional
+    :return: The plot inputs: the summary, as a dict, and the images and their ranges and extents
+    :rtype: dict
+    """
+    survival_mask = np.asarray(hyperscreen_results_dict['All Survivals (boolean mask)'], dtype=bool)
+
+    fb = np.asarray(obs.data['fb_u'])
+    fp = np.asarray(obs.data['fp_u'])
+    sumamps = np.asarray(obs.data['sumamps'])
+
+    inputs = {'summary': results.summarize(hyperscreen_results_dict)}
+
+    layers = {'all': slice(None),
+              'legacy': np.asarray(obs.data['Hyperbola test passed'], dtype=bool),
+              'hyperscreen': survival_mask}
+    for layer in BOOMERANG_LAYERS:
+        events = layers[layer]
+        inputs['boomerang_' + layer] = hypercore.density_image(fb[events], fp[events], sumamps[events], density_bins,
+                                                               hypercore.BOOMERANG_EXTENT).astype(np.float32)
+        inputs['boomerang_{}_range'.format(layer)] = np.array([np.nanmin(sumamps[events]), np.nanmax(sumamps[events])]
+                                                              if sumamps[events].size > 0 else [0, 1], dtype=float)
+
+    # As binned by HRCevt1.image(detcoords=True)
+    detx = np.asarray(obs.data['detx'])
+    dety = np.asarray(obs.data['dety'])
+    gtimask = np.asarray(obs.gtimask, dtype=bool)
+    for image, events in [('all', gtimask), ('hyperscreen', survival_mask)]:
+        img, yedges, xedges = np.histogram2d(dety[events], detx[events], image_bins)
+        inputs['detector_' + image] = img.astype(np.uint32)
+        inputs['detector_{}_extent'.format(image)] = np.array([xedges[0], xedges[-1], yedges[0], yedges[-1]])
+
+    return inputs
+
+
+def save_plot_inputs(inputs, filename):
+    """Save the inputs of a report card (see plot_inputs()).
+
+    :param inputs: The plot inputs
+    :type inputs: dict
+    :param filename: The file to write (see PLOT_INPUTS_SUFFIX)
+    :type filename: str
+    """
+    # Written under a temporary name first, so that a rendering pool never sees a partial file
+    partial_file = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(partial_file, 'wb') as inputs_file:
+        np.savez_compressed(inputs_file,
+                            format=np.array(PLOT_INPUTS_FORMAT),
+                            summary=np.array(json.dumps(inputs['summary'], sort_keys=True)),
+                            **{key: value for key, value in inputs.items() if key != 'summary'})
+    os.replace(partial_file, filename)
+
+
+def load_plot_inputs(filename):
+    """Load the inputs of a report card.
+
+    :param filename: A file written by save_plot_inputs()
+    :type filename: str
+    :return: The plot inputs, as returned by plot_inputs()
+    :rtype: dict
+    """
+    with np.load(filename) as inputs_file:
+        inputs = {key: inputs_file[key] for key in inputs_file.files if key != 'format'}
+    inputs['summary'] = json.loads(inputs['summary'].item())
+    return inputs
+
+
+def _draw_boomerang(ax, inputs, layer, title, cmap, rasterized=True):
+    """Draw a boomerang plot, as HRCevt1.boomerang(mask=...) does, from the density images of its layers."""
+    extent = hypercore.BOOMERANG_EXTENT
+    vmin, vmax = inputs['boomerang_all_range']
+    ax.imshow(inputs['boomerang_all'], extent=extent, origin='lower', aspect='auto', interpolation='nearest',
+              cmap='bone', alpha=0.8, vmin=vmin, vmax=vmax, rasterized=rasterized)
+    vmin, vmax = inputs['boomerang_{}_range'.format(layer)]
+    ax.imshow(inputs['boomerang_' + layer], extent=extent, origin='lower', aspect='auto', interpolation='nearest',
+              cmap=cmap, vmin=vmin, vmax=vmax, rasterized=rasterized)
+
+    zone_lowerbound, zone_upperbound = hypercore.legacy_zone_curves(inputs['summary']['Detector'])
+    ax.plot(*zone_lowerbound, '-', linewidth=0.8, color='black', alpha=0.8, rasterized=rasterized, label='Murray Exclusion Hyperbola')
+    ax.plot(*zone_upperbound, '-', linewidth=0.8, color='black', alpha=0.8, rasterized=rasterized)
+
+    ax.grid(False)
+    ax.set_title(title)
+    ax.set_ylim(-1.1, 1.1)
+    ax.set_xlim(-0.1, 1.1)
+    ax.set_ylabel(r'Fine Position $f_p$ $(C-A)/(A + B + C)$')
+    ax.set_xlabel(r'Normalized Central Tap Amplitude $f_b$ $B / (A+B+C)$')
+
+
+def _draw_detector_image(ax, inputs, image, title, rasterized=True):
+    """Draw a detector image, as HRCevt1.image(detcoords=True) does, from its binned counts."""
+    from matplotlib.colors import LogNorm
+
+    ax.grid(False)
+    ax.imshow(inputs['detector_' + image], extent=inputs['detector_{}_extent'.format(image)], norm=LogNorm(),
+              interpolation=None, rasterized=rasterized, cmap='viridis', origin='lower')
+    ax.set_title(title)
+    ax.set_xlabel("Detector X")
+    ax.set_ylabel("Detector Y")
+
+
+def render_report_card(inputs, reportCard_savepath=None, rasterized=True, verbose=False):
+    """Render a report card as a PDF, from its plot inputs alone.
+
+    :param inputs: The plot inputs, or a file of them
+    :type inputs: dict or str
+    :param reportCard_savepath: The PDF to write, defaults to None (the file of the plot inputs, with REPORT_CARD_SUFFIX instead of PLOT_INPUTS_SUFFIX)
+    :type reportCard_savepath: str, optional
+    :return: The PDF written
+    :rtype: str
+    """
+    # Screening workers only make plot inputs, and never import matplotlib
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    if not isinstance(inputs, dict):
+        if reportCard_savepath is None:
+            reportCard_savepath = inputs[:-len(PLOT_INPUTS_SUFFIX)] + REPORT_CARD_SUFFIX
+        inputs = load_plot_inputs(inputs)
+    summary = inputs['summary']
+
+    hypercore.styleplots()
+
+    with PdfPages(reportCard_savepath) as pdf:
+        fig, axes = plt.subplots(2, 2, figsize=(10, 10), sharey='row')
+
+        _draw_boomerang(axes[0, 0], inputs, 'legacy', 'Legacy Hyperbola Test', 'magma', rasterized=rasterized)
+        _draw_boomerang(axes[0, 1], inputs, 'hyperscreen', 'HyperScreen', 'inferno', rasterized=rasterized)
+        _draw_detector_image(axes[1, 0], inputs, 'all', 'Legacy Hyperbola Test', rasterized=rasterized)
+        _draw_detector_image(axes[1, 1], inputs, 'hyperscreen', 'HyperScreen', rasterized=rasterized)
+
+        fig.suptitle('ObsID {} | {} | {} | {} ksec | {:,} counts \n Percent Improvement: {}%'.format(
+            summary['ObsID'], summary['Target'], summary['Detector'], round(summary['Exposure Time'] / 1000, 2),
+            summary['Number of Events'], summary['Percent improvement']))
+
+        pdf.savefig(fig)
+
+    plt.close(fig)
+
+    if verbose is True:
+        print("Created {}".format(reportCard_savepath))
+
+    return reportCard_savepath
+
+
+def _render_or_report(inputs_file, **kwargs):
+    """render_report_card(), printing rather than raising any error, so that one bad file doesn't stop a rendering pool."""
+    try:
+        return render_report_card(inputs_file, **kwargs)
+    except Exception as exception_message:
+        print("ERROR rendering the report card of {}, pressing on".format(inputs_file))
+        print("Exception message is: {}".format(exception_message))
+
+
+def render_report_cards(inputs_files, processes=None, maxtasksperchild=scheduler.DEFAULT_MAXTASKSPERCHILD, rasterized=True, verbose=False):
+    """Render the report cards of many observations, from their plot input files, in a pool of worker processes.
+
+    :param inputs_files: The plot input files (see save_plot_inputs())
+    :type inputs_files: list
+    :param processes: Number of worker processes, defaults to None (one per CPU). With 1, the report cards are rendered in this process.
+    :type processes: int, optional
+    :param maxtasksperchild: Replace each worker process after this many report cards, defaults to scheduler.DEFAULT_MAXTASKSPERCHILD
+    :type maxtasksperchild: int, optional
+    :return: The PDFs written
+    :rtype: list
+    """
+    if len(inputs_files) == 0:
+        return []
+
+    render = partial(_render_or_report, rasterized=rasterized, verbose=verbose)
+    if processes == 1:
+        rendered = [render(inputs_file) for inputs_file in inputs_files]
+    else:
+        rendered = scheduler.run_pool(render, inputs_files, processes=processes, maxtasksperchild=maxtasksperchild)
+    return [reportCard_savepath for reportCard_savepath in rendered if reportCard_savepath is not None]
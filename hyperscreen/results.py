@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A compact file format for HyperScreen results.
+
+A results file is an (uncompressed) NumPy .npz archive holding
+
+* ``summary``: the summary scalars of the results (ObsID, exposure time,
+  rejection percentages, ...) as a JSON string, and
+* ``survival_mask``: the boolean survival mask over all events, bit-packed
+  with np.packbits (one bit per event).
+
+The summary can be read without touching the mask, and the failure mask and
+the survivor indices both follow from the survival mask, so none of them are
+stored. load_results() rebuilds the results dictionary that archivescreen
+used to save as JSON.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import json
+
+import numpy as np
+
+RESULTS_FORMAT = 1
+RESULTS_SUFFIX = '_hyperResults.npz'
+
+# The scalars of a HRCevt1.hyperscreen() results dictionary
+SUMMARY_KEYS = ["ObsID",
+                "Target",
+                "Exposure Time",
+                "Detector",
+                "Number of Events",
+                "Number of Good Time Events",
+                "Percent rejected by Tapscreen",
+                "Percent rejected by Hyperbola",
+                "Percent improvement"]
+
+
+def _scalar(value):
+    """A JSON-serializable version of a (NumPy) scalar."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def summarize(results_dict, **extra):
+    """The summary scalars of a results dictionary.
+
+    :param results_dict: A dictionary of HyperScreen results, as returned by HRCevt1.hyperscreen()
+    :type results_dict: dict
+    :param extra: Any further scalars to include in the summary (e.g. softening=1.0)
+    :return: The summary
+    :rtype: dict
+    """
+    summary = {key: _scalar(results_dict[key]) for key in SUMMARY_KEYS}
+    summary.update({key: _scalar(value) for key, value in extra.items()})
+    return summary
+
+
+def save_results(results_dict, filename, **extra):
+    """Save HyperScreen results in the compact results format.
+
+    :param results_dict: A dictionary of HyperScreen results, as returned by HRCevt1.hyperscreen()
+    :type results_dict: dict
+    :param filename: The results file to write (see RESULTS_SUFFIX)
+    :type filename: str
+    :param extra: Any further scalars to include in the summary (e.g. softening=1.0)
+    """
+    survival_mask = np.asarray(results_dict["All Survivals (boolean mask)"], dtype=bool)
+    summary = summarize(results_dict, **extra)
+
+    # np.savez would append .npz to any other file name
+    with open(filename, 'wb') as results_file:
+        np.savez(results_file,
+                 format=np.array(RESULTS_FORMAT),
+                 summary=np.array(json.dumps(summary, sort_keys=True)),
+                 survival_mask=np.packbits(survival_mask))
+
+
+def load_summary(filename):
+    """Load only the summary scalars of a results file. The masks are not read.
+
+    :param filename: A results file written by save_results()
+    :type filename: str
+    :return: The summary
+    :rtype: dict
+    """
+    with np.load(filename) as results_file:
+        return json.loads(results_file['summary'].item())
+
+
+def load_results(filename):
+    """Load a results file.
+
+    :param filename: A results file written by save_results()
+    :type filename: str
+    :return: The summary scalars, plus the "All Survivals (event indices)", "All Survivals (boolean mask)" and "All Failures (boolean mask)" arrays
+    :rtype: dict
+    """
+    with np.load(filename) as results_file:
+        results_dict = json.loads(results_file['summary'].item())
+        packed = results_file['survival_mask']
+
+    survival_mask = np.unpackbits(packed, count=results_dict["Number of Events"]).view(bool)
+
+    results_dict["All Survivals (event indices)"] = np.flatnonzero(survival_mask)
+    results_dict["All Survivals (boolean mask)"] = survival_mask
+    results_dict["All Failures (boolean mask)"] = np.logical_not(survival_mask)
+
+    return results_dict
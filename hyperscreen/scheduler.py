@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Size-aware scheduling of archivescreen tasks across a pool of worker processes.
+
+The time (and memory) it takes to screen an EVT1 file grows with its number of
+events, which the header index (see hyperscreen.headerindex) has for every
+file as NAXIS2. Tasks are dispatched largest first, one at a time, as workers
+become free: the few huge observations start right away, and the many small
+ones fill in around them, so no worker sits idle at the end of a run waiting
+on a huge file that happened to come last. Worker processes are replaced
+after a number of tasks, so that memory fragmented by large observations is
+returned to the system.
+
+With a memory budget, a task is only started while the estimated peak
+footprints of all running tasks fit within the budget, so that many small
+observations pack densely while large ones never overlap dangerously.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+import re
+from queue import Queue
+
+from hyperscreen import headerindex
+
+# Worker processes are replaced after screening this many EVT1 files
+DEFAULT_MAXTASKSPERCHILD = 10
+
+# Peak memory of a worker process screening an EVT1 file of N events is estimated as
+# WORKER_BYTES + N * BYTES_PER_EVENT, plus HISTOGRAM_BYTES for observations large enough
+# (LARGE_OBSERVATION events or more) to be screened with 200x200-bin tap histograms.
+WORKER_BYTES = 150 * 1024**2
+BYTES_PER_EVENT = 500
+HISTOGRAM_BYTES = 350 * 1024**2
+LARGE_OBSERVATION = 100000
+
+# A streamed EVT1 file (see hyperscreen.streamscreen) holds at most this many of its events in memory at a time
+STREAM_CHUNK_EVENTS = 500000
+
+
+def task_sizes(evt1_files, header_index=None):
+    """The number of events (NAXIS2) of every EVT1 file, from the header index.
+
+    :param evt1_files: The EVT1 files
+    :type evt1_files: list
+    :param header_index: A header index, or the file of one, defaults to None (an index kept only in memory)
+    :type header_index: headerindex.HeaderIndex or str, optional
+    :return: The number of events of each file, in the same order (0 if its header couldn't be read)
+    :rtype: list
+    """
+    if not isinstance(header_index, headerindex.HeaderIndex):
+        header_index = headerindex.HeaderIndex(header_index)
+
+    return [entry.get('NAXIS2', 0) for entry in header_index.lookup(evt1_files)]
+
+
+def largest_first(evt1_files, sizes):
+    """The EVT1 files ordered by decreasing size (ties keep their original order).
+
+    :param evt1_files: The EVT1 files
+    :type evt1_files: list
+    :param sizes: Their sizes (e.g. from task_sizes())
+    :type sizes: list
+    :rtype: list
+    """
+    order = sorted(range(len(evt1_files)), key=lambda i: -sizes[i])
+    return [evt1_files[i] for i in order]
+
+
+def run_pool(function, tasks, processes=None, maxtasksperchild=DEFAULT_MAXTASKSPERCHILD):
+    """Run function on every task in a pool of worker processes, handing out the tasks one at a time, in order.
+
+    :param function: The function to run. It must be picklable (e.g. a module-level function, or a partial() of one).
+    :type function: callable
+    :param tasks: The arguments of each call, in the order in which they should be started
+    :type tasks: list
+    :param processes: Number of worker processes, defaults to None (one per CPU)
+    :type processes: int, optional
+    :param maxtasksperchild: Replace each worker process after this many tasks, defaults to DEFAULT_MAXTASKSPERCHILD. None never replaces them.
+    :type maxtasksperchild: int, optional
+    :return: The results, in the order in which the tasks finished
+    :rtype: list
+    """
+    pool = multiprocessing.Pool(processes, maxtasksperchild=maxtasksperchild)
+    try:
+        # With chunksize=1, a free worker takes the next task as soon as it's done with its last
+        results = list(pool.imap_unordered(function, tasks, chunksize=1))
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+
+def estimate_footprint(numevents, bytes_per_event=BYTES_PER_EVENT):
+    """Estimate the peak memory of a worker process screening an EVT1 file.
+
+    :param numevents: The number of events in the file (NAXIS2)
+    :type numevents: int
+    :param bytes_per_event: Peak memory per event, defaults to BYTES_PER_EVENT
+    :type bytes_per_event: int, optional
+    :return: The estimated peak memory, in bytes
+    :rtype: int
+    """
+    footprint = WORKER_BYTES + int(numevents * bytes_per_event)
+    if numevents >= LARGE_OBSERVATION:
+        footprint += HISTOGRAM_BYTES
+    return footprint
+
+
+def parse_memory(memory):
+    """Parse an amount of memory such as '256G', '512M', '1.5T' or a plain number of bytes.
+
+    :param memory: The amount of memory
+    :type memory: str or int
+    :return: The number of bytes
+    :rtype: int
+    """
+    if isinstance(memory, (int, float)):
+        return int(memory)
+
+    match = re.match(r'^\s*([0-9.]+)\s*([KMGT]?)i?B?\s*$', memory, re.IGNORECASE)
+    if match is None:
+        raise ValueError("Can't parse the amount of memory '{}' (try e.g. '256G')".format(memory))
+    number, unit = match.groups()
+    return int(float(number) * 1024**'BKMGT'.index(unit.upper() or 'B'))
+
+
+def run_budgeted(function, tasks, footprints, max_memory, processes=None, maxtasksperchild=DEFAULT_MAXTASKSPERCHILD, verbose=False):
+    """Run function on every task in a pool of worker processes, within a memory budget.
+
+    Whenever a worker is free, the first task (in the given order) whose estimated
+    footprint fits in what is left of the budget is started. A task that alone
+    exceeds the whole budget is run on its own, once nothing else is running.
+
+    :param function: The function to run. It must be picklable (e.g. a module-level function, or a partial() of one).
+    :type function: callable
+    :param tasks: The arguments of each call, in order of preference (e.g. largest first)
+    :type tasks: list
+    :param footprints: The estimated peak memory of each task, in bytes (e.g. from estimate_footprint())
+    :type footprints: list
+    :param max_memory: The memory budget, in bytes
+    :type max_memory: int
+    :param processes: Number of worker processes, defaults to None (one per CPU)
+    :type processes: int, optional
+    :param maxtasksperchild: Replace each worker process after this many tasks, defaults to DEFAULT_MAXTASKSPERCHILD. None never replaces them.
+    :type maxtasksperchild: int, optional
+    :return: The results, in the order in which the tasks finished
+    :rtype: list
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    pending = list(range(len(tasks)))
+    finished = Queue()
+    results = []
+    errors = []
+    running = 0
+    in_use = 0
+
+    pool = multiprocessing.Pool(processes, maxtasksperchild=maxtasksperchild)
+    try:
+        while len(pending) > 0 or running > 0:
+            # Admit as many tasks as there are free workers and budget for
+            while len(pending) > 0 and running < processes:
+                fitting = [i for i in pending if in_use + footprints[i] <= max_memory]
+                if len(fitting) == 0 and running == 0:
+                    fitting = pending[:1]
+                    print("WARNING: {} alone is estimated to need {:.1f} GB, more than the memory budget of {:.1f} GB. Running it on its own.".format(
+                        tasks[fitting[0]], footprints[fitting[0]] / 1024**3, max_memory / 1024**3))
+                if len(fitting) == 0:
+                    break
+
+                i = fitting[0]
+                pending.remove(i)
+                running += 1
+                in_use += footprints[i]
+                pool.apply_async(function, (tasks[i],),
+                                 callback=lambda result, i=i: finished.put((i, result, None)),
+                                 error_callback=lambda error, i=i: finished.put((i, None, error)))
+
+            if verbose is True:
+                print("{} tasks running ({:.1f} of {:.1f} GB budgeted), {} waiting".format(
+                    running, in_use / 1024**3, max_memory / 1024**3, len(pending)))
+
+            i, result, error = finished.get()
+            running -= 1
+            in_use -= footprints[i]
+            if error is not None:
+                errors.append(error)
+            else:
+                results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+
+    if len(errors) > 0:
+        raise errors[0]
+
+    return results
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""An on-disk sidecar cache of the decoded events and derived columns of EVT1 files.
+
+Reading an EVT1 file means decompressing it (they usually come gzipped),
+decoding its FITS table and computing the fp, fb values of every event. The
+sidecar cache keeps the result, one .npy file per column, so that a repeat
+HRCevt1(..., cache=...) of an unchanged file memory-maps its columns instead.
+
+Each cache entry is keyed by a hash of the EVT1 file's content, the hyperscreen
+version and the cache format, so an edited file (or a new version of
+hyperscreen) never picks up a stale entry. The cache is bounded in size: once
+it grows past its limit, the least recently used entries are evicted.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from astropy.io import fits
+
+from hyperscreen import __version__
+
+# Bump this whenever the layout of a cache entry changes
+CACHE_FORMAT = 1
+
+DEFAULT_MAX_BYTES = 20 * 1024**3
+
+# The content hash of every cached EVT1 file (with its path, size and mtime, to tell if it changed) is
+# kept in a file of its own in this subdirectory, so that concurrent workers never overwrite each other's
+HASH_DIRECTORY = 'hashes'
+
+
+def content_hash(filename, blocksize=4 * 1024**2):
+    """The SHA-256 hash of a file's content.
+
+    :param filename: The file to hash
+    :type filename: str
+    :param blocksize: Number of bytes read at a time, defaults to 4 MB
+    :type blocksize: int, optional
+    :return: The hexadecimal digest
+    :rtype: str
+    """
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _write_json(obj, filename):
+    """Write (or replace) a JSON file atomically, so concurrent readers never see half of it."""
+    partial_file = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(partial_file, 'w') as f:
+        json.dump(obj, f)
+    os.replace(partial_file, filename)
+
+
+class CachedEvents:
+    """The cached events of one EVT1 file. Columns are memory-mapped when read.
+
+    :param directory: The directory of the cache entry
+    :type directory: str
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        with open(os.path.join(directory, 'columns.json')) as f:
+            columns = json.load(f)
+        self.event_columns = columns['events']
+        self.derived_columns = columns['derived']
+
+        with open(os.path.join(directory, 'header.txt')) as f:
+            self.header = fits.Header.fromstring(f.read())
+        self.gti = np.load(os.path.join(directory, 'gti.npy')).view(np.recarray)
+
+    def column(self, name):
+        """A (memory-mapped, read-only) cached column."""
+        return np.load(os.path.join(self.directory, '{}.npy'.format(name)), mmap_mode='r')
+
+    def columns(self, names):
+        """Several cached columns, as a dictionary keyed by column name."""
+        return {name: self.column(name) for name in names}
+
+
+class SidecarCache:
+    """A size-bounded directory of cached EVT1 events.
+
+    :param directory: The cache directory. It is created if it doesn't exist.
+    :type directory: str
+    :param max_bytes: Once the cache holds more than this many bytes, the least recently used entries are evicted. Defaults to DEFAULT_MAX_BYTES (20 GB).
+    :type max_bytes: int, optional
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def key(self, evt1file):
+        """The cache key of an EVT1 file.
+
+        Hashing a whole EVT1 file costs a full read of it, so the content hash is
+        remembered for as long as the file keeps its path, size and mtime.
+        """
+        path = os.path.abspath(evt1file)
+        stat = os.stat(path)
+        signature = [path, stat.st_size, stat.st_mtime_ns]
+
+        hash_directory = os.path.join(self.directory, HASH_DIRECTORY)
+        hash_file = os.path.join(hash_directory, '{}.json'.format(hashlib.sha256(path.encode()).hexdigest()))
+        try:
+            with open(hash_file) as f:
+                remembered = json.load(f)
+        except (IOError, ValueError):
+            remembered = None
+
+        if remembered is not None and remembered[:3] == signature:
+            digest = remembered[3]
+        else:
+            digest = content_hash(path)
+            os.makedirs(hash_directory, exist_ok=True)
+            _write_json(signature + [digest], hash_file)
+
+        return hashlib.sha256('{}:{}:{}'.format(digest, __version__, CACHE_FORMAT).encode()).hexdigest()
+
+    def entry(self, evt1file):
+        """The directory of the cache entry of an EVT1 file (which may not exist)."""
+        return os.path.join(self.directory, self.key(evt1file))
+
+    def load(self, evt1file):
+        """The cached events of an EVT1 file, or None if it isn't cached.
+
+        :param evt1file: The EVT1 file
+        :type evt1file: str
+        :rtype: CachedEvents or None
+        """
+        directory = self.entry(evt1file)
+        if not os.path.isdir(directory):
+            return None
+
+        try:
+            # Mark the entry as recently used
+            os.utime(os.path.join(directory, 'columns.json'), None)
+            return CachedEvents(directory)
+        except (IOError, OSError):
+            # Another process evicted the entry while it was being read
+            return None
+
+    def store(self, evt1file, header, gti, event_columns, derived_columns):
+        """Cache the events of an EVT1 file, then evict the least recently used (other) entries if the cache is too big.
+
+        Columns are written one at a time, so each may be given as a callable that
+        returns its values, which is then called only when it's written.
+
+        :param evt1file: The EVT1 file
+        :type evt1file: str
+        :param header: The header of its EVENTS table
+        :type header: astropy.io.fits.Header
+        :param gti: Its GTI table
+        :type gti: numpy.ndarray
+        :param event_columns: Its (decoded) event columns by name, in order. The packed status bits are stored as 'status'.
+        :type event_columns: collections.OrderedDict
+        :param derived_columns: Its derived columns (e.g. fp_u) by name
+        :type derived_columns: collections.OrderedDict
+        :return: The cache entry directory
+        :rtype: str
+        """
+        directory = self.entry(evt1file)
+        if os.path.isdir(directory):
+            return directory
+
+        # Build the entry under a temporary name, then move it into place, so a half-written entry is never read
+        partial_directory = '{}.{}.tmp'.format(directory, os.getpid())
+        os.makedirs(partial_directory)
+        try:
+            for name, values in list(event_columns.items()) + list(derived_columns.items()):
+                np.save(os.path.join(partial_directory, '{}.npy'.format(name)),
+                        np.asarray(values() if callable(values) else values))
+
+            np.save(os.path.join(partial_directory, 'gti.npy'), np.asarray(gti))
+            with open(os.path.join(partial_directory, 'header.txt'), 'w') as f:
+                f.write(header.tostring())
+            _write_json({'events': list(event_columns), 'derived': list(derived_columns)},
+                        os.path.join(partial_directory, 'columns.json'))
+
+            os.rename(partial_directory, directory)
+        except OSError:
+            # Another process may have cached the same file in the meantime
+            shutil.rmtree(partial_directory, ignore_errors=True)
+            if not os.path.isdir(directory):
+                raise
+        except BaseException:
+            shutil.rmtree(partial_directory, ignore_errors=True)
+            raise
+
+        self.evict(keep=[directory])
+        return directory
+
+    def entries(self):
+        """The cache entries, least recently used first, as (directory, size in bytes) tuples."""
+        entries = []
+        for name in os.listdir(self.directory):
+            directory = os.path.join(self.directory, name)
+            columns_file = os.path.join(directory, 'columns.json')
+            if not os.path.isfile(columns_file):
+                continue  # not a (complete) entry
+            size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            entries.append((os.path.getmtime(columns_file), directory, size))
+
+        return [(directory, size) for _, directory, size in sorted(entries)]
+
+    def size(self):
+        """The total size of the cache entries, in bytes."""
+        return sum(size for _, size in self.entries())
+
+    def evict(self, keep=()):
+        """Remove the least recently used entries until the cache is no bigger than max_bytes.
+
+        :param keep: Entry directories that are never removed, e.g. the one just stored. Defaults to none.
+        :type keep: list, optional
+        :return: The removed entry directories
+        :rtype: list
+        """
+        entries = self.entries()
+        total = sum(size for _, size in entries)
+
+        evicted = []
+        for directory, size in entries:
+            if total <= self.max_bytes:
+                break
+            if directory in keep:
+                continue
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
+            evicted.append(directory)
+
+        return evicted
+
+    def clear(self):
+        """Remove every cache entry."""
+        for directory, _ in self.entries():
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Packed HRC EVT1 status bits, with named-flag views and composite queries.
+
+The (32X) status column of an HRC EVT1 file holds 32 flag bits per event. They
+are kept here as a single uint32 per event, in the order in which they appear
+in the file: status bit k (counting from zero, as in the EVT1 specification's
+bit k + 1) is the (31 - k)th least significant bit. A flag, or any set of
+flags, is then tested with one vectorized bitwise operation over all events.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+from collections import OrderedDict
+
+import numpy as np
+
+# The legible name of each (used) status bit, with its (zero-based) position in the status column.
+# Bits 3 and 13 are spares.
+STATUS_FLAGS = OrderedDict([
+    ("AV3 corrected for ringing", 0),
+    ("AU3 corrected for ringing", 1),
+    ("Event impacted by prior event (piled up)", 2),
+    ("Shifted event time", 4),
+    ("Event telemetered in NIL mode", 5),
+    ("V axis not triggered", 6),
+    ("U axis not triggered", 7),
+    ("V axis center blank event", 8),
+    ("U axis center blank event", 9),
+    ("V axis width exceeded", 10),
+    ("U axis width exceeded", 11),
+    ("Shield PMT active", 12),
+    ("Upper level discriminator not exceeded", 14),
+    ("Lower level discriminator not exceeded", 15),
+    ("Event in bad region", 16),
+    ("Amp total on V or U = 0", 17),
+    ("Incorrect V center", 18),
+    ("Incorrect U center", 19),
+    ("PHA ratio test failed", 20),
+    ("Sum of 6 taps = 0", 21),
+    ("Grid ratio test failed", 22),
+    ("ADC sum on V or U = 0", 23),
+    ("PI exceeding 255", 24),
+    ("Event time tag is out of sequence", 25),
+    ("V amp flatness test failed", 26),
+    ("U amp flatness test failed", 27),
+    ("V amp saturation test failed", 28),
+    ("U amp saturation test failed", 29),
+    ("V hyperbolic test failed", 30),
+    ("U hyperbolic test failed", 31),
+])
+
+# An event fails the legacy (Murray+) hyperbola test if it fails on either axis
+HYPERBOLA_FLAGS = ["U hyperbolic test failed", "V hyperbolic test failed"]
+
+
+def flag_mask(flags):
+    """The uint32 bit mask selecting one or more status flags.
+
+    :param flags: A flag name (see STATUS_FLAGS) or bit position, or a list of them
+    :type flags: str, int or list
+    :return: The bit mask
+    :rtype: numpy.uint32
+    """
+    if isinstance(flags, (str, int, np.integer)):
+        flags = [flags]
+
+    mask = 0
+    for flag in flags:
+        bit = STATUS_FLAGS[flag] if isinstance(flag, str) else int(flag)
+        if not 0 <= bit < 32:
+            raise ValueError("Status bits are numbered 0 through 31, not {}".format(bit))
+        mask |= 1 << (31 - bit)
+
+    return np.uint32(mask)
+
+
+def pack_status(status):
+    """Pack a status column into one uint32 per event.
+
+    :param status: Either the raw (N, 4) uint8 status bytes of an EVT1 table, or its (N, 32) boolean expansion
+    :type status: numpy.ndarray
+    :return: The packed status bits
+    :rtype: numpy.ndarray of numpy.uint32
+    """
+    status = np.asarray(status)
+    if status.dtype == bool:
+        status = np.packbits(status, axis=1)
+
+    return np.ascontiguousarray(status, dtype=np.uint8).view('>u4').ravel().astype(np.uint32)
+
+
+class StatusBits:
+    """The packed status bits of a set of events.
+
+    Every query returns a boolean mask over the events. Flags may be given by
+    name (see STATUS_FLAGS) or by bit position::
+
+        status['Shield PMT active']
+        status.any_of(['U axis width exceeded', 'V axis width exceeded'])
+
+    :param bits: The packed status bits, e.g. from pack_status()
+    :type bits: numpy.ndarray of numpy.uint32
+    """
+
+    def __init__(self, bits):
+        self.bits = np.asarray(bits, dtype=np.uint32)
+
+    @classmethod
+    def from_table(cls, events):
+        """Read the status bits of a FITS events table, straight from its raw bytes.
+
+        :param events: The EVENTS table of an EVT1 file (or raw rows of it)
+        :type events: astropy.io.fits.FITS_rec or numpy.ndarray
+        """
+        # Viewed as a plain ndarray, astropy doesn't expand the 32X column into 32 booleans
+        return cls(pack_status(np.asarray(events).view(np.ndarray)['status']))
+
+    def __len__(self):
+        return len(self.bits)
+
+    def __getitem__(self, flag):
+        return self.any_of(flag)
+
+    def any_of(self, flags):
+        """Mask of the events with at least one of the given flags set."""
+        return (self.bits & flag_mask(flags)) != 0
+
+    def all_of(self, flags):
+        """Mask of the events with every one of the given flags set."""
+        mask = flag_mask(flags)
+        return (self.bits & mask) == mask
+
+    def none_of(self, flags):
+        """Mask of the events with none of the given flags set."""
+        return (self.bits & flag_mask(flags)) == 0
+
+    def count(self, flags):
+        """Number of events with at least one of the given flags set."""
+        return np.count_nonzero(self.any_of(flags))
+
+    def views(self):
+        """Callables giving the legacy, legible per-flag columns of HRCevt1."""
+        return OrderedDict((name, lambda name=name: self.any_of(name)) for name in STATUS_FLAGS)
+
+    def hyperbola_test(self):
+        """The legacy hyperbola test columns of HRCevt1, "Hyperbola test passed" and "Hyperbola test failed"."""
+        failed = self.any_of(HYPERBOLA_FLAGS)
+        return OrderedDict([("Hyperbola test passed", np.logical_not(failed)),
+                            ("Hyperbola test failed", failed)])
@@ -0,0 +1,615 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Bounded-memory HyperScreen of EVT1 files that are too large to load at once.
+
+The raw rows of the EVENTS table are streamed from the (optionally gzipped)
+EVT1 file in fixed-size chunks, so peak memory is set by the chunk size and
+not by the number of events in the file. The streaming screen runs as two
+passes over the chunks:
+
+1. The accumulation pass collects, for every tap on each axis, the event
+   counts and the fb/fp histograms, from which the tap thresholds follow.
+   The exact bin edges of every tap depend on its fb/fp extent, so this pass
+   opens with a cheap scan that only tracks those extents.
+2. The classification pass screens every chunk against the accepted bins and
+   writes its survivors (and, optionally, its rejected events) straight out.
+
+The survivors are identical to those of HRCevt1.hyperscreen(). The file is
+read three times (the scan, then both passes), so a gzipped EVT1 file is first
+decompressed once, to a temporary file, rather than on every read.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+from astropy.io import fits
+
+from hyperscreen import statusbits
+from hyperscreen import tapscreen
+
+# crsu and crsv are 16-bit integers, so per-tap accumulators are indexed by crs + TAP_OFFSET
+TAP_OFFSET = 32768
+NUM_TAPS = 65536
+
+# The logical column in which write_annotated() records the HyperScreen decision of every event
+FLAG_COLUMN = 'hyperscreen'
+
+
+def is_gzipped(filename):
+    """Whether a file is gzipped (from its first bytes, whatever its name)."""
+    with open(filename, 'rb') as f:
+        return f.read(2) == b'\x1f\x8b'
+
+
+@contextmanager
+def decompressed(evt1file, scratch_dir=None):
+    """The path of an uncompressed copy of a gzipped EVT1 file, removed again on exit (or the EVT1 file itself, if it isn't gzipped).
+
+    :param evt1file: A .fits (or .fits.gz) file
+    :type evt1file: str
+    :param scratch_dir: Directory in which to write the copy, defaults to None (the system's temporary directory)
+    :type scratch_dir: str, optional
+    """
+    if not is_gzipped(evt1file):
+        yield evt1file
+        return
+
+    handle, rawname = tempfile.mkstemp(suffix='.fits', prefix='hyperscreen_', dir=scratch_dir)
+    try:
+        with os.fdopen(handle, 'wb') as raw, gzip.open(evt1file, 'rb') as compressed:
+            shutil.copyfileobj(compressed, raw, 16 * 1024**2)
+        yield rawname
+    finally:
+        os.remove(rawname)
+
+
+class EventStream:
+    """Sequential, chunked reader of the raw rows of an EVT1 EVENTS table.
+
+    :param evt1file: A .fits (or .fits.gz) file containing the level 1 event list
+    :type evt1file: str
+    :param chunk_rows: Number of events to read at a time, defaults to 500000
+    :type chunk_rows: int, optional
+    """
+
+    def __init__(self, evt1file, chunk_rows=500000):
+
+        self.filename = evt1file
+        self.chunk_rows = chunk_rows
+
+        # Only the headers are parsed here; no event data is read
+        with fits.open(evt1file) as hdulist:
+            self.header = hdulist[1].header.copy()
+            info = hdulist.fileinfo(1)
+            self.dtype = hdulist[1].columns.dtype.newbyteorder('>')
+
+        self.header_offset = info['hdrLoc']
+        self.data_offset = info['datLoc']
+        self.data_span = info['datSpan']
+        self.numevents = self.header['NAXIS2']
+
+        if self.dtype.itemsize != self.header['NAXIS1']:
+            raise Exception("ERROR: Cannot stream {}; its EVENTS rows are {} bytes wide, not {}.".format(
+                evt1file, self.header['NAXIS1'], self.dtype.itemsize))
+
+    def open(self):
+        """Open the raw (decompressed) byte stream of the EVT1 file."""
+        if is_gzipped(self.filename):
+            return gzip.open(self.filename, 'rb')
+        return open(self.filename, 'rb')
+
+    def chunks(self, stream):
+        """Yield the EVENTS rows of an open stream (positioned at the start of the data), chunk by chunk."""
+        for start in range(0, self.numevents, self.chunk_rows):
+            nrows = min(self.chunk_rows, self.numevents - start)
+            yield np.frombuffer(stream.read(nrows * self.dtype.itemsize), dtype=self.dtype)
+
+    def read(self, visit, prefix=None, tail=None):
+        """Make one sequential pass over the file.
+
+        :param visit: Called with every chunk of rows, in order
+        :type visit: callable
+        :param prefix: Called with the raw bytes preceding the EVENTS header, defaults to None
+        :type prefix: callable, optional
+        :param tail: Called with the raw bytes of every HDU following the EVENTS table, defaults to None
+        :type tail: callable, optional
+        """
+
+        with self.open() as stream:
+            leading = stream.read(self.header_offset)
+            if prefix is not None:
+                prefix(leading)
+            stream.read(self.data_offset - self.header_offset)
+
+            for rows in self.chunks(stream):
+                visit(rows)
+
+            if tail is not None:
+                stream.read(self.data_span - self.numevents * self.dtype.itemsize)
+                tail(stream.read())
+
+
+class EventWriter:
+    """Write a (filtered) copy of an EVT1 file, one chunk of EVENTS rows at a time.
+
+    The EVENTS header is written up front with a placeholder row count, which
+    is patched once every row has been written.
+    """
+
+    def __init__(self, filename, header, prefix):
+
+        self.filename = filename
+        # A gzipped product is compressed once the uncompressed file is complete
+        self.rawname = filename[:-3] if filename.endswith('.gz') else filename
+        self.header = header.copy()
+        self.nrows = 0
+
+        self.file = open(self.rawname, 'wb')
+        self.file.write(prefix)
+        self.header_offset = self.file.tell()
+        self.file.write(self.header.tostring().encode('ascii'))
+
+    def write(self, rows):
+        self.file.write(rows.tobytes())
+        self.nrows += len(rows)
+
+    def close(self, tail):
+        # Pad the table to a whole number of FITS blocks, then copy the trailing HDUs (e.g. the GTI)
+        datasize = self.nrows * self.header['NAXIS1']
+        self.file.write(b'\0' * (-datasize % 2880))
+        self.file.write(tail)
+
+        self.header['NAXIS2'] = self.nrows
+        self.file.seek(self.header_offset)
+        self.file.write(self.header.tostring().encode('ascii'))
+        self.file.close()
+
+        if self.rawname != self.filename:
+            with open(self.rawname, 'rb') as raw, gzip.open(self.filename, 'wb') as compressed:
+                shutil.copyfileobj(raw, compressed)
+            os.remove(self.rawname)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.rawname)
+
+
+def raw_rows(hdu):
+    """The raw (big-endian) rows of an already read binary table HDU, exactly as they are laid out in its file.
+
+    :raises ValueError: If the rows can't be copied as they are (e.g. the table has a heap)
+    """
+    rows = np.asarray(hdu.data).view(np.ndarray)
+    if hdu.header['PCOUNT'] != 0 or rows.dtype.itemsize != hdu.header['NAXIS1'] or len(rows) != hdu.header['NAXIS2']:
+        raise ValueError("The rows of HDU {} can't be copied as they are.".format(hdu.name))
+    return rows
+
+
+def hdu_bytes(hdu):
+    """The raw FITS bytes of an already read HDU (without data, or a binary table without a heap).
+
+    :raises ValueError: If the HDU can't be copied as it is
+    """
+    header = hdu.header.tostring().encode('ascii')
+    if hdu.data is None:
+        return header
+    if not isinstance(hdu, fits.BinTableHDU):
+        raise ValueError("HDU {} can't be copied as it is.".format(hdu.name))
+    data = raw_rows(hdu).tobytes()
+    return header + data + b'\0' * (-len(data) % 2880)
+
+
+def replace_primary_header(prefix, primary_header):
+    """Replace the header of the raw bytes of a primary HDU (header, then data) with primary_header."""
+    end = 0
+    while end < len(prefix) and prefix[end:end + 80].rstrip() != b'END':
+        end += 80
+    end += 80 + (-(end + 80) % 2880)
+
+    return primary_header.tostring().encode('ascii') + prefix[end:]
+
+
+def read_events(source, visit, prefix, chunk_rows=500000):
+    """Make one pass over the raw EVENTS rows of an EVT1 file, whether it has already been read or not.
+
+    An HDUList that is already in memory (e.g. HRCevt1.hdulist) or
+    memory-mapped is used as is, so the EVT1 file isn't read (or decompressed)
+    again. Given a filename instead (or an HDUList whose HDUs can't be copied as
+    they are), the file is streamed, exactly once.
+
+    :param source: The (already read or memory-mapped) HDUList of the EVT1 file, or the EVT1 file itself
+    :type source: astropy.io.fits.HDUList or str
+    :param visit: Called with every chunk of raw rows, in order
+    :type visit: callable
+    :param prefix: Called with the EVENTS header and the raw bytes of the primary HDU, before any rows
+    :type prefix: callable
+    :param chunk_rows: Number of events visited at a time, defaults to 500000
+    :type chunk_rows: int, optional
+    :return: The raw bytes of every HDU following the EVENTS table (e.g. the GTI)
+    :rtype: bytes
+    """
+
+    if isinstance(source, fits.HDUList):
+        try:
+            leading = hdu_bytes(source[0])
+            rows = raw_rows(source[1])
+            tail = b''.join(hdu_bytes(hdu) for hdu in source[2:])
+        except ValueError:
+            # Anything that can't be copied as it is, is streamed from the file instead
+            source = source.filename()
+
+    if isinstance(source, fits.HDUList):
+        prefix(source[1].header, leading)
+        for start in range(0, len(rows), chunk_rows):
+            visit(rows[start:start + chunk_rows])
+        return tail
+
+    stream = EventStream(source, chunk_rows=chunk_rows)
+    tail = []
+    stream.read(visit, prefix=lambda leading: prefix(stream.header, leading), tail=tail.append)
+    return tail[0]
+
+
+def _check_mask(survival_mask, header):
+    if len(survival_mask) != header['NAXIS2']:
+        raise Exception("ERROR: The survival mask covers {:,} events, but there are {:,}.".format(len(survival_mask), header['NAXIS2']))
+
+
+def write_products(source, survival_mask, survivors_file, rejected_file=None, chunk_rows=500000, headers=None):
+    """Write the survivors (and rejected events) of a screened EVT1 file in a single pass over its rows.
+
+    The EVENTS rows are copied as raw bytes, chunk by chunk, into both products
+    at once, from the loaded observation if it is given (see read_events()).
+
+    :param source: The (already read or memory-mapped) HDUList of the EVT1 file, or the EVT1 file itself
+    :type source: astropy.io.fits.HDUList or str
+    :param survival_mask: Boolean mask of the events that survive, e.g. "All Survivals (boolean mask)" of HRCevt1.hyperscreen()
+    :type survival_mask: numpy.ndarray
+    :param survivors_file: Path of the HyperScreen-filtered EVT1 file to write (gzipped if it ends with .gz)
+    :type survivors_file: str
+    :param rejected_file: Path of an EVT1 file of the rejected events to write, defaults to None (not written)
+    :type rejected_file: str, optional
+    :param chunk_rows: Number of events copied at a time, defaults to 500000
+    :type chunk_rows: int, optional
+    :param headers: The (primary header, EVENTS header) of the 'survivors' and 'rejected' products. Headers that are None (or products that are missing) are copied from the source. Defaults to None.
+    :type headers: dict, optional
+    :return: The number of surviving events
+    :rtype: int
+    """
+
+    survival_mask = np.asarray(survival_mask, dtype=bool)
+    headers = headers if headers is not None else {}
+    products = [('survivors', survivors_file), ('rejected', rejected_file)]
+    writers = {}
+    state = {'position': 0, 'survivals': 0}
+
+    def open_writers(header, prefix):
+        _check_mask(survival_mask, header)
+        for product, filename in products:
+            if filename is None:
+                continue
+            primary_header, events_header = headers.get(product, (None, None))
+            writers[product] = EventWriter(filename, events_header if events_header is not None else header,
+                                           prefix if primary_header is None else replace_primary_header(prefix, primary_header))
+
+    def split(rows):
+        mask = survival_mask[state['position']:state['position'] + len(rows)]
+        state['position'] += len(rows)
+        state['survivals'] += np.count_nonzero(mask)
+        writers['survivors'].write(rows[mask])
+        if 'rejected' in writers:
+            writers['rejected'].write(rows[~mask])
+
+    try:
+        tail = read_events(source, split, open_writers, chunk_rows=chunk_rows)
+    except Exception:
+        # Don't leave truncated products behind
+        for writer in writers.values():
+            writer.discard()
+        raise
+
+    for writer in writers.values():
+        writer.close(tail)
+
+    return state['survivals']
+
+
+def annotated_header(header, num_survivals, softening=None, column=FLAG_COLUMN):
+    """The EVENTS header of an annotated EVT1 file: that of the original, with the flag column and the HyperScreen keywords added."""
+    header = header.copy()
+    index = header['TFIELDS'] + 1
+
+    header['TFIELDS'] = index
+    header['NAXIS1'] += 1
+    header.append(('TTYPE{}'.format(index), column, 'Event survives HyperScreen'))
+    header.append(('TFORM{}'.format(index), 'L', 'format of field'))
+
+    header['HYPRSCRN'] = ('{}'.format(softening), 'HYPERSCREEN Softening Parameter')
+    header['HYPRFLAG'] = (column, 'HyperScreen decision column (T = survives)')
+    header['HYPRNSRV'] = (num_survivals, 'Number of events surviving HyperScreen')
+
+    return header
+
+
+def write_annotated(source, survival_mask, annotated_file, softening=None, chunk_rows=500000, column=FLAG_COLUMN):
+    """Write a copy of a screened EVT1 file in which every event is flagged with the HyperScreen decision, instead of splitting it into survivors and rejected events.
+
+    A logical column (one byte per event, T if the event survives) is appended
+    to the EVENTS table, and the HYPRSCRN, HYPRFLAG and HYPRNSRV keywords are
+    added to its header. All events are kept, in a single output file, and
+    the survivors can be selected whenever the file is read (e.g.
+    ``data[data[FLAG_COLUMN]]``).
+
+    :param source: The (already read or memory-mapped) HDUList of the EVT1 file, or the EVT1 file itself
+    :type source: astropy.io.fits.HDUList or str
+    :param survival_mask: Boolean mask of the events that survive, e.g. "All Survivals (boolean mask)" of HRCevt1.hyperscreen()
+    :type survival_mask: numpy.ndarray
+    :param annotated_file: Path of the annotated EVT1 file to write (gzipped if it ends with .gz)
+    :type annotated_file: str
+    :param softening: The softening HyperScreen was run with, recorded as HYPRSCRN, defaults to None
+    :type softening: float, optional
+    :param chunk_rows: Number of events copied at a time, defaults to 500000
+    :type chunk_rows: int, optional
+    :param column: Name of the flag column, defaults to FLAG_COLUMN
+    :type column: str, optional
+    :return: The number of surviving events
+    :rtype: int
+    """
+
+    survival_mask = np.asarray(survival_mask, dtype=bool)
+    num_survivals = np.count_nonzero(survival_mask)
+    writers = {}
+    state = {'position': 0}
+
+    def open_writer(header, prefix):
+        _check_mask(survival_mask, header)
+        if column in [header['TTYPE{}'.format(i)] for i in range(1, header['TFIELDS'] + 1)]:
+            raise Exception("ERROR: {} already has a {} column. Has HyperScreen been applied to it before?".format(source, column))
+        writers['annotated'] = EventWriter(annotated_file, annotated_header(header, num_survivals, softening, column), prefix)
+
+    def annotate(rows):
+        mask = survival_mask[state['position']:state['position'] + len(rows)]
+        state['position'] += len(rows)
+        # Every raw row, followed by its one-byte FITS logical flag
+        annotated = np.empty(len(rows), dtype=[('row', 'V{}'.format(rows.dtype.itemsize)), ('flag', 'S1')])
+        annotated['row'] = rows.view(annotated.dtype['row'])
+        annotated['flag'] = np.where(mask, b'T', b'F')
+        writers['annotated'].write(annotated)
+
+    try:
+        tail = read_events(source, annotate, open_writer, chunk_rows=chunk_rows)
+    except Exception:
+        for writer in writers.values():
+            writer.discard()
+        raise
+
+    writers['annotated'].close(tail)
+
+    return num_survivals
+
+
+def calculate_fp_fb(rows):
+    """Fine positions and normalized central tap amplitudes of a chunk of raw rows, as HRCevt1.calculate_fp_fb() computes them.
+
+    :param rows: Raw EVENTS rows
+    :type rows: numpy.ndarray
+    :return: fp_u, fb_u, fp_v, fb_v
+    :rtype: numpy.ndarray
+    """
+
+    a_u, b_u, c_u = rows['au1'], rows['au2'], rows['au3']
+    a_v, b_v, c_v = rows['av1'], rows['av2'], rows['av3']
+
+    total_u = a_u + b_u + c_u
+    total_v = a_v + b_v + c_v
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fp_u = (c_u - a_u) / total_u
+        fb_u = b_u / total_u
+
+        fp_v = (c_v - a_v) / total_v
+        fb_v = b_v / total_v
+
+    return fp_u, fb_u, fp_v, fb_v
+
+
+def hyperbola_test_passed(rows):
+    """Mask of the events that pass the legacy hyperbola test on both axes, read from their raw status bits."""
+    return statusbits.StatusBits.from_table(rows).none_of(statusbits.HYPERBOLA_FLAGS)
+
+
+def _locate_chunk(fb, fp, tapid, xbins, ybins):
+    """Find the histogram cells of the events of a chunk that lie in screened taps."""
+
+    events = np.flatnonzero(tapid >= 0)
+    fb, fp = fb[events], fp[events]
+    keep = np.isfinite(fb)
+    cells, inside = tapscreen.locate_cells(fb, fp, tapid[events], keep, xbins, ybins)
+
+    return events, keep, cells, inside
+
+
+def stream_hyperscreen(evt1file, survivors_file, rejected_file=None, softening=1.0, chunk_rows=500000, min_counts=20, verbose=False, decompress=True, scratch_dir=None):
+    """Apply HyperScreen to an EVT1 file in bounded memory, writing the survivors (and rejected events) as it goes.
+
+    :param evt1file: A .fits (or .fits.gz) file containing the level 1 event list
+    :type evt1file: str
+    :param survivors_file: Path of the HyperScreen-filtered EVT1 file to write (gzipped if it ends with .gz), or None to only screen the events
+    :type survivors_file: str
+    :param rejected_file: Path of an EVT1 file of the rejected events to write, defaults to None (not written)
+    :type rejected_file: str, optional
+    :param softening: The Otsu threshold of every tap is lowered by this fraction of itself (None applies no softening), defaults to 1.0
+    :type softening: float, optional
+    :param chunk_rows: Number of events held in memory at a time, defaults to 500000
+    :type chunk_rows: int, optional
+    :param min_counts: Taps with fewer events than this are skipped, defaults to 20
+    :type min_counts: int, optional
+    :param verbose: Report progress on stdout, defaults to False
+    :type verbose: bool, optional
+    :param decompress: Decompress a gzipped EVT1 file once, to a temporary file (as large as the uncompressed events), rather than on each of the three reads of it, defaults to True
+    :type decompress: bool, optional
+    :param scratch_dir: Directory of that temporary file, defaults to None (the system's temporary directory)
+    :type scratch_dir: str, optional
+    :return: The summary entries of the HyperScreen results dictionary (see HRCevt1.hyperscreen())
+    :rtype: dict
+    """
+
+    if decompress is True and is_gzipped(evt1file):
+        if verbose is True:
+            print("Decompressing {}...".format(evt1file))
+        with decompressed(evt1file, scratch_dir) as raw_file:
+            return stream_hyperscreen(raw_file, survivors_file, rejected_file=rejected_file, softening=softening, chunk_rows=chunk_rows,
+                                      min_counts=min_counts, verbose=verbose, decompress=False)
+
+    events = EventStream(evt1file, chunk_rows=chunk_rows)
+    header = events.header
+
+    if events.numevents < 100000:
+        bins = [50, 50]  # number of bins
+    else:
+        bins = [200, 200]
+
+    axes = ('u', 'v')
+    counts = {axis: np.zeros(NUM_TAPS, dtype=np.int64) for axis in axes}
+    extents = {axis: np.full((4, NUM_TAPS), np.nan) for axis in axes}
+    state = {'hyperbola failures': 0, 'goodtime events': 0, 'survivals': 0}
+
+    def fp_fb(rows):
+        fp_u, fb_u, fp_v, fb_v = calculate_fp_fb(rows)
+        return {'u': (fb_u, fp_u), 'v': (fb_v, fp_v)}
+
+    # ~~~~~ Pass 1a: event counts and fb/fp extents of every tap ~~~~~
+
+    def scan_extents(rows):
+        passed = hyperbola_test_passed(rows)
+        state['hyperbola failures'] += len(rows) - np.count_nonzero(passed)
+
+        for axis, (fb, fp) in fp_fb(rows).items():
+            crs = rows['crs' + axis][passed].astype(np.intp) + TAP_OFFSET
+            if len(crs) == 0:
+                continue
+            fb, fp = fb[passed], fp[passed]
+            counts[axis] += np.bincount(crs, minlength=NUM_TAPS)
+
+            order = np.argsort(crs, kind='stable')
+            taps, starts = np.unique(crs[order], return_index=True)
+            bounds = np.append(starts, len(crs))
+            keep = np.isfinite(fb)
+            for row, values in enumerate((fb, fp)):
+                first, last = tapscreen.tap_extents(np.where(keep, values, np.nan)[order], bounds)
+                extents[axis][2 * row, taps] = np.fmin(extents[axis][2 * row, taps], first)
+                extents[axis][2 * row + 1, taps] = np.fmax(extents[axis][2 * row + 1, taps], last)
+
+    tail = []
+    if verbose is True:
+        print("Scanning {:,} events of {} in chunks of {:,}...".format(events.numevents, evt1file, chunk_rows))
+    events.read(scan_extents, tail=tail.append)
+    gti = fits.BinTableHDU.fromstring(tail[0]).data
+
+    lookup = {}
+    screen = {}
+    for axis in axes:
+        present = np.flatnonzero(counts[axis])
+        if len(present) == 0:
+            raise Exception("ERROR: No events in {} pass the legacy hyperbola test.".format(evt1file))
+        # Every tap from one below the lowest to the highest is screened, if it has enough counts
+        taprange = range(present[0] - 1, present[-1] + 1)
+        taps = np.array([tap for tap in taprange if counts[axis][tap] >= min_counts], dtype=np.intp)
+
+        lookup[axis] = np.full(NUM_TAPS, -1, dtype=np.intp)
+        lookup[axis][taps] = np.arange(len(taps))
+
+        xbins = tapscreen.edges_from_extents(extents[axis][0, taps], extents[axis][1, taps], bins[0])
+        ybins = tapscreen.edges_from_extents(extents[axis][2, taps], extents[axis][3, taps], bins[1])
+        screen[axis] = {'ntaps': len(taps), 'xbins': xbins, 'ybins': ybins,
+                        'cube': np.zeros((len(taps), bins[0], bins[1]), dtype=np.int64)}
+
+    def tap_ids(rows, passed, axis):
+        return np.where(passed, lookup[axis][rows['crs' + axis].astype(np.intp) + TAP_OFFSET], -1)
+
+    # ~~~~~ Pass 1b: the tap histograms ~~~~~
+
+    def accumulate(rows):
+        time = rows['time']
+        state['goodtime events'] += np.count_nonzero((time > gti['START'][0]) & (time < gti['STOP'][-1]))
+
+        passed = hyperbola_test_passed(rows)
+        for axis, (fb, fp) in fp_fb(rows).items():
+            s = screen[axis]
+            selected, keep, cells, inside = _locate_chunk(fb, fp, tap_ids(rows, passed, axis), s['xbins'], s['ybins'])
+            s['cube'] += tapscreen.histogram_cube(cells, keep, s['ntaps'], bins)
+
+    if verbose is True:
+        print("Accumulating tap histograms...")
+    events.read(accumulate)
+
+    for axis in axes:
+        screen[axis]['accepted'] = tapscreen.accepted_bins(screen[axis]['cube'], softening=softening)
+        del screen[axis]['cube']
+
+    # ~~~~~ Pass 2: classify every chunk and write it out ~~~~~
+
+    header['HYPRSCRN'] = ('{}'.format(softening), 'HYPERSCREEN Softening Parameter')
+    writers = {}
+
+    def open_writers(prefix):
+        if survivors_file is not None:
+            writers['survivors'] = EventWriter(survivors_file, header, prefix)
+        if rejected_file is not None:
+            writers['rejected'] = EventWriter(rejected_file, header, prefix)
+
+    def classify(rows):
+        passed = hyperbola_test_passed(rows)
+        survivors = passed.copy()
+        for axis, (fb, fp) in fp_fb(rows).items():
+            s = screen[axis]
+            selected, keep, cells, inside = _locate_chunk(fb, fp, tap_ids(rows, passed, axis), s['xbins'], s['ybins'])
+            passed_axis = np.zeros(len(rows), dtype=bool)
+            passed_axis[selected] = tapscreen.classify(s['accepted'], cells, inside)
+            survivors &= passed_axis
+
+        state['survivals'] += np.count_nonzero(survivors)
+        if 'survivors' in writers:
+            writers['survivors'].write(rows[survivors])
+        if 'rejected' in writers:
+            writers['rejected'].write(rows[~survivors])
+
+    if verbose is True:
+        print("Screening{}...".format(" and writing {}".format(survivors_file) if survivors_file is not None else ""))
+    try:
+        events.read(classify, prefix=open_writers)
+    except Exception:
+        # Don't leave truncated products behind
+        for writer in writers.values():
+            writer.discard()
+        raise
+
+    for writer in writers.values():
+        writer.close(tail[0])
+
+    num_failures = events.numevents - state['survivals']
+    percent_hyperscreen_rejected = round(((num_failures / events.numevents) * 100), 2)
+    percent_legacy_hyperbola_test_rejected = round(((state['hyperbola failures'] / events.numevents) * 100), 2)
+
+    hyperscreen_results_dict = {"ObsID": header["OBS_ID"],
+                                "Target": header["OBJECT"],
+                                "Exposure Time": header["EXPOSURE"],
+                                "Detector": header["DETNAM"],
+                                "Number of Events": events.numevents,
+                                "Number of Good Time Events": state['goodtime events'],
+                                "Percent rejected by Tapscreen": percent_hyperscreen_rejected,
+                                "Percent rejected by Hyperbola": percent_legacy_hyperbola_test_rejected,
+                                "Percent improvement": round((percent_hyperscreen_rejected - percent_legacy_hyperbola_test_rejected), 2)
+                                }
+
+    return hyperscreen_results_dict
@@ -0,0 +1,532 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The tap-by-tap screening engine behind HRCevt1.hyperscreen().
+
+Events are grouped by their coarse tap position (crsu or crsv) exactly once,
+with a stable counting sort. Every tap then becomes a contiguous slice of
+the grouped fb/fp arrays, so no per-tap boolean mask over the whole event
+list is ever built.
+
+The bins of every tap are uniform, so the (tap, fb bin, fp bin) cell of
+every event is computed arithmetically, for all taps at once, instead of with
+per-tap np.digitize searches. All taps of an axis are histogrammed together
+into a single count cube of those cells, Otsu's Method is applied to every tap
+image at once, and events are classified by looking their cell up in a
+boolean cube of accepted bins. The results are identical to running np.histogram2d and
+skimage.filters.threshold_otsu tap by tap.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+from collections.abc import Mapping
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+
+def group_by_tap(crs, first_tap, ntaps):
+    """Group events by coarse tap position with a single stable counting sort.
+
+    :param crs: Coarse tap position (crsu or crsv) of every event
+    :type crs: numpy.ndarray
+    :param first_tap: The tap number that maps to the first group
+    :type first_tap: int
+    :param ntaps: The number of consecutive taps to group events into
+    :type ntaps: int
+    :return: order, bounds; the event positions sorted by tap (preserving event order within each tap), and the ntaps + 1 slice boundaries of each tap within ``order``
+    :rtype: numpy.ndarray, numpy.ndarray
+    """
+
+    offsets = np.asarray(crs, dtype=np.intp) - first_tap
+    counts = np.bincount(offsets, minlength=ntaps)
+
+    order = np.argsort(offsets, kind='stable')
+    bounds = np.zeros(ntaps + 1, dtype=np.intp)
+    np.cumsum(counts, out=bounds[1:])
+
+    return order, bounds
+
+
+def uniform_bin_index(values, rows, first_edge, last_edge, edges, return_on_last_edge=False):
+    """Locate values in rows of uniform bins, exactly as np.histogram does.
+
+    The bin is computed arithmetically and then nudged by at most one bin
+    wherever floating point rounding disagrees with the bin edges. Values lying
+    on the last edge are counted in the last bin.
+
+    :param values: The (finite) values to locate, each within the edges of its row
+    :type values: numpy.ndarray
+    :param rows: The row of ``edges`` that each value should be located in (broadcast against ``values``)
+    :type rows: numpy.ndarray
+    :param first_edge: The first edge of every row
+    :type first_edge: numpy.ndarray
+    :param last_edge: The last edge of every row
+    :type last_edge: numpy.ndarray
+    :param edges: The bin edges, one row of nbins + 1 edges per set of bins
+    :type edges: numpy.ndarray
+    :param return_on_last_edge: Also return a mask of the values lying on the last edge, defaults to False
+    :type return_on_last_edge: bool, optional
+    :return: The bin index of every value (and the mask, if requested)
+    :rtype: numpy.ndarray
+    """
+
+    nbins = edges.shape[1] - 1
+    scale = nbins / (last_edge - first_edge)
+
+    # One fused multiply-floor-clip: values are never below their first edge
+    index = ((values - first_edge[rows]) * scale[rows]).astype(np.intp)
+    np.minimum(index, nbins - 1, out=index)
+
+    # Flat lookups into the edges are much cheaper than 2D fancy indexing
+    flat_edges = edges.ravel()
+    offset = rows * (nbins + 1)
+    index[values < flat_edges.take(offset + index)] -= 1
+    upper = values >= flat_edges.take(offset + index + 1)
+    in_last_bin = index == nbins - 1
+    if return_on_last_edge is True:
+        on_last_edge = upper & in_last_bin
+    upper &= np.logical_not(in_last_bin, out=in_last_bin)
+    index[upper] += 1
+
+    if return_on_last_edge is True:
+        return index, on_last_edge
+    return index
+
+
+def otsu_thresholds(images, nbins=256):
+    """Otsu's Method applied independently to every image in a stack, vectorized along the stack.
+
+    This reproduces skimage.filters.threshold_otsu(image) for every image,
+    including the 256-bin intensity histogram spanning each image's own range
+    and the early return of the single value held by a flat image.
+
+    :param images: Stack of images, one per tap
+    :type images: numpy.ndarray
+    :param nbins: Number of intensity bins used by Otsu's Method, defaults to 256
+    :type nbins: int, optional
+    :return: The Otsu threshold of every image
+    :rtype: numpy.ndarray
+    """
+
+    pixels = images.reshape(len(images), -1).astype(float)
+    lo = pixels.min(axis=1)
+    hi = pixels.max(axis=1)
+    flat = lo == hi
+    hi_safe = np.where(flat, lo + 1, hi)
+
+    edges = np.linspace(lo, hi_safe, nbins + 1, axis=-1)
+    centers = (edges[:, :-1] + edges[:, 1:]) / 2.0
+
+    rows = np.arange(len(pixels))[:, np.newaxis]
+    index = uniform_bin_index(pixels, rows, lo, hi_safe, edges)
+    counts = np.bincount((rows * nbins + index).ravel(), minlength=len(pixels) * nbins)
+    counts = counts.reshape(len(pixels), nbins).astype(np.float32)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # class probabilities for all possible thresholds
+        weight1 = np.cumsum(counts, axis=1)
+        weight2 = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+        # class means for all possible thresholds
+        mean1 = np.cumsum(counts * centers, axis=1) / weight1
+        mean2 = (np.cumsum((counts * centers)[:, ::-1], axis=1) / weight2[:, ::-1])[:, ::-1]
+
+        variance12 = weight1[:, :-1] * weight2[:, 1:] * (mean1[:, :-1] - mean2[:, 1:]) ** 2
+
+    thresholds = centers[np.arange(len(pixels)), np.argmax(variance12, axis=1)]
+    thresholds[flat] = lo[flat]
+
+    return thresholds
+
+
+def accepted_bins(cube, softening=None):
+    """Threshold every tap image of a count cube into a boolean cube of accepted bins.
+
+    A bin is accepted if it holds at least one event, its count reaches the
+    (softened) Otsu threshold of its tap, and it lies in the upper half of the
+    fb range.
+
+    :param cube: The (tap, fb bin, fp bin) count cube
+    :type cube: numpy.ndarray
+    :param softening: The Otsu threshold is lowered by this fraction of itself, defaults to None (no softening)
+    :type softening: float, optional
+    :return: The (tap, fb bin, fp bin) cube of accepted bins
+    :rtype: numpy.ndarray
+    """
+
+    thresholds = otsu_thresholds(cube)
+    if softening is not None:
+        thresholds = thresholds - (thresholds * softening)
+
+    accepted = (cube > 0) & (cube >= thresholds[:, np.newaxis, np.newaxis])
+    accepted[:, :int(cube.shape[2] / 2), :] = False
+
+    return accepted
+
+
+def edges_from_extents(first_edge, last_edge, nbins):
+    """Bin edges spanning the extent of every tap's values, as np.histogram2d autodetects them.
+
+    :param first_edge: Smallest finite value of every tap (NaN if it has none)
+    :type first_edge: numpy.ndarray
+    :param last_edge: Largest finite value of every tap (NaN if it has none)
+    :type last_edge: numpy.ndarray
+    :param nbins: Number of bins
+    :type nbins: int
+    :return: first_edge, last_edge, edges; the outer edges of every tap, and its nbins + 1 bin edges
+    :rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray
+    """
+
+    first_edge = np.array(first_edge, dtype=float)
+    last_edge = np.array(last_edge, dtype=float)
+
+    # A tap without any finite values spans [0, 1], and a single value is padded by 0.5
+    empty = np.isnan(first_edge)
+    first_edge[empty] = 0.
+    last_edge[empty] = 1.
+    single = first_edge == last_edge
+    first_edge[single] -= 0.5
+    last_edge[single] += 0.5
+
+    edges = np.linspace(first_edge, last_edge, nbins + 1, axis=-1)
+
+    return first_edge, last_edge, edges
+
+
+def tap_extents(values, bounds):
+    """Smallest and largest finite value of every tap.
+
+    :param values: Grouped values, NaN wherever an event is not histogrammed
+    :type values: numpy.ndarray
+    :param bounds: The ntaps + 1 slice boundaries of each (non-empty) tap within ``values``
+    :type bounds: numpy.ndarray
+    :return: first, last; the extremes of every tap, NaN for taps without finite values
+    :rtype: numpy.ndarray, numpy.ndarray
+    """
+
+    with np.errstate(invalid='ignore'):
+        first = np.fmin.reduceat(values, bounds[:-1])
+        last = np.fmax.reduceat(values, bounds[:-1])
+
+    return first, last
+
+
+def tap_edges(values, bounds, nbins):
+    """Bin edges spanning the finite values of every tap, as np.histogram2d autodetects them.
+
+    :param values: Grouped values, NaN wherever an event is not histogrammed
+    :type values: numpy.ndarray
+    :param bounds: The ntaps + 1 slice boundaries of each (non-empty) tap within ``values``
+    :type bounds: numpy.ndarray
+    :param nbins: Number of bins
+    :type nbins: int
+    :return: first_edge, last_edge, edges; the outer edges of every tap, and its nbins + 1 bin edges
+    :rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray
+    """
+
+    first, last = tap_extents(values, bounds)
+
+    return edges_from_extents(first, last, nbins)
+
+
+def locate_cells(fb, fp, tapid, keep, xbins, ybins):
+    """Find the (tap, fb bin, fp bin) histogram cell of every event, for all taps in one vectorized pass.
+
+    This is the arithmetic equivalent of running np.digitize on every tap: the
+    cells are those np.histogram2d counts the events in, and events lying on the
+    last fb or fp edge of their tap, which np.digitize places beyond the last
+    bin, are marked as outside.
+
+    :param fb: Normalized central tap amplitude of every event
+    :type fb: numpy.ndarray
+    :param fp: Fine position of every event
+    :type fp: numpy.ndarray
+    :param tapid: The tap (0 to ntaps - 1) of every event
+    :type tapid: numpy.ndarray
+    :param keep: Mask of the events with a finite fb, whose values lie within the edges of their tap
+    :type keep: numpy.ndarray
+    :param xbins: The first_edge, last_edge, edges of the fb bins of every tap, from tap_edges()
+    :type xbins: tuple
+    :param ybins: The first_edge, last_edge, edges of the fp bins of every tap, from tap_edges()
+    :type ybins: tuple
+    :return: cells, inside; the flat index of every event's cell in a (tap, fb bin, fp bin) cube, and a mask of the events that lie inside their cell
+    :rtype: numpy.ndarray, numpy.ndarray
+    """
+
+    xfirst, xlast, xedges = xbins
+    yfirst, ylast, yedges = ybins
+
+    # Events that aren't histogrammed are parked on the first edge, and marked as outside below
+    if not keep.all():
+        fb = np.where(keep, fb, xfirst[tapid])
+        fp = np.where(keep, fp, yfirst[tapid])
+
+    posx, outside = uniform_bin_index(fb, tapid, xfirst, xlast, xedges, return_on_last_edge=True)
+    posy, on_last_edge = uniform_bin_index(fp, tapid, yfirst, ylast, yedges, return_on_last_edge=True)
+
+    cells = tapid * (xedges.shape[1] - 1)
+    cells += posx
+    cells *= yedges.shape[1] - 1
+    cells += posy
+
+    outside |= on_last_edge
+    inside = np.logical_not(outside, out=outside)
+    inside &= keep
+
+    return cells, inside
+
+
+def histogram_cube(cells, keep, ntaps, bins):
+    """Histogram every tap image into a (tap, fb bin, fp bin) count cube with a single bincount.
+
+    As in np.histogram2d, values on the last edge are counted in the last bin.
+
+    :param cells: The histogram cell of every event, from locate_cells()
+    :type cells: numpy.ndarray
+    :param keep: Mask of the events to histogram
+    :type keep: numpy.ndarray
+    :param ntaps: Number of taps
+    :type ntaps: int
+    :param bins: Number of (fb, fp) bins in each tap-specific histogram
+    :type bins: list
+    :return: The (tap, fb bin, fp bin) count cube
+    :rtype: numpy.ndarray
+    """
+
+    cube = np.bincount(cells[keep], minlength=ntaps * bins[0] * bins[1])
+
+    return cube.reshape(ntaps, bins[0], bins[1])
+
+
+def classify(accepted, cells, inside):
+    """Classify every event by direct lookup into the cube of accepted bins.
+
+    Events on the last edge of their tap (or without a finite fb) are rejected.
+
+    :param accepted: The (tap, fb bin, fp bin) cube of accepted bins
+    :type accepted: numpy.ndarray
+    :param cells: The histogram cell of every event, from locate_cells()
+    :type cells: numpy.ndarray
+    :param inside: Mask of the events that lie inside their cell, from locate_cells()
+    :type inside: numpy.ndarray
+    :return: A boolean mask of the events that survive their tap's screen
+    :rtype: numpy.ndarray
+    """
+
+    passed = accepted.ravel().take(cells)
+    passed &= inside
+
+    return passed
+
+
+def group_screened_taps(fb, fp, crs, events, taprange, min_counts=20):
+    """Group the candidate events of one detector axis into the taps that will be screened.
+
+    :param fb: Normalized central tap amplitude of every candidate event on this axis
+    :type fb: numpy.ndarray
+    :param fp: Fine position of every candidate event on this axis
+    :type fp: numpy.ndarray
+    :param crs: Coarse tap position of every candidate event on this axis
+    :type crs: numpy.ndarray
+    :param events: Index of every candidate event within the full event list
+    :type events: numpy.ndarray
+    :param taprange: The taps to screen, in order
+    :type taprange: range
+    :param min_counts: Taps with fewer events than this are skipped, defaults to 20
+    :type min_counts: int, optional
+    :return: A dictionary holding the grouped 'fb', 'fp' and 'events' of the screened taps, the 'taps' themselves, their slice 'bounds' within the grouped arrays, and the (tap number, counts) of every 'skipped' tap
+    :rtype: dict
+    """
+
+    order, bounds = group_by_tap(crs, taprange[0], len(taprange))
+    counts = np.diff(bounds)
+
+    skipped = [(taprange[i] + 1, counts[i]) for i in np.flatnonzero(counts < min_counts)]
+    screened = np.flatnonzero(counts >= min_counts)
+
+    # Only the screened taps are kept, still grouped and in tap order
+    starts = bounds[screened]
+    stops = bounds[screened + 1]
+    take = np.concatenate([order[start:stop] for start, stop in zip(starts, stops)] + [order[:0]])
+
+    return {'fb': fb[take],
+            'fp': fp[take],
+            'events': events[take],
+            'taps': [taprange[i] for i in screened],
+            'bounds': np.concatenate([[0], np.cumsum(stops - starts)]).astype(np.intp),
+            'skipped': skipped}
+
+
+def screen_taps(fb, fp, bounds, bins, softening):
+    """Screen a run of consecutive taps whose events are held in contiguous, grouped arrays.
+
+    :param fb: Grouped normalized central tap amplitudes
+    :type fb: numpy.ndarray
+    :param fp: Grouped fine positions
+    :type fp: numpy.ndarray
+    :param bounds: The ntaps + 1 slice boundaries of each tap within ``fb`` and ``fp``
+    :type bounds: numpy.ndarray
+    :param bins: Number of (fb, fp) bins in each tap-specific histogram
+    :type bins: list
+    :param softening: The Otsu threshold of every tap is lowered by this fraction of itself
+    :type softening: float or None
+    :return: A boolean mask of the events that survive their tap's screen
+    :rtype: numpy.ndarray
+    """
+
+    ntaps = len(bounds) - 1
+    tapid = np.repeat(np.arange(ntaps), np.diff(bounds))
+
+    # Only events with a finite fb are histogrammed
+    keep = np.isfinite(fb)
+    xbins = tap_edges(np.where(keep, fb, np.nan), bounds, bins[0])
+    ybins = tap_edges(np.where(keep, fp, np.nan), bounds, bins[1])
+
+    cells, inside = locate_cells(fb, fp, tapid, keep, xbins, ybins)
+    cube = histogram_cube(cells, keep, ntaps, bins)
+
+    return classify(accepted_bins(cube, softening=softening), cells, inside)
+
+
+def shard_taps(bounds, nshards):
+    """Split a run of taps into at most nshards runs of consecutive taps holding similar numbers of events.
+
+    :param bounds: The ntaps + 1 slice boundaries of each tap
+    :type bounds: numpy.ndarray
+    :param nshards: The largest number of shards to make
+    :type nshards: int
+    :return: The (first tap, last tap + 1) of every shard
+    :rtype: list
+    """
+
+    ntaps = len(bounds) - 1
+    targets = np.linspace(0, bounds[-1], nshards + 1)[1:-1]
+    cuts = np.unique(np.concatenate([[0], np.searchsorted(bounds, targets), [ntaps]]).clip(0, ntaps))
+
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+class TapSurvivors(Mapping):
+    """A read-only mapping of every screened tap to the event indices that survive it.
+
+    The survivors of a tap are only sliced out of the grouped, screened events
+    when they are asked for, so that building the mapping costs nothing.
+
+    :param taps: The key of every screened tap, in order
+    :type taps: list
+    :param events: Grouped index of every screened event within the full event list
+    :type events: numpy.ndarray
+    :param bounds: The ntaps + 1 slice boundaries of each tap within ``events``
+    :type bounds: numpy.ndarray
+    :param passed: Mask of the grouped events that survive their tap's screen
+    :type passed: numpy.ndarray
+    """
+
+    def __init__(self, taps, events, bounds, passed):
+        self.taps = list(taps)
+        self.events = events
+        self.bounds = bounds
+        self.passed = passed
+        self._position = {tap: t for t, tap in enumerate(self.taps)}
+
+    def __getitem__(self, tap):
+        t = self._position[tap]
+        start, stop = self.bounds[t], self.bounds[t + 1]
+        return self.events[start:stop][self.passed[start:stop]]
+
+    def __iter__(self):
+        return iter(self.taps)
+
+    def __len__(self):
+        return len(self.taps)
+
+    def relabel(self, key_format):
+        """The same survivors, keyed by key_format.format(tap) instead (e.g. "U Axis Tap {:02d}")."""
+        return TapSurvivors([key_format.format(tap) for tap in self.taps], self.events, self.bounds, self.passed)
+
+    def all_survivors(self):
+        """The event indices that survive every tap, in tap order (i.e. all taps' survivors concatenated)."""
+        return self.events[self.passed]
+
+
+def screen_axes(axes, bins, softening, workers=1):
+    """Apply the tap-specific boomerang screen to one or more detector axes.
+
+    Axes, and runs of taps within each axis, are independent. With workers > 1
+    they are screened concurrently on a pool of threads that all work on views
+    of the same grouped arrays, and the results are identical to the serial
+    screen.
+
+    :param axes: The keyword arguments of group_screened_taps() for every axis
+    :type axes: list
+    :param bins: Number of (fb, fp) bins in each tap-specific histogram
+    :type bins: list
+    :param softening: The Otsu threshold of every tap is lowered by this fraction of itself
+    :type softening: float or None
+    :param workers: Number of threads to screen with, defaults to 1
+    :type workers: int, optional
+    :return: For every axis, the event indices that survive each screened tap (see TapSurvivors), and a list of (tap number, counts) for every skipped tap
+    :rtype: list
+    """
+
+    groups = [group_screened_taps(**axis) for axis in axes]
+
+    shards = []
+    for group in groups:
+        for first, last in shard_taps(group['bounds'], workers):
+            shards.append((group, first, last))
+
+    def screen_shard(shard):
+        group, first, last = shard
+        start, stop = group['bounds'][first], group['bounds'][last]
+        return screen_taps(group['fb'][start:stop], group['fp'][start:stop],
+                           group['bounds'][first:last + 1] - start, bins=bins, softening=softening)
+
+    if workers > 1 and len(shards) > 1:
+        pool = ThreadPool(min(workers, len(shards)))
+        try:
+            passed = pool.map(screen_shard, shards)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        passed = [screen_shard(shard) for shard in shards]
+
+    # The shard masks are written into one preallocated mask per axis
+    group_passed = {id(group): np.empty(len(group['events']), dtype=bool) for group in groups}
+    for (group, first, last), mask in zip(shards, passed):
+        group_passed[id(group)][group['bounds'][first]:group['bounds'][last]] = mask
+
+    return [(TapSurvivors(group['taps'], group['events'], group['bounds'], group_passed[id(group)]), group['skipped'])
+            for group in groups]
+
+
+def screen_axis(fb, fp, crs, events, taprange, bins, softening, min_counts=20, workers=1):
+    """Apply the tap-specific boomerang screen to one detector axis.
+
+    :param fb: Normalized central tap amplitude of every candidate event on this axis
+    :type fb: numpy.ndarray
+    :param fp: Fine position of every candidate event on this axis
+    :type fp: numpy.ndarray
+    :param crs: Coarse tap position of every candidate event on this axis
+    :type crs: numpy.ndarray
+    :param events: Index of every candidate event within the full event list
+    :type events: numpy.ndarray
+    :param taprange: The taps to screen, in order
+    :type taprange: range
+    :param bins: Number of (fb, fp) bins in each tap-specific histogram
+    :type bins: list
+    :param softening: The Otsu threshold of every tap is lowered by this fraction of itself
+    :type softening: float or None
+    :param min_counts: Taps with fewer events than this are skipped, defaults to 20
+    :type min_counts: int, optional
+    :param workers: Number of threads to screen with, defaults to 1
+    :type workers: int, optional
+    :return: survivors, skipped; the event indices that survive each screened tap (see TapSurvivors), and a list of (tap number, counts) for every skipped tap
+    :rtype: TapSurvivors, list
+    """
+
+    axis = {'fb': fb, 'fp': fp, 'crs': crs, 'events': events, 'taprange': taprange, 'min_counts': min_counts}
+
+    return screen_axes([axis], bins=bins, softening=softening, workers=workers)[0]
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Configure PyTest fixtures for the benchmarks
+
+The benchmarks screen EVT1 files of several sizes, made by tiling the events
+of the HRC-I and HRC-S test files. The sizes can be set (as a comma-separated
+list of numbers of events) with the HYPERSCREEN_BENCHMARK_EVENTS environment
+variable.
+
+Every benchmark records its throughput (events per second, from its fastest
+round) and its peak memory (as traced by tracemalloc, in a separate run), and
+compares them with the baselines stored in baselines.json. Set
+HYPERSCREEN_UPDATE_BASELINES=1 to store the results of a run as the new
+baselines instead. Throughput depends on the machine, so baselines should be
+updated on the machine they're compared on.
+"""
+
+import json
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from astropy.io import fits
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+TEST_FILES = {'HRC-I': os.path.join(TEST_DATA, 'hrcI_evt1_testfile.fits.gz'),
+              'HRC-S': os.path.join(TEST_DATA, 'hrcS_evt1_testfile.fits.gz')}
+
+BENCHMARK_EVENTS = [int(numevents) for numevents in os.environ.get('HYPERSCREEN_BENCHMARK_EVENTS', '100000,1000000').split(',')]
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+UPDATE_BASELINES = os.environ.get('HYPERSCREEN_UPDATE_BASELINES', '0') == '1'
+
+# A benchmark fails if it's this much slower, or needs this much more memory, than its baseline
+THROUGHPUT_TOLERANCE = 0.5
+MEMORY_TOLERANCE = 0.25
+
+
+def tile_evt1(evt1file, numevents, tiled_file):
+    """Write a copy of an EVT1 file with its events repeated (or cut) to numevents events."""
+    with fits.open(evt1file) as hdulist:
+        events = hdulist[1].data
+        rows = np.resize(np.arange(len(events)), numevents)
+        tiled = fits.HDUList([fits.PrimaryHDU(header=hdulist[0].header),
+                              fits.BinTableHDU(data=events[rows], header=hdulist[1].header),
+                              hdulist[2].copy()])
+        tiled.writeto(tiled_file)
+
+
+@pytest.fixture(scope="session", params=[(detector, numevents) for detector in sorted(TEST_FILES) for numevents in BENCHMARK_EVENTS],
+                ids=lambda param: '{}-{}'.format(*param))
+def benchmark_evt1(request, tmp_path_factory):
+    """An EVT1 file for each detector and number of events, with its detector and number of events."""
+    detector, numevents = request.param
+    directory = tmp_path_factory.mktemp('{}_{}'.format(detector, numevents))
+    evt1file = str(directory / 'hrcf{}_evt1.fits'.format(numevents))
+    tile_evt1(TEST_FILES[detector], numevents, evt1file)
+    return evt1file, detector, numevents
+
+
+def peak_memory(function, *args, **kwargs):
+    """The peak memory (in bytes) traced by tracemalloc while running function once."""
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Baselines:
+    """The stored throughput and peak memory of every benchmark, keyed by test name."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        if os.path.exists(filename):
+            with open(filename) as baselines_file:
+                self.entries = json.load(baselines_file)
+
+    def check(self, name, events_per_second, peak):
+        """Compare the results of a benchmark with its baseline (if it has one), or record them as its new baseline."""
+        if UPDATE_BASELINES is True:
+            self.entries[name] = {'events_per_second': round(events_per_second), 'peak_memory': peak}
+            return
+
+        baseline = self.entries.get(name)
+        if baseline is None:
+            return
+        assert events_per_second >= baseline['events_per_second'] * (1 - THROUGHPUT_TOLERANCE), \
+            "{}: {:,.0f} events/s, down from {:,.0f}".format(name, events_per_second, baseline['events_per_second'])
+        assert peak <= baseline['peak_memory'] * (1 + MEMORY_TOLERANCE), \
+            "{}: peak memory of {:,} bytes, up from {:,}".format(name, peak, baseline['peak_memory'])
+
+    def save(self):
+        with open(self.filename, 'w') as baselines_file:
+            json.dump(self.entries, baselines_file, indent=2, sort_keys=True)
+            baselines_file.write('\n')
+
+
+@pytest.fixture(scope="session")
+def baselines():
+    stored = Baselines(BASELINES_FILE)
+    yield stored
+    if UPDATE_BASELINES is True:
+        stored.save()
+
+
+@pytest.fixture
+def measure(benchmark, baselines, request):
+    """Benchmark function(*args, **kwargs) on numevents events, then trace its peak memory, and check both against the baselines."""
+
+    def run(numevents, function, *args, **kwargs):
+        result = benchmark.pedantic(function, args=args, kwargs=kwargs, rounds=3, iterations=1)
+        if benchmark.stats is None:
+            # --benchmark-disable
+            return result
+
+        peak = peak_memory(function, *args, **kwargs)
+        events_per_second = numevents / benchmark.stats['min']
+        benchmark.extra_info.update(events=numevents, events_per_second=round(events_per_second), peak_memory=peak)
+        baselines.check(request.node.name, events_per_second, peak)
+        return result
+
+    return run
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the time it takes to import hyperscreen, run with the other
+benchmarks (see test_pipeline.py). It depends on the machine (and on how warm
+its disk cache is), so it isn't part of the default test run.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+from tests.test_imports import run_python
+
+# Seconds that importing hyperscreen.hypercore may take on top of the dependencies it can't do without
+IMPORT_BUDGET = 0.25
+
+
+def test_import_budget():
+    code = '''
+import json, time
+import numpy, colorama, astropy.io.fits, astropy.table
+start = time.perf_counter()
+import hyperscreen.hypercore
+print(json.dumps(time.perf_counter() - start))
+'''
+    # The best of a few runs, so that a busy machine doesn't fail the test
+    assert min(run_python(code) for _ in range(3)) < IMPORT_BUDGET
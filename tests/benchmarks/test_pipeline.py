@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of the screening pipeline, run with
+
+    pytest tests/benchmarks
+
+(they aren't part of the default test run). See conftest.py for the event
+counts, and for how the baselines are compared and updated.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from hyperscreen import archivescreen
+from hyperscreen import evtscreen
+from hyperscreen import hypercore
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+@pytest.fixture(scope="module")
+def loaded(benchmark_evt1):
+    """The observation of a benchmark EVT1 file, loaded once, and screened once."""
+    evt1file, detector, numevents = benchmark_evt1
+    obs = hypercore.HRCevt1(evt1file)
+    return obs, obs.hyperscreen()
+
+
+def test_load(measure, benchmark_evt1):
+    evt1file, detector, numevents = benchmark_evt1
+    obs = measure(numevents, hypercore.HRCevt1, evt1file)
+    assert obs.numevents == numevents
+
+
+def test_calculate_fp_fb(measure, benchmark_evt1, loaded):
+    obs, _ = loaded
+    fp_u, fb_u, fp_v, fb_v = measure(obs.numevents, obs.calculate_fp_fb)
+    assert len(fb_v) == obs.numevents
+
+
+@pytest.mark.parametrize('softening', [1.0, 0.6, None])
+def test_hyperscreen(measure, benchmark_evt1, loaded, softening):
+    obs, _ = loaded
+    results_dict = measure(obs.numevents, obs.hyperscreen, softening=softening)
+    assert len(results_dict['All Survivals (boolean mask)']) == obs.numevents
+
+
+@pytest.mark.parametrize('return_zones', [True, False])
+def test_legacy_hyperbola_test(measure, benchmark_evt1, loaded, return_zones):
+    obs, _ = loaded
+    hyperzones, hypermasks = measure(obs.numevents, obs.legacy_hyperbola_test, return_zones=return_zones)
+    assert len(hypermasks['mask_u']) == obs.numevents
+
+
+def test_screenHRCevt1(measure, benchmark_evt1, loaded, tmpdir):
+    evt1file, detector, numevents = benchmark_evt1
+    obs, results_dict = loaded
+
+    def screen_link():
+        # screenHRCevt1 moves its input file aside (as a backup), so every round screens a new link to it, in a directory of its own
+        directory = tmpdir.mkdtemp()
+        evt1_link = str(directory.join(os.path.basename(evt1file)))
+        os.link(evt1file, evt1_link)
+        evtscreen.screenHRCevt1(evt1_link, hyperscreen_results_dict=results_dict, savepath=str(directory), verbose=False, obs=obs)
+
+    measure(numevents, screen_link)
+
+
+def test_screenArchive(measure, benchmark_evt1, tmpdir):
+    evt1file, detector, numevents = benchmark_evt1
+    # On a single core, so that all of the work (and its memory) is in this process
+    measure(numevents, archivescreen.screenArchive, [evt1file], savepath=str(tmpdir), singlecore=True, overwrite=True,
+            make_reportCard=True, save_json=True)
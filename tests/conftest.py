@@ -10,6 +10,9 @@ import pytest
 
 from hyperscreen import hypercore
 
+# The benchmarks are slow, and run on their own (pytest tests/benchmarks)
+collect_ignore = ['benchmarks']
+
 
 @pytest.fixture(scope="module")
 def hrcI_evt1():
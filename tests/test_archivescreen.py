@@ -10,6 +10,7 @@ from __future__ import print_function
 
 import sys
 import os
+import shutil
 from contextlib import contextmanager
 
 import astropy
@@ -22,6 +23,8 @@ import matplotlib.pyplot as plt
 import pytest
 
 from hyperscreen import archivescreen
+from hyperscreen import catalog
+from hyperscreen import manifest
 
 '''
 This test module uses pytest Fixtures defined in conftest.py
@@ -46,3 +49,43 @@ def test_getArgs():
     assert parser.savepath == '/hello/'
     assert parser.archivepath == '/hi/there/'
 
+
+
+def test_screenArchive_stream(hrcI_evt1, hrcS_evt1, tmpdir):
+    evt1_files = [hrcI_evt1.filename, hrcS_evt1.filename]
+    catalog_file = str(tmpdir.join(catalog.CATALOG_FILENAME))
+    manifest_file = str(tmpdir.join(manifest.MANIFEST_FILENAME))
+
+    # The HRC-S file is the larger, so it alone is streamed
+    archivescreen.screenArchive(evt1_files, savepath=str(tmpdir), singlecore=True, make_reportCard=False, save_json=True,
+                                catalog_file=catalog_file, manifest_file=manifest_file, softening=0.6, stream_events=hrcS_evt1.numevents)
+
+    with catalog.Catalog(catalog_file) as results_catalog:
+        rows = dict((row['Detector'], row) for row in results_catalog.query())
+    for evt1 in [hrcI_evt1, hrcS_evt1]:
+        expected = evt1.hyperscreen(softening=0.6)
+        for key in ('Number of Good Time Events', 'Percent rejected by Tapscreen', 'Percent improvement'):
+            assert rows[evt1.detector][key] == expected[key]
+
+    # Only the loaded file gets a results file, but both are done
+    assert len(tmpdir.listdir(lambda path: path.basename.endswith('_hyperResults.npz'))) == 1
+    assert manifest.RunManifest(manifest_file).pending(evt1_files, 0.6) == []
+
+
+def test_screenArchive_manifest(hrcI_evt1, tmpdir):
+    corrupt_file = str(tmpdir.join('hrcf00001_evt1.fits.gz'))
+    with open(corrupt_file, 'wb') as f:
+        f.write(b'not an EVT1 file')
+    evt1file = str(tmpdir.join(os.path.basename(hrcI_evt1.filename)))
+    shutil.copy(hrcI_evt1.filename, evt1file)
+    manifest_file = str(tmpdir.join(manifest.MANIFEST_FILENAME))
+
+    archivescreen.screenArchive([corrupt_file, evt1file], savepath=str(tmpdir.mkdir('results')), singlecore=True, make_reportCard=False,
+                                make_fitsfiles=True, save_json=False, manifest_file=manifest_file)
+
+    # A file that can't even be loaded is recorded as failed (and tried again next time)
+    records = manifest.RunManifest(manifest_file).records()
+    assert records[corrupt_file]['status'] == manifest.FAILED and records[corrupt_file]['error'] != ''
+    assert manifest.RunManifest(manifest_file).pending([corrupt_file], 1.0) == [corrupt_file]
+    # ... and one that was moved aside once its FITS files were written, as done
+    assert records[evt1file]['status'] == manifest.DONE and records[evt1file]['obsid'] == str(hrcI_evt1.obsid)
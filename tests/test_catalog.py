@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for the archive results catalog
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+from hyperscreen import catalog
+from hyperscreen import results
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def test_catalog(hrcI_evt1, hrcS_evt1, tmpdir):
+    results_dir = str(tmpdir.join('results'))
+    os.makedirs(results_dir)
+
+    with catalog.Catalog(str(tmpdir.join(catalog.CATALOG_FILENAME))) as results_catalog:
+        hrcI_results = hrcI_evt1.hyperscreen()
+        results_catalog.record(results.summarize(hrcI_results, softening=1.0, screen_time=0.5), evt1file=hrcI_evt1.filename)
+        assert len(results_catalog) == 1
+
+        # Results files are ingested once, and again only if they change
+        hrcI_file = os.path.join(results_dir, 'hrcI' + results.RESULTS_SUFFIX)
+        hrcS_file = os.path.join(results_dir, 'hrcS' + results.RESULTS_SUFFIX)
+        results.save_results(hrcI_results, hrcI_file, softening=1.0, screen_time=0.5)
+        results.save_results(hrcS_evt1.hyperscreen(), hrcS_file, softening=1.0)
+        assert results_catalog.ingest(results_dir) == 2
+        assert results_catalog.ingest(results_dir) == 0
+        assert len(results_catalog) == 2
+
+        results.save_results(hrcS_evt1.hyperscreen(softening=0.5), hrcS_file, softening=0.5)
+        os.utime(hrcS_file, (0, 0))
+        assert results_catalog.ingest(results_dir) == 1
+        assert len(results_catalog) == 3
+
+        rows = results_catalog.query("detector = ?", ("HRC-I",))
+        assert len(rows) == 1
+        assert rows[0]["Percent improvement"] == hrcI_results["Percent improvement"]
+        assert rows[0]["screen_time"] == 0.5
+        evt1file = results_catalog.connection.execute("SELECT evt1file FROM observations WHERE detector = 'HRC-I'").fetchone()[0]
+        assert evt1file == hrcI_evt1.filename
+
+        trends_dict = results_catalog.trends()
+        assert len(trends_dict['Improvement']) == 3
+        assert round(hrcI_evt1.exptime / 1000, 2) in trends_dict['Exposure Times']
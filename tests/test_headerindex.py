@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for the header index
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+
+from hyperscreen import archivescreen
+from hyperscreen import headerindex
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def test_header_index(hrcI_evt1, hrcS_evt1, tmpdir):
+    archivepath = str(tmpdir.join('archive')) + '/'
+    os.makedirs(archivepath)
+    evt1_files = []
+    for name, evt1 in [('hrcf02886N001_evt1.fits.gz', hrcI_evt1),
+                       ('hrcf02886N002_evt1.fits.gz', hrcI_evt1),
+                       ('hrcf05095N001_evt1.fits.gz', hrcS_evt1)]:
+        shutil.copy(evt1.filename, archivepath + name)
+        evt1_files.append(archivepath + name)
+
+    index_file = str(tmpdir.join('index.json'))
+    index = headerindex.HeaderIndex(index_file, workers=2)
+    assert index.update(evt1_files) == 3
+    assert os.path.exists(index_file)
+
+    entries = headerindex.HeaderIndex(index_file).lookup(evt1_files)
+    assert [entry['DETNAM'] for entry in entries] == ['HRC-I', 'HRC-I', 'HRC-S']
+    assert entries[2]['NAXIS2'] == hrcS_evt1.numevents
+    assert entries[2]['size'] == os.path.getsize(evt1_files[2])
+
+    # Only new or changed files are read again
+    index = headerindex.HeaderIndex(index_file)
+    assert index.update(evt1_files) == 0
+    os.utime(evt1_files[0], (0, 0))
+    assert index.update(evt1_files) == 1
+
+    assert index.duplicates(evt1_files) == {str(hrcI_evt1.obsid): evt1_files[:2]}
+
+    _, hrcI_files, hrcS_files = archivescreen.inventoryArchive(archivepath, sort=True, header_index=index_file, dedupe=True)
+    assert hrcI_files == [evt1_files[1]]
+    assert hrcS_files == [evt1_files[2]]
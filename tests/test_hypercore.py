@@ -15,6 +15,7 @@ from contextlib import contextmanager
 import astropy
 from astropy.io import fits
 
+import numpy as np
 import pandas as pd
 
 import matplotlib.pyplot as plt
@@ -79,3 +80,103 @@ def test_hyperscreen_sparsetap(hrcS_evt1_sparsetap):
 #         masked_y = hrcI_evt1.data['dety'][hrcI_evt1.data['Hyperbola test passed']]
 #         hrcI_evt1.image(masked_x=masked_x, masked_y=masked_y, show=False)
 #         hrcS_evt1.image(show=False)
+
+
+def test_lazy_columns(hrcI_evt1):
+    lazy_evt1 = hypercore.HRCevt1(hrcI_evt1.filename, lazy=True)
+
+    assert 'detx' not in lazy_evt1.data.columns
+    assert 'detx' in lazy_evt1.data and 'detx' in lazy_evt1.data.deferred_columns
+    assert (lazy_evt1.data.detx.values == hrcI_evt1.data['detx'].values).all()
+    assert 'detx' in lazy_evt1.data.columns
+
+    lazy_results = lazy_evt1.hyperscreen()
+    results = hrcI_evt1.hyperscreen()
+    assert (lazy_results['All Survivals (boolean mask)'] == results['All Survivals (boolean mask)']).all()
+
+
+def test_lazy_derived_columns(hrcS_evt1):
+    obs = hypercore.HRCevt1(hrcS_evt1.filename)
+    derived = ['fp_u', 'fb_u', 'fp_v', 'fb_v', 'Hyperbola test passed', 'Hyperbola test failed']
+
+    assert not any(name in obs.data.columns for name in derived)
+    assert obs.hyperbola_passes + obs.hyperbola_failures == obs.numevents
+
+    fp_u = obs.data['fp_u']
+    assert 'fb_u' in obs.data.columns
+    assert 'fp_v' not in obs.data.columns
+    # Deferred columns are attributes, as the columns of a DataFrame are
+    assert obs.data.fp_v.equals(obs.data['fp_v'])
+    assert obs.data['fp_u'].equals(fp_u)
+
+    expected = obs.calculate_fp_fb()
+    for name, values in zip(['fp_u', 'fb_u', 'fp_v', 'fb_v'], expected):
+        assert np.array_equal(obs.data[name].values, values, equal_nan=True)
+    assert (obs.data['Hyperbola test failed'] == ~obs.data['Hyperbola test passed']).all()
+
+
+def test_density_image():
+    rng = np.random.RandomState(4)
+    x = rng.uniform(-0.2, 1.2, size=5000)
+    y = rng.uniform(-1.2, 1.2, size=5000)
+    values = rng.uniform(0, 100, size=5000)
+    x[:10] = np.nan
+    extent = hypercore.BOOMERANG_EXTENT
+
+    img = hypercore.density_image(x, y, values, (60, 40), extent)
+    xedges = np.linspace(extent[0], extent[1], 61)
+    yedges = np.linspace(extent[2], extent[3], 41)
+    inside = np.isfinite(x) & (x < extent[1]) & (y < extent[3])
+    counts, _, _ = np.histogram2d(y[inside], x[inside], bins=[yedges, xedges])
+    sums, _, _ = np.histogram2d(y[inside], x[inside], bins=[yedges, xedges], weights=values[inside])
+
+    assert np.array_equal(np.isnan(img), counts == 0)
+    assert np.allclose(img[counts > 0], sums[counts > 0] / counts[counts > 0])
+    assert np.allclose(np.nansum(hypercore.density_image(x, y, values, (60, 40), extent, statistic='sum')), sums.sum())
+
+
+def test_density_boomerang(hrcI_evt1, tmpdir):
+    savepath = str(tmpdir.join('boomerang.png'))
+    survivors = hrcI_evt1.hyperscreen()['All Survivals (boolean mask)']
+    hrcI_evt1.boomerang(mask=survivors, density=True, show=False, plot_legacy_zone=False, savepath=savepath)
+    assert os.path.getsize(savepath) > 0
+
+
+def test_legacy_zone_curves(hrcS_evt1):
+    zone_lowerbound, zone_upperbound = hypercore.legacy_zone_curves('HRC-S', tolerance=0.035)
+    assert hypercore.legacy_zone_curves('HRC-S', tolerance=0.035)[0] is zone_lowerbound
+
+    # The sampled bounds follow the per-event hyperbolae of the legacy test
+    hyperzones, _ = hrcS_evt1.legacy_hyperbola_test(tolerance=0.035)
+    fb_u = np.asarray(hrcS_evt1.data['fb_u'])
+    for (fb, fp), zone in [(zone_lowerbound, hyperzones['zone_u_lowerbound']), (zone_upperbound, hyperzones['zone_u_upperbound'])]:
+        assert np.all(np.isfinite(fp)) and fp[len(fp) // 2] == 0
+        assert np.array_equal(fp, -fp[::-1])
+        half = len(fb) // 2
+        defined = np.isfinite(zone) & (fb_u >= 0) & (fb_u < fb[half - 50])
+        assert np.allclose(np.interp(fb_u[defined], fb[:half], fp[:half]), zone[defined], atol=1e-4)
+
+
+def test_legacy_hyperbola_test(hrcI_evt1, hrcS_evt1):
+    for evt1 in [hrcI_evt1, hrcS_evt1]:
+        hyperzones, hypermasks = evt1.legacy_hyperbola_test(tolerance=0.035)
+
+        # The masks are those of the per-event zone comparisons
+        for axis in ['u', 'v']:
+            fp = np.asarray(evt1.data['fp_' + axis])
+            lowerbound = hyperzones['zone_{}_lowerbound'.format(axis)]
+            upperbound = hyperzones['zone_{}_upperbound'.format(axis)]
+            with np.errstate(invalid='ignore'):
+                expected = ~((fp < upperbound) & (fp > -upperbound)) & (fp < lowerbound) & (fp > -lowerbound)
+            assert np.array_equal(hypermasks['mask_' + axis], expected)
+
+        # Without the zones, and in chunks
+        a, b, h = hypercore.LEGACY_HYPERBOLA_COEFFICIENTS[evt1.detector]['u']
+        assert np.array_equal(hypercore.hyperbola_zone_mask(evt1.data['fb_u'], evt1.data['fp_u'], a, b, h, 0.035, chunk_size=1000), hypermasks['mask_u'])
+        no_zones, masks = evt1.legacy_hyperbola_test(tolerance=0.035, return_zones=False)
+        assert no_zones is None
+        assert np.array_equal(masks['mask_v'], hypermasks['mask_v'])
+
+        # Reduced precision only changes events within rounding of a bound
+        _, masks = evt1.legacy_hyperbola_test(tolerance=0.035, return_zones=False, dtype=np.float32)
+        assert np.count_nonzero(masks['mask_u'] != hypermasks['mask_u']) <= 1e-3 * evt1.numevents
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for the modules that importing hyperscreen loads
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import subprocess
+import sys
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that screening never needs
+HEAVY_MODULES = ['matplotlib', 'skimage', 'tqdm']
+
+
+def run_python(code):
+    """Run code in a fresh interpreter (so that nothing is imported yet), and return what it prints, as JSON."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPOSITORY, os.environ.get('PYTHONPATH', '')]))
+    output = subprocess.check_output([sys.executable, '-c', code], env=env, cwd=REPOSITORY)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def test_headless_screening(hrcI_evt1):
+    code = '''
+import json, sys
+from hyperscreen import archivescreen, hypercore, reportcard
+obs = hypercore.HRCevt1({!r})
+inputs = reportcard.plot_inputs(obs, obs.hyperscreen())
+print(json.dumps(sorted(name for name in {!r} if name in sys.modules)))
+'''.format(hrcI_evt1.filename, HEAVY_MODULES)
+    assert run_python(code) == []
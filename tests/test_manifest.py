@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for the archivescreen run manifest
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+
+from hyperscreen import manifest
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def test_run_manifest(hrcI_evt1, hrcS_evt1, tmpdir):
+    evt1_files = []
+    for evt1 in [hrcI_evt1, hrcS_evt1]:
+        evt1file = str(tmpdir.join(os.path.basename(evt1.filename)))
+        shutil.copy(evt1.filename, evt1file)
+        evt1_files.append(evt1file)
+
+    run_manifest = manifest.RunManifest(str(tmpdir.join(manifest.MANIFEST_FILENAME)))
+    assert run_manifest.pending(evt1_files, 1.0) == evt1_files
+
+    run_manifest.mark(evt1_files[0], manifest.STARTED, 1.0)
+    run_manifest.mark(evt1_files[1], manifest.STARTED, 1.0)
+    run_manifest.mark(evt1_files[1], manifest.DONE, 1.0, obsid='1234')
+    assert run_manifest.pending(evt1_files, 1.0) == evt1_files[:1]
+    assert run_manifest.pending(evt1_files, 0.5) == evt1_files
+
+    # A run killed mid-write leaves a partial last line behind
+    with open(run_manifest.filename, 'a') as manifest_file:
+        manifest_file.write('{"path": ')
+    assert run_manifest.records()[os.path.abspath(evt1_files[1])]['obsid'] == '1234'
+
+    # A touched file needs screening again, unless its content hash shows it's unchanged
+    os.utime(evt1_files[1], (0, 0))
+    assert run_manifest.pending(evt1_files, 1.0) == evt1_files
+
+    hashed_manifest = manifest.RunManifest(str(tmpdir.join('hashed.jsonl')), use_hash=True)
+    hashed_manifest.mark(evt1_files[0], manifest.DONE, 1.0)
+    os.utime(evt1_files[0], (1, 1))
+    assert hashed_manifest.pending(evt1_files, 1.0) == evt1_files[1:]
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for report card rendering
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+
+from hyperscreen import hypercore
+from hyperscreen import reportcard
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def test_report_card(hrcI_evt1, hrcS_evt1, tmpdir):
+    inputs_files = []
+    for name, evt1 in [('hrcI', hrcI_evt1), ('hrcS', hrcS_evt1)]:
+        results_dict = evt1.hyperscreen()
+        inputs = reportcard.plot_inputs(evt1, results_dict)
+        inputs_file = str(tmpdir.join(name + reportcard.PLOT_INPUTS_SUFFIX))
+        reportcard.save_plot_inputs(inputs, inputs_file)
+        inputs_files.append(inputs_file)
+
+        loaded = reportcard.load_plot_inputs(inputs_file)
+        assert loaded['summary'] == inputs['summary']
+        assert loaded['summary']['Percent improvement'] == results_dict['Percent improvement']
+        assert loaded['boomerang_hyperscreen'].shape == hypercore.BOOMERANG_DENSITY_BINS[::-1]
+        # Every good time event, and every survivor, is counted once in the detector images
+        assert loaded['detector_all'].sum() == evt1.goodtimeevents
+        assert loaded['detector_hyperscreen'].sum() == len(results_dict['All Survivals (event indices)'])
+
+    assert reportcard.render_report_cards(inputs_files, processes=1) == [
+        inputs_file.replace(reportcard.PLOT_INPUTS_SUFFIX, reportcard.REPORT_CARD_SUFFIX) for inputs_file in inputs_files]
+    for inputs_file in inputs_files:
+        assert os.path.getsize(inputs_file.replace(reportcard.PLOT_INPUTS_SUFFIX, reportcard.REPORT_CARD_SUFFIX)) > 0
+
+    # A bad file is reported, not raised
+    assert reportcard.render_report_cards([str(tmpdir.join('missing' + reportcard.PLOT_INPUTS_SUFFIX))], processes=1) == []
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for the compact HyperScreen results format
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+
+from hyperscreen import analyze_archivescreen
+from hyperscreen import results
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def test_results_roundtrip(hrcS_evt1, tmpdir):
+    results_dict = hrcS_evt1.hyperscreen()
+    results_file = str(tmpdir.join('hrcS' + results.RESULTS_SUFFIX))
+
+    results.save_results(results_dict, results_file, softening=1.0)
+    assert os.path.exists(results_file)
+    # One bit per event, plus a little overhead
+    assert os.path.getsize(results_file) < hrcS_evt1.numevents / 8 + 4096
+
+    summary = results.load_summary(results_file)
+    assert summary['softening'] == 1.0
+    for key in results.SUMMARY_KEYS:
+        assert summary[key] == results_dict[key]
+
+    loaded = results.load_results(results_file)
+    for key in ["All Survivals (event indices)", "All Survivals (boolean mask)", "All Failures (boolean mask)"]:
+        assert loaded[key].dtype == results_dict[key].dtype
+        assert np.array_equal(loaded[key], results_dict[key])
+
+    trends_dict = analyze_archivescreen.parseJSONs(analyze_archivescreen.inventoryJSONs(str(tmpdir) + '/'))
+    assert trends_dict['Improvement'] == [results_dict['Percent improvement']]
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for archivescreen task scheduling
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+from hyperscreen import scheduler
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def test_largest_first(hrcI_evt1, hrcS_evt1):
+    evt1_files = [hrcI_evt1.filename, hrcS_evt1.filename]
+    sizes = scheduler.task_sizes(evt1_files)
+    assert sizes == [hrcI_evt1.numevents, hrcS_evt1.numevents]
+
+    ordered = scheduler.largest_first(evt1_files, sizes)
+    assert ordered == sorted(evt1_files, key=lambda evt1file: -sizes[evt1_files.index(evt1file)])
+    assert scheduler.largest_first(['a', 'b', 'c', 'd'], [1, 3, 1, 2]) == ['b', 'd', 'a', 'c']
+
+
+def test_run_pool():
+    tasks = [-3, 2, -1, 0]
+    results = scheduler.run_pool(abs, tasks, processes=2, maxtasksperchild=1)
+    assert sorted(results) == [0, 1, 2, 3]
+
+
+def test_memory_budget():
+    assert scheduler.parse_memory('2G') == 2 * 1024**3
+    assert scheduler.parse_memory('512 MB') == 512 * 1024**2
+    assert scheduler.parse_memory(1000) == 1000
+
+    small = scheduler.estimate_footprint(50000)
+    large = scheduler.estimate_footprint(5000000)
+    assert small < scheduler.estimate_footprint(scheduler.LARGE_OBSERVATION) < large
+
+    # The budget allows only one large task at a time, and the small tasks around it
+    tasks = [-4, -3, 2, 1]
+    footprints = [large, large, small, small]
+    results = scheduler.run_budgeted(abs, tasks, footprints, large + 2 * small, processes=3)
+    assert sorted(results) == [1, 2, 3, 4]
+
+    # A task larger than the whole budget still runs, on its own
+    assert scheduler.run_budgeted(abs, [-5, 1], [large, small], small, processes=2) in ([5, 1], [1, 5])
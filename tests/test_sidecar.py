@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for the sidecar cache
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+from hyperscreen import hypercore
+from hyperscreen import scheduler
+from hyperscreen import sidecar
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def test_sidecar_cache(hrcI_evt1, tmpdir):
+    cache = sidecar.SidecarCache(str(tmpdir.join('cache')))
+    assert cache.load(hrcI_evt1.filename) is None
+
+    hypercore.HRCevt1(hrcI_evt1.filename, cache=cache)
+    cached = cache.load(hrcI_evt1.filename)
+    assert cached is not None
+    assert 'status' in cached.event_columns and 'fb_u' in cached.derived_columns
+
+    cached_evt1 = hypercore.HRCevt1(hrcI_evt1.filename, cache=cache.directory)
+    assert cached_evt1.hdulist is None
+    assert cached_evt1.obsid == hrcI_evt1.obsid
+    assert np.array_equal(cached_evt1.gtimask, hrcI_evt1.gtimask)
+    for name in ['detx', 'fp_u', 'fb_v', 'Hyperbola test passed']:
+        assert np.array_equal(cached_evt1.data[name].values, hrcI_evt1.data[name].values, equal_nan=True)
+
+    results = hrcI_evt1.hyperscreen()
+    cached_results = cached_evt1.hyperscreen()
+    assert (cached_results['All Survivals (boolean mask)'] == results['All Survivals (boolean mask)']).all()
+
+
+def test_sidecar_cache_key(hrcI_evt1, tmpdir):
+    cache = sidecar.SidecarCache(str(tmpdir.join('cache')))
+    evt1file = str(tmpdir.join('evt1.fits.gz'))
+    shutil.copy(hrcI_evt1.filename, evt1file)
+
+    key = cache.key(evt1file)
+    assert cache.key(hrcI_evt1.filename) == key  # the key follows the content, not the path
+
+    with open(evt1file, 'ab') as f:
+        f.write(b'\0')
+    assert cache.key(evt1file) != key
+
+
+def test_sidecar_cache_key_concurrent(hrcI_evt1, tmpdir, monkeypatch):
+    cache = sidecar.SidecarCache(str(tmpdir.join('cache')))
+    evt1_files = []
+    for i in range(4):
+        evt1file = str(tmpdir.join('evt1_{}.fits.gz'.format(i)))
+        shutil.copy(hrcI_evt1.filename, evt1file)
+        evt1_files.append(evt1file)
+
+    # Workers hashing different files at once all keep their hashes
+    keys = scheduler.run_pool(cache.key, evt1_files, processes=4)
+    assert len(set(keys)) == 1
+
+    # A hash file cut short is hashed again
+    hash_files = dict((json.loads(hash_file.read())[0], hash_file) for hash_file in tmpdir.join('cache', sidecar.HASH_DIRECTORY).listdir())
+    assert sorted(hash_files) == evt1_files
+    hash_files[evt1_files[0]].write('[')
+    assert cache.key(evt1_files[0]) == keys[0]
+
+    def rehash(filename, blocksize=None):
+        raise AssertionError("{} was hashed again".format(filename))
+    monkeypatch.setattr(sidecar, 'content_hash', rehash)
+    assert [cache.key(evt1file) for evt1file in evt1_files] == keys
+
+
+def test_sidecar_cache_eviction(hrcI_evt1, hrcS_evt1, tmpdir):
+    cache = sidecar.SidecarCache(str(tmpdir.join('cache')))
+
+    hypercore.HRCevt1(hrcI_evt1.filename, cache=cache)
+    hrcI_entry = cache.entry(hrcI_evt1.filename)
+    os.utime(os.path.join(hrcI_entry, 'columns.json'), (0, 0))  # make it the least recently used
+    hypercore.HRCevt1(hrcS_evt1.filename, cache=cache)
+    assert len(cache.entries()) == 2
+
+    cache.max_bytes = cache.size() - 1
+    assert cache.evict() == [hrcI_entry]
+    assert cache.load(hrcI_evt1.filename) is None
+    assert cache.load(hrcS_evt1.filename) is not None
+
+    # An entry bigger than the whole cache is kept when it's stored, and evicted by the next one
+    cache.max_bytes = 1000
+    hypercore.HRCevt1(hrcI_evt1.filename, cache=cache)
+    assert [directory for directory, _ in cache.entries()] == [hrcI_entry]
+    assert cache.load(hrcI_evt1.filename) is not None
+
+    # An entry removed while it's being read, e.g. by another process's eviction, is a cache miss
+    os.remove(os.path.join(hrcI_entry, 'header.txt'))
+    assert cache.load(hrcI_evt1.filename) is None
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for the packed status bits
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+from astropy.io import fits
+
+import pytest
+
+from hyperscreen import hypercore
+from hyperscreen import statusbits
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def test_pack_status(hrcS_evt1):
+    with fits.open(hrcS_evt1.filename) as hdulist:
+        expanded = hdulist[1].data['status']
+        packed = statusbits.StatusBits.from_table(hdulist[1].data)
+
+    assert packed.bits.dtype == np.uint32
+    assert np.array_equal(packed.bits, statusbits.pack_status(expanded))
+    for bit in range(32):
+        assert np.array_equal(packed[bit], expanded[:, bit])
+
+
+def test_status_queries():
+    status = statusbits.StatusBits(statusbits.pack_status(np.array([[0, 0, 0, 0],
+                                                                    [0, 0, 0, 1],
+                                                                    [0, 0, 0, 2],
+                                                                    [0, 0, 0, 3],
+                                                                    [0x80, 0, 0, 0]], dtype=np.uint8)))
+    flags = statusbits.HYPERBOLA_FLAGS
+
+    assert status['U hyperbolic test failed'].tolist() == [False, True, False, True, False]
+    assert status[0].tolist() == [False, False, False, False, True]
+    assert status.any_of(flags).tolist() == [False, True, True, True, False]
+    assert status.all_of(flags).tolist() == [False, False, False, True, False]
+    assert status.none_of(flags).tolist() == [True, False, False, False, True]
+    assert status.count(flags) == 3
+
+    with pytest.raises(KeyError):
+        status['Not a status flag']
+    with pytest.raises(ValueError):
+        status[32]
+
+
+def test_legacy_status_columns(hrcI_evt1):
+    table_evt1 = hypercore.HRCevt1(hrcI_evt1.filename, as_astropy_table=True)
+
+    assert 'Shield PMT active' not in hrcI_evt1.data.columns
+    for name in list(statusbits.STATUS_FLAGS) + ['Hyperbola test passed', 'Hyperbola test failed']:
+        assert name in hrcI_evt1.data
+        assert np.array_equal(hrcI_evt1.data[name].values, np.asarray(table_evt1.data[name]))
+
+    for bit in range(32):
+        assert np.array_equal(table_evt1.status[bit], table_evt1.data['status'][:, bit])
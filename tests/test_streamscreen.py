@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for the bounded-memory streaming screen.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+
+import numpy as np
+
+from astropy.io import fits
+
+from hyperscreen import evtscreen
+from hyperscreen import hypercore
+from hyperscreen import streamscreen
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def test_stream_hyperscreen(hrcS_evt1, tmpdir):
+    survivors_file = str(tmpdir.join('survivors.fits.gz'))
+    rejected_file = str(tmpdir.join('rejected.fits'))
+
+    # Chunks much smaller than the file, and not a divisor of its length
+    scratch_dir = tmpdir.mkdir('scratch')
+    results = streamscreen.stream_hyperscreen(hrcS_evt1.filename, survivors_file, rejected_file=rejected_file,
+                                              softening=0.6, chunk_rows=6000, scratch_dir=str(scratch_dir))
+    # The gzipped file was decompressed once, to a temporary file that's gone again
+    assert scratch_dir.listdir() == []
+    expected = hrcS_evt1.hyperscreen(softening=0.6)
+    survival_mask = expected['All Survivals (boolean mask)']
+
+    for key in ('Number of Good Time Events', 'Percent rejected by Tapscreen', 'Percent rejected by Hyperbola', 'Percent improvement'):
+        assert results[key] == expected[key]
+
+    with fits.open(hrcS_evt1.filename) as original, fits.open(survivors_file) as survivors, fits.open(rejected_file) as rejected:
+        assert np.array_equal(survivors[1].data['time'], original[1].data['time'][survival_mask])
+        assert np.array_equal(rejected[1].data['status'], original[1].data['status'][~survival_mask])
+        assert survivors[1].header['HYPRSCRN'] == '0.6'
+        assert np.array_equal(survivors['GTI'].data, original['GTI'].data)
+
+    # Only screened, decompressing the file on every read
+    assert streamscreen.stream_hyperscreen(hrcS_evt1.filename, None, softening=0.6, chunk_rows=6000, decompress=False) == results
+
+
+def test_screenHRCevt1_stream(hrcI_evt1, tmpdir):
+    # screenHRCevt1 moves its input aside, so it screens a copy
+    evt1file = str(tmpdir.join(os.path.basename(hrcI_evt1.filename)))
+    shutil.copy(hrcI_evt1.filename, evt1file)
+
+    results = evtscreen.screenHRCevt1(evt1file, savepath=str(tmpdir), verbose=False, stream=True)
+    survival_mask = hrcI_evt1.hyperscreen()['All Survivals (boolean mask)']
+    assert results['ObsID'] == hrcI_evt1.obsid
+
+    with fits.open(hrcI_evt1.filename) as original, fits.open(str(tmpdir.join('hyperscreen_' + os.path.basename(evt1file)))) as survivors:
+        assert np.array_equal(survivors[1].data['time'], original[1].data['time'][survival_mask])
+    # Only the products (and no temporary file) are left in the products directory
+    assert tmpdir.join('{}_hyperscreen_report'.format(hrcI_evt1.obsid)).listdir() == [
+        tmpdir.join('{}_hyperscreen_report'.format(hrcI_evt1.obsid), '{}_hyperscreen_rejected_events.fits'.format(hrcI_evt1.obsid))]
+
+
+def test_screenHRCevt1_obsid(hrcI_evt1, tmpdir):
+    # The products are named after the OBS_ID of the primary header, whether or not the observation is loaded
+    for name, loaded in [('loaded', True), ('unloaded', False)]:
+        evt1file = str(tmpdir.mkdir(name).join(os.path.basename(hrcI_evt1.filename)))
+        with fits.open(hrcI_evt1.filename) as original:
+            original[0].header['OBS_ID'] = 'primary'
+            original.writeto(evt1file)
+
+        obs = hypercore.HRCevt1(evt1file) if loaded is True else None
+        evtscreen.screenHRCevt1(evt1file, savepath=str(tmpdir.join(name)), verbose=False, obs=obs)
+        assert tmpdir.join(name, 'primary_hyperscreen_report', 'primary_hyperscreen_rejected_events.fits').check()
+
+
+def test_write_products(hrcI_evt1, tmpdir):
+    survival_mask = hrcI_evt1.hyperscreen()['All Survivals (boolean mask)']
+
+    # From the events already in memory, and streamed from the file
+    for source, name in [(hrcI_evt1.hdulist, 'loaded'), (hrcI_evt1.filename, 'streamed')]:
+        survivors_file = str(tmpdir.join('{}_survivors.fits.gz'.format(name)))
+        rejected_file = str(tmpdir.join('{}_rejected.fits'.format(name)))
+        num_survivals = streamscreen.write_products(source, survival_mask, survivors_file, rejected_file=rejected_file, chunk_rows=7000)
+        assert num_survivals == np.count_nonzero(survival_mask)
+
+        with fits.open(hrcI_evt1.filename) as original, fits.open(survivors_file) as survivors, fits.open(rejected_file) as rejected:
+            assert survivors[0].header['OBS_ID'] == original[0].header['OBS_ID']
+            assert np.array_equal(survivors[1].data, original[1].data[survival_mask])
+            assert np.array_equal(rejected[1].data, original[1].data[~survival_mask])
+            assert survivors[1].header['NAXIS2'] == num_survivals
+            assert np.array_equal(rejected['GTI'].data, original['GTI'].data)
+
+    # Each product can have its own headers
+    primary_header = hrcI_evt1.hdulist[0].header.copy()
+    primary_header['HYPRSCRN'] = 'APPLIED'
+    events_header = hrcI_evt1.header.copy()
+    events_header['HYPRSOFT'] = '1.0'
+    survivors_file = str(tmpdir.join('headers_survivors.fits'))
+    rejected_file = str(tmpdir.join('headers_rejected.fits'))
+    streamscreen.write_products(hrcI_evt1.filename, survival_mask, survivors_file, rejected_file=rejected_file,
+                                headers={'rejected': (primary_header, events_header)})
+    with fits.open(survivors_file) as survivors, fits.open(rejected_file) as rejected:
+        assert 'HYPRSCRN' not in survivors[0].header and 'HYPRSOFT' not in survivors[1].header
+        assert rejected[0].header['HYPRSCRN'] == 'APPLIED' and rejected[1].header['HYPRSOFT'] == '1.0'
+        assert rejected[1].header['NAXIS2'] == np.count_nonzero(~survival_mask)
+
+    # The events of an uncompressed EVT1 file are still in memory once it's loaded (and closed)
+    uncompressed_file = str(tmpdir.join('uncompressed_evt1.fits'))
+    with fits.open(hrcI_evt1.filename) as original:
+        original.writeto(uncompressed_file)
+    uncompressed = hypercore.HRCevt1(uncompressed_file)
+    assert len(streamscreen.raw_rows(uncompressed.hdulist[1])) == uncompressed.numevents
+
+
+def test_write_annotated(hrcS_evt1, tmpdir):
+    survival_mask = hrcS_evt1.hyperscreen(softening=0.6)['All Survivals (boolean mask)']
+
+    for source, name in [(hrcS_evt1.hdulist, 'loaded'), (hrcS_evt1.filename, 'streamed')]:
+        annotated_file = str(tmpdir.join('{}_annotated.fits.gz'.format(name)))
+        streamscreen.write_annotated(source, survival_mask, annotated_file, softening=0.6, chunk_rows=7000)
+
+        with fits.open(hrcS_evt1.filename) as original, fits.open(annotated_file) as annotated:
+            events = annotated[1]
+            assert np.array_equal(events.data[streamscreen.FLAG_COLUMN], survival_mask)
+            assert np.array_equal(events.data['time'], original[1].data['time'])
+            assert np.array_equal(events.data['status'], original[1].data['status'])
+            assert events.header['HYPRSCRN'] == '0.6'
+            assert events.header['HYPRNSRV'] == np.count_nonzero(survival_mask)
+            assert np.array_equal(annotated['GTI'].data, original['GTI'].data)
+
+    # The survivors can be selected lazily, whenever the annotated file is read
+    obs = hypercore.HRCevt1(annotated_file)
+    assert np.array_equal(obs.data['time'][obs.data[streamscreen.FLAG_COLUMN]], hrcS_evt1.data['time'][survival_mask])
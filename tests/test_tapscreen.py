@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+pytest unit tests for the tap-by-tap screening engine.
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+import skimage.filters as filters
+
+import pytest
+
+from hyperscreen import tapscreen
+
+'''
+This test module uses pytest Fixtures defined in conftest.py
+'''
+
+
+def reference_axis_survivors(obs, axis, softening):
+    """A deliberately naive, mask-per-tap screen of one axis, used as ground truth."""
+
+    passed = np.asarray(obs.data['Hyperbola test passed'], dtype=bool)
+    crs = np.asarray(obs.data['crs' + axis])
+    fb = np.asarray(obs.data['fb_' + axis])
+    fp = np.asarray(obs.data['fp_' + axis])
+    bins = [50, 50] if obs.numevents < 100000 else [200, 200]
+
+    survivors = {}
+    for tap in range(crs[passed].min() - 1, crs[passed].max() + 1):
+        tapmask = np.flatnonzero(passed & (crs == tap))
+        if len(tapmask) < 20:
+            continue
+        keep = np.isfinite(fb[tapmask])
+        hist, xbounds, ybounds = np.histogram2d(fb[tapmask][keep], fp[tapmask][keep], bins=bins)
+
+        otsu = filters.threshold_otsu(hist)
+        thresh = otsu if softening is None else otsu - (otsu * softening)
+        accepted = (hist > 0) & (hist >= thresh)
+        accepted[:int(bins[1] / 2), :] = False
+
+        posx = np.digitize(fb[tapmask], xbounds)
+        posy = np.digitize(fp[tapmask], ybounds)
+        inside = (posx > 0) & (posx <= bins[0]) & (posy > 0) & (posy <= bins[1])
+        survivors[tap] = tapmask[inside][accepted[posx[inside] - 1, posy[inside] - 1]]
+
+    return survivors
+
+
+def test_group_by_tap():
+    crs = np.array([3, 1, 3, 2, 1, 3], dtype=np.int16)
+    order, bounds = tapscreen.group_by_tap(crs, first_tap=0, ntaps=5)
+
+    assert bounds.tolist() == [0, 0, 2, 3, 6, 6]
+    # Events stay in their original order within each tap
+    assert order.tolist() == [1, 4, 3, 0, 2, 5]
+
+
+@pytest.mark.parametrize('softening', [1.0, 0.6, None])
+def test_hyperscreen_matches_reference(hrcI_evt1, hrcS_evt1, softening):
+    for obs in (hrcI_evt1, hrcS_evt1):
+        results = obs.hyperscreen(softening=softening)
+        for axis in ('u', 'v'):
+            reference = reference_axis_survivors(obs, axis, softening)
+            by_tap = results['{} Axis Survivals by Tap'.format(axis.upper())]
+
+            assert set(by_tap) == set('{} Axis Tap {:02d}'.format(axis.upper(), tap) for tap in reference)
+            for tap, survivors in reference.items():
+                assert np.array_equal(by_tap['{} Axis Tap {:02d}'.format(axis.upper(), tap)], survivors)
+
+
+def test_otsu_thresholds_match_skimage():
+    rng = np.random.RandomState(1)
+    images = rng.poisson(rng.uniform(0.1, 30, size=(12, 1, 1)), size=(12, 50, 50)).astype(float)
+    images[3] = 7.  # a flat image
+
+    thresholds = tapscreen.otsu_thresholds(images)
+    assert thresholds.tolist() == [filters.threshold_otsu(image) for image in images]
+
+
+def test_locate_cells_matches_digitize():
+    rng = np.random.RandomState(3)
+    bounds = np.array([0, 400, 401, 1000])
+    fb = rng.normal(0.5, 0.1, size=1000)
+    fp = rng.uniform(-1, 1, size=1000)
+    fb[[5, 700]] = np.nan
+    fp[401:] = np.round(fp[401:], 1)  # many values exactly on bin edges
+    keep = np.isfinite(fb)
+    tapid = np.repeat(np.arange(3), np.diff(bounds))
+
+    xbins = tapscreen.tap_edges(np.where(keep, fb, np.nan), bounds, 20)
+    ybins = tapscreen.tap_edges(np.where(keep, fp, np.nan), bounds, 20)
+    cells, inside = tapscreen.locate_cells(fb, fp, tapid, keep, xbins, ybins)
+
+    for t in range(3):
+        tap = slice(bounds[t], bounds[t + 1])
+        posx = np.digitize(fb[tap], xbins[2][t])
+        posy = np.digitize(fp[tap], ybins[2][t])
+        expected = (posx > 0) & (posx <= 20) & (posy > 0) & (posy <= 20)
+        assert np.array_equal(inside[tap], expected)
+        assert np.array_equal(cells[tap][expected], (t * 20 + posx[expected] - 1) * 20 + posy[expected] - 1)
+
+        hist, _, _ = np.histogram2d(fb[tap][keep[tap]], fp[tap][keep[tap]], bins=[xbins[2][t], ybins[2][t]])
+        cube = tapscreen.histogram_cube(cells, keep, 3, [20, 20])
+        assert np.array_equal(cube[t], hist)
+
+
+def test_tap_survivors():
+    events = np.array([7, 2, 9, 4, 5, 1])
+    passed = np.array([True, False, True, True, False, True])
+    survivors = tapscreen.TapSurvivors([3, 4, 6], events, np.array([0, 2, 2, 6]), passed)
+
+    assert list(survivors) == [3, 4, 6] and len(survivors) == 3
+    assert survivors[3].tolist() == [7] and survivors[4].tolist() == [] and survivors[6].tolist() == [9, 4, 1]
+    assert survivors.all_survivors().tolist() == np.concatenate(list(survivors.values())).tolist()
+
+    relabeled = survivors.relabel("U Axis Tap {:02d}")
+    assert list(relabeled) == ["U Axis Tap 03", "U Axis Tap 04", "U Axis Tap 06"]
+    assert relabeled["U Axis Tap 06"].tolist() == [9, 4, 1]
+
+
+def test_accepted_bins():
+    rng = np.random.RandomState(2)
+    cube = rng.poisson(3, size=(5, 20, 20))
+    accepted = tapscreen.accepted_bins(cube, softening=0.5)
+
+    for tap_image, tap_accepted in zip(cube, accepted):
+        otsu = filters.threshold_otsu(tap_image.astype(float))
+        expected = (tap_image > 0) & (tap_image >= otsu - (otsu * 0.5))
+        # Bins in the lower half of the fb range are never accepted
+        expected[:10, :] = False
+        assert np.array_equal(tap_accepted, expected)
+
+
+def test_shard_taps():
+    bounds = np.array([0, 10, 20, 30, 100])
+    shards = tapscreen.shard_taps(bounds, 3)
+    # Shards are consecutive, cover every tap, and never split one
+    assert shards[0][0] == 0 and shards[-1][1] == 4
+    assert all(last == first for (_, last), (first, _) in zip(shards[:-1], shards[1:]))
+    assert tapscreen.shard_taps(bounds, 1) == [(0, 4)]
+
+
+def test_hyperscreen_workers(hrcS_evt1):
+    serial = hrcS_evt1.hyperscreen(softening=0.6)
+    threaded = hrcS_evt1.hyperscreen(softening=0.6, workers=3)
+
+    for key in ('All Survivals (boolean mask)', 'U Axis All Survivals', 'V Axis All Survivals'):
+        assert np.array_equal(serial[key], threaded[key])